@@ -0,0 +1,4 @@
+from .arp import ARPDiff, ARPEntry, ARPSnapshot
+from .arpHistory import ARPHistory, ARPInterval
+from .controller import DiagnosticsController
+from .paging import PagedRows
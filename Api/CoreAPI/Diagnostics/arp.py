@@ -0,0 +1,156 @@
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+
+@dataclass(frozen=True, slots=True)
+class ARPEntry:
+    """A single row of the OPNSense ARP table"""
+
+    mac: str
+    ip: str
+    intf: str
+    hostname: str = ""
+    manufacturer: str = ""
+    intfDescription: str = ""
+    permanent: bool = False
+    expires: int | None = None
+
+    @classmethod
+    def fromRow(cls, row: dict) -> "ARPEntry":
+        """Build an entry from a row returned by `getARPTable()`"""
+        return cls(
+            mac=str(row.get("mac", "")).lower(),
+            ip=str(row.get("ip", "")),
+            intf=str(row.get("intf", "")),
+            hostname=row.get("hostname") or "",
+            manufacturer=row.get("manufacturer") or "",
+            intfDescription=row.get("intf_description") or "",
+            permanent=bool(row.get("permanent", False)),
+            expires=row.get("expires"),
+        )
+
+
+@dataclass(slots=True)
+class ARPDiff:
+    """The changes between two ARP snapshots, keyed by MAC address
+
+    - `appeared`: entries of MAC addresses that were not in the previous snapshot
+    - `disappeared`: entries of MAC addresses that are no longer present
+    - `moved`: `(before, after)` entries of MAC addresses whose IP addresses or
+      interfaces changed
+    """
+
+    appeared: list[ARPEntry] = field(default_factory=list)
+    disappeared: list[ARPEntry] = field(default_factory=list)
+    moved: list[tuple[tuple[ARPEntry, ...], tuple[ARPEntry, ...]]] = field(
+        default_factory=list
+    )
+
+    def __bool__(self) -> bool:
+        return bool(self.appeared or self.disappeared or self.moved)
+
+
+class ARPSnapshot:
+    """An ARP table with hash indexes on MAC address, IP address and interface
+
+    Args:
+        `entries (Iterable[ARPEntry])`: The entries of the table
+
+    Usage:
+        ```python
+        previous = opnsense.getARPSnapshot()
+        ...
+        current = opnsense.getARPSnapshot()
+
+        current.lookupIP("192.168.1.10")
+        changes = current.diff(previous)
+        for entry in changes.appeared:
+            ...
+        ```
+    """
+
+    __slots__ = ("_entries", "_byMAC", "_byIP", "_byInterface")
+
+    def __init__(self, entries: Iterable[ARPEntry]) -> None:
+        self._entries: tuple[ARPEntry, ...] = tuple(entries)
+        self._byMAC: dict[str, tuple[ARPEntry, ...]] = {}
+        self._byIP: dict[str, ARPEntry] = {}
+        self._byInterface: dict[str, tuple[ARPEntry, ...]] = {}
+
+        byMAC: dict[str, list[ARPEntry]] = {}
+        byInterface: dict[str, list[ARPEntry]] = {}
+        for entry in self._entries:
+            byMAC.setdefault(entry.mac, []).append(entry)
+            byInterface.setdefault(entry.intf, []).append(entry)
+            self._byIP[entry.ip] = entry
+
+        self._byMAC = {mac: tuple(found) for mac, found in byMAC.items()}
+        self._byInterface = {intf: tuple(found) for intf, found in byInterface.items()}
+
+    @classmethod
+    def fromTable(cls, table: Iterable[dict]) -> "ARPSnapshot":
+        """Build a snapshot from the JSON list returned by `getARPTable()`"""
+        return cls(ARPEntry.fromRow(row) for row in table)
+
+    def lookupMAC(self, mac: str) -> tuple[ARPEntry, ...]:
+        """All entries for a MAC address, empty if it is unknown"""
+        return self._byMAC.get(mac.lower(), ())
+
+    def lookupIP(self, ip: str) -> ARPEntry | None:
+        """The entry for an IP address or None if it is unknown"""
+        return self._byIP.get(ip)
+
+    def onInterface(self, intf: str) -> tuple[ARPEntry, ...]:
+        """All entries learned on an interface, e.g. `em0`"""
+        return self._byInterface.get(intf, ())
+
+    @property
+    def macs(self) -> set[str]:
+        return set(self._byMAC)
+
+    @property
+    def interfaces(self) -> set[str]:
+        return set(self._byInterface)
+
+    def diff(self, previous: "ARPSnapshot | None") -> ARPDiff:
+        """Compare this snapshot against an older one
+
+        Args:
+            `previous (ARPSnapshot | None)`: The previous snapshot, None reports
+            every entry as appeared
+
+        Returns:
+            `ARPDiff`: The appeared, disappeared and moved entries
+        """
+        changes = ARPDiff()
+        if previous is None:
+            changes.appeared.extend(self._entries)
+            return changes
+
+        before: dict[str, tuple[ARPEntry, ...]] = previous._byMAC
+        after: dict[str, tuple[ARPEntry, ...]] = self._byMAC
+
+        for mac, entries in after.items():
+            old: tuple[ARPEntry, ...] | None = before.get(mac)
+            if old is None:
+                changes.appeared.extend(entries)
+            elif _locations(old) != _locations(entries):
+                changes.moved.append((old, entries))
+
+        for mac in before.keys() - after.keys():
+            changes.disappeared.extend(before[mac])
+
+        return changes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[ARPEntry]:
+        return iter(self._entries)
+
+    def __contains__(self, mac: str) -> bool:
+        return mac.lower() in self._byMAC
+
+
+def _locations(entries: tuple[ARPEntry, ...]) -> frozenset[tuple[str, str]]:
+    return frozenset((entry.ip, entry.intf) for entry in entries)
@@ -0,0 +1,257 @@
+import sqlite3
+from time import time
+from datetime import datetime
+from threading import Lock
+from dataclasses import dataclass
+from typing import Iterable
+
+from .arp import ARPEntry
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS intervals (
+    id INTEGER PRIMARY KEY,
+    mac TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    intf TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    open INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS intervals_mac ON intervals (mac, first_seen);
+CREATE INDEX IF NOT EXISTS intervals_ip ON intervals (ip, first_seen);
+CREATE INDEX IF NOT EXISTS intervals_last_seen ON intervals (last_seen);
+CREATE UNIQUE INDEX IF NOT EXISTS intervals_open
+    ON intervals (mac, ip, intf) WHERE open = 1;
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class ARPInterval:
+    """A MAC/IP/interface binding and the time span it was observed for"""
+
+    mac: str
+    ip: str
+    intf: str
+    firstSeen: float
+    lastSeen: float
+
+
+def _timestamp(value: float | datetime) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+class ARPHistory:
+    """Append-only SQLite store of ARP observations kept as run-length intervals
+
+    Each `(mac, ip, intf)` binding is stored once per continuous run of polls
+    it was seen in. Recording a poll only extends the `last_seen` of the
+    bindings that are still present, closes the ones that vanished and inserts
+    the new ones, so the file grows with churn rather than with poll count.
+
+    Args:
+        `path (str)`: The SQLite database file, `":memory:"` for a throw-away store
+        `maxGap (float | None, optional)`: Seconds without a poll after which open
+        intervals are closed instead of extended, so an outage of the poller
+        doesn't count as presence. Defaults to None (never).
+        `retention (float | None, optional)`: Seconds of history to keep, older
+        closed intervals are pruned on every `record()`. Defaults to None (forever).
+
+    Usage:
+        ```python
+        from datetime import datetime
+        from NG_OPNSense.Api.CoreAPI.Diagnostics import ARPHistory
+
+        with ARPHistory("arp.sqlite", maxGap=600) as history:
+            history.record(opnsense.getARPSnapshot())
+
+            # Where was this MAC on Tuesday at 14:00?
+            history.at(datetime(2024, 10, 15, 14, 0), mac="aa:bb:cc:dd:ee:ff")
+        ```
+    """
+
+    def __init__(
+        self,
+        path: str,
+        maxGap: float | None = None,
+        retention: float | None = None,
+    ) -> None:
+        self.path: str = path
+        self.maxGap: float | None = maxGap
+        self.retention: float | None = retention
+
+        self._lock: Lock = Lock()
+        self._db: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    @property
+    def lastPoll(self) -> float | None:
+        """The time of the most recently recorded poll"""
+        with self._lock:
+            return self._lastPoll()
+
+    def record(
+        self, entries: Iterable[ARPEntry], at: float | datetime | None = None
+    ) -> None:
+        """Record the ARP table of one poll
+
+        Args:
+            `entries (Iterable[ARPEntry])`: The polled table, e.g. an `ARPSnapshot`
+            `at (float | datetime | None, optional)`: The poll time. Defaults to now.
+
+        Raises:
+            `ValueError`: If `at` is older than the last recorded poll
+        """
+        now: float = time() if at is None else _timestamp(at)
+        bindings: set[tuple[str, str, str]] = {
+            (entry.mac.lower(), entry.ip, entry.intf) for entry in entries
+        }
+
+        with self._lock, self._db:
+            lastPoll: float | None = self._lastPoll()
+            if lastPoll is not None and now < lastPoll:
+                raise ValueError("Polls must be recorded in chronological order")
+
+            if (
+                lastPoll is not None
+                and self.maxGap is not None
+                and now - lastPoll > self.maxGap
+            ):
+                self._db.execute("UPDATE intervals SET open = 0 WHERE open = 1")
+
+            self._db.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS current (mac TEXT, ip TEXT, intf TEXT)"
+            )
+            self._db.execute("DELETE FROM temp.current")
+            self._db.executemany("INSERT INTO temp.current VALUES (?, ?, ?)", bindings)
+
+            # Extend the bindings that are still present
+            self._db.execute(
+                "UPDATE intervals SET last_seen = ? WHERE open = 1 "
+                "AND (mac, ip, intf) IN (SELECT mac, ip, intf FROM temp.current)",
+                (now,),
+            )
+            # Close the ones that vanished
+            self._db.execute(
+                "UPDATE intervals SET open = 0 WHERE open = 1 AND last_seen < ?", (now,)
+            )
+            # Start intervals for new bindings
+            self._db.execute(
+                "INSERT INTO intervals (mac, ip, intf, first_seen, last_seen) "
+                "SELECT c.mac, c.ip, c.intf, ?, ? FROM temp.current c WHERE NOT EXISTS "
+                "(SELECT 1 FROM intervals i WHERE i.open = 1 "
+                "AND i.mac = c.mac AND i.ip = c.ip AND i.intf = c.intf)",
+                (now, now),
+            )
+            self._db.execute("DELETE FROM temp.current")
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_poll', ?)",
+                (now,),
+            )
+
+            if self.retention is not None:
+                self._prune(now - self.retention)
+
+    def at(
+        self,
+        when: float | datetime,
+        mac: str | None = None,
+        ip: str | None = None,
+        intf: str | None = None,
+    ) -> list[ARPInterval]:
+        """The bindings that were observed at a point in time
+
+        Args:
+            `when (float | datetime)`: The point in time
+            `mac (str | None, optional)`: Only bindings of this MAC address
+            `ip (str | None, optional)`: Only bindings of this IP address
+            `intf (str | None, optional)`: Only bindings on this interface
+
+        Returns:
+            `list[ARPInterval]`: The intervals that contain `when`
+        """
+        moment: float = _timestamp(when)
+        return self.history(mac=mac, ip=ip, intf=intf, start=moment, end=moment)
+
+    def history(
+        self,
+        mac: str | None = None,
+        ip: str | None = None,
+        intf: str | None = None,
+        start: float | datetime | None = None,
+        end: float | datetime | None = None,
+    ) -> list[ARPInterval]:
+        """The intervals overlapping a time range, oldest first
+
+        Args:
+            `mac (str | None, optional)`: Only bindings of this MAC address
+            `ip (str | None, optional)`: Only bindings of this IP address
+            `intf (str | None, optional)`: Only bindings on this interface
+            `start (float | datetime | None, optional)`: Start of the range
+            `end (float | datetime | None, optional)`: End of the range
+
+        Returns:
+            `list[ARPInterval]`: The matching intervals
+        """
+        clauses: list[str] = []
+        params: list[str | float] = []
+        for column, value in (("mac", mac and mac.lower()), ("ip", ip), ("intf", intf)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            clauses.append("last_seen >= ?")
+            params.append(_timestamp(start))
+        if end is not None:
+            clauses.append("first_seen <= ?")
+            params.append(_timestamp(end))
+
+        where: str = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT mac, ip, intf, first_seen, last_seen FROM intervals "
+                f"{where} ORDER BY first_seen",
+                params,
+            ).fetchall()
+        return [ARPInterval(*row) for row in rows]
+
+    def prune(self, before: float | datetime) -> int:
+        """Delete the closed intervals that ended before a point in time
+
+        Args:
+            `before (float | datetime)`: The cut-off
+
+        Returns:
+            `int`: The number of deleted intervals
+        """
+        with self._lock, self._db:
+            return self._prune(_timestamp(before))
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _lastPoll(self) -> float | None:
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE key = 'last_poll'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _prune(self, before: float) -> int:
+        return self._db.execute(
+            "DELETE FROM intervals WHERE open = 0 AND last_seen < ?", (before,)
+        ).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM intervals").fetchone()[0]
+
+    def __enter__(self) -> "ARPHistory":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
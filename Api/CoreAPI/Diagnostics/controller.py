@@ -0,0 +1,156 @@
+from json import dumps
+from typing import Callable
+
+from NG_OPNSense.exceptions import _failed
+from NG_OPNSense.helpers import _openSenseAPI, _openSenseJSON
+from NG_OPNSense.transport import Transport
+
+from .paging import PagedRows
+
+
+class DiagnosticsController:
+    """Diagnostics API class for reading large tables of the OPNSense Firewall
+
+    The query methods return `PagedRows`, which page through the server side
+    search endpoints and yield one row at a time, so the state table can be
+    scanned in constant memory. Filters like `searchPhrase` are applied by the
+    firewall before paging.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        apiKey: str,
+        apiSecret: str,
+        transport: Transport | None = None,
+    ) -> None:
+        self.apiKey: str = apiKey
+        self.apiSecret: str = apiSecret
+        # The pf tables are read through the firewall module
+        self.apiURL: str = url
+        self.url: str = f"{url}/diagnostics"
+        # Sends the requests, None uses the shared default transport
+        self.transport: Transport | None = transport
+
+    def listPfTables(self) -> list | None:
+        """List the pf tables (aliases) loaded on the OPNSense Firewall
+
+        Returns:
+            `list | None`: The table names or None if the request failed
+        """
+        try:
+            url = f"{self.apiURL}/firewall/alias_util/aliases"
+            return _openSenseJSON(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="GET",
+            )
+        except Exception as e:
+            return _failed("Failed to list pf tables", e)
+
+    def queryPfTable(
+        self,
+        table: str,
+        searchPhrase: str = "",
+        rowCount: int = 1000,
+        prefetch: int = 1,
+        limit: int | None = None,
+    ) -> PagedRows:
+        """Iterate over the addresses in a pf table
+
+        Args:
+            `table (str)`: The name of the table, e.g. an alias name
+            `searchPhrase (str, optional)`: Only addresses matching it. Defaults to "".
+            `rowCount (int, optional)`: The page size. Defaults to 1000.
+            `prefetch (int, optional)`: Pages fetched ahead. Defaults to 1.
+            `limit (int | None, optional)`: Stop after this many rows. Defaults to None.
+
+        Returns:
+            `PagedRows`: The rows (`{"ip": ...}`), fetched while iterating
+        """
+        return PagedRows(
+            self._search(
+                f"{self.apiURL}/firewall/alias_util/list/{table}",
+                {"searchPhrase": searchPhrase},
+            ),
+            rowCount=rowCount,
+            prefetch=prefetch,
+            limit=limit,
+        )
+
+    def queryStates(
+        self,
+        searchPhrase: str = "",
+        ruleId: str | None = None,
+        rowCount: int = 1000,
+        prefetch: int = 1,
+        limit: int | None = None,
+    ) -> PagedRows:
+        """Iterate over the firewall state table
+
+        Args:
+            `searchPhrase (str, optional)`: Only states matching it, e.g. an
+            address or port. Defaults to "".
+            `ruleId (str | None, optional)`: Only states created by this rule
+            (its label). Defaults to None.
+            `rowCount (int, optional)`: The page size. Defaults to 1000.
+            `prefetch (int, optional)`: Pages fetched ahead. Defaults to 1.
+            `limit (int | None, optional)`: Stop after this many rows. Defaults to None.
+
+        Returns:
+            `PagedRows`: The states, fetched while iterating
+        """
+        parameters: dict = {"searchPhrase": searchPhrase}
+        if ruleId is not None:
+            parameters["ruleid"] = ruleId
+        return PagedRows(
+            self._search(f"{self.url}/firewall/query_states", parameters),
+            rowCount=rowCount,
+            prefetch=prefetch,
+            limit=limit,
+        )
+
+    def searchNDP(
+        self,
+        searchPhrase: str = "",
+        rowCount: int = 1000,
+        prefetch: int = 1,
+        limit: int | None = None,
+    ) -> PagedRows:
+        """Iterate over the IPv6 neighbor discovery table
+
+        Args:
+            `searchPhrase (str, optional)`: Only entries matching it. Defaults to "".
+            `rowCount (int, optional)`: The page size. Defaults to 1000.
+            `prefetch (int, optional)`: Pages fetched ahead. Defaults to 1.
+            `limit (int | None, optional)`: Stop after this many rows. Defaults to None.
+
+        Returns:
+            `PagedRows`: The neighbors, fetched while iterating
+        """
+        return PagedRows(
+            self._search(
+                f"{self.url}/interface/search_ndp", {"searchPhrase": searchPhrase}
+            ),
+            rowCount=rowCount,
+            prefetch=prefetch,
+            limit=limit,
+        )
+
+    def _search(self, url: str, parameters: dict) -> Callable[[int, int], dict]:
+        """A page fetcher for a search endpoint, raising if a page can't be read"""
+
+        def fetch(current: int, rowCount: int) -> dict:
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                data=dumps({**parameters, "current": current, "rowCount": rowCount}),
+                Method="POST",
+            )
+            return response.json()
+
+        return fetch
@@ -0,0 +1,130 @@
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Callable, Generator, Iterator
+
+# Marks the end of the pages in the prefetch queue
+_DONE = object()
+
+
+class PagedRows:
+    """Iterates over the rows of a paged search endpoint, one page in memory at a time
+
+    Pages are requested with `current`/`rowCount` until a short or empty page
+    arrives or `total` is reached. With `prefetch` the next pages are fetched
+    by a background thread while the current one is consumed, at most
+    `prefetch` pages ahead: a slow consumer stops the fetching instead of
+    letting pages pile up. At most `prefetch + 2` pages (the one consumed, the
+    queued ones and the one being fetched) are held however large the table is.
+
+    The table may change between pages, so rows can be missed or repeated
+    when entries are added or removed while iterating.
+
+    Args:
+        `fetch (Callable[[int, int], dict])`: Returns page `current` of size
+        `rowCount`, a dict with `rows` and `total`
+        `rowCount (int, optional)`: The page size. Defaults to 1000.
+        `prefetch (int, optional)`: Pages fetched ahead of the consumer, 0 fetches
+        on demand. Defaults to 1.
+        `limit (int | None, optional)`: Stop after this many rows. Defaults to None.
+
+    Raises:
+        `Exception`: Whatever `fetch` raised, when the page is reached
+
+    Usage:
+        ```python
+        states = opnsense.coreAPI.diagnostics.queryStates(searchPhrase="10.0.0.5")
+        for state in states:
+            ...
+        print(states.total, states.pages)
+        ```
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[int, int], dict],
+        rowCount: int = 1000,
+        prefetch: int = 1,
+        limit: int | None = None,
+    ) -> None:
+        if rowCount < 1:
+            raise ValueError("rowCount must be at least 1")
+        if prefetch < 0:
+            raise ValueError("prefetch can't be negative")
+
+        self.fetch: Callable[[int, int], dict] = fetch
+        self.rowCount: int = rowCount
+        self.prefetch: int = prefetch
+        self.limit: int | None = limit
+        # The total reported by the last page, pages fetched and rows yielded
+        self.total: int | None = None
+        self.pages: int = 0
+        self.yielded: int = 0
+
+    def __iter__(self) -> Iterator[dict]:
+        self.total, self.pages, self.yielded = None, 0, 0
+        pages: Generator[list[dict], None, None] = (
+            self._prefetched() if self.prefetch else self._pages()
+        )
+        try:
+            for rows in pages:
+                for row in rows:
+                    if self.limit is not None and self.yielded >= self.limit:
+                        return
+                    self.yielded += 1
+                    yield row
+        finally:
+            # Stops the prefetch thread when the consumer breaks out early
+            pages.close()
+
+    def _pages(self) -> Generator[list[dict], None, None]:
+        current: int = 1
+        while self.limit is None or (current - 1) * self.rowCount < self.limit:
+            page: dict = self.fetch(current, self.rowCount)
+            rows: list[dict] = page.get("rows") or []
+            self.pages += 1
+            if "total" in page:
+                self.total = int(page["total"])
+            yield rows
+
+            if len(rows) < self.rowCount:
+                return
+            if self.total is not None and current * self.rowCount >= self.total:
+                return
+            current += 1
+
+    def _prefetched(self) -> Generator[list[dict], None, None]:
+        queue: Queue = Queue(maxsize=self.prefetch)
+        stopped: Event = Event()
+
+        def put(item) -> bool:
+            # Wait for room without blocking shutdown forever
+            while not stopped.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            try:
+                for rows in self._pages():
+                    if not put(rows):
+                        return
+            except BaseException as e:
+                put(e)
+                return
+            put(_DONE)
+
+        thread = Thread(target=produce, name="ngs-opnsense-pager", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
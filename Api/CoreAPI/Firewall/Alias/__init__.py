@@ -1,17 +1,90 @@
 from json import dumps
-from traceback import format_exc
-from NG_OPNSense.helpers import _openSenseAPI
+from os import PathLike
+from typing import Iterable, Iterator, TextIO
+from NG_OPNSense.cache import StaticDataCache
+from NG_OPNSense.concurrency import AdaptiveLimiter
+from NG_OPNSense.exceptions import _failed
+from NG_OPNSense.helpers import _openSenseAPI, _openSenseJSON
+from NG_OPNSense.profiling import phase
+from NG_OPNSense.transport import Transport
 
 from .model import *
+from .geoip import GeoIPCountryStats, GeoIPDatabase
+from .feed import FEED_TYPES, PUSH_MODES, FeedReport, ingestFeed
+from .batch import AliasOperation, AliasTransaction, TransactionResult
+from .refresh import (
+    FetchLoad,
+    RefreshPlan,
+    ScheduledRefresh,
+    planRefresh,
+    urlTableAliases,
+)
+from .sharedCache import SharedAliasCache
+from .transfer import (
+    EXPORT_FIELDS,
+    BulkImportResult,
+    bulkImportBody,
+    bulkImportResult,
+    ImportLineError,
+    ImportReport,
+    exportAliases,
+    importAliases,
+)
+from .watcher import AliasEvent, AliasEventType, AliasWatcher
+
+
+def _collapseOptions(obj: dict) -> dict | list:
+    """`json.loads` object hook that collapses GUI option maps to their selected keys
+
+    The `/get` endpoint renders every selectable field as a map of
+    `{"<key>": {"value": "<label>", "selected": 0|1}}`. Since the hook runs
+    bottom-up while the document is decoded, each option map is replaced by
+    the list of its selected keys before the parent object is built, so the
+    full option tree is never held in memory.
+
+    Args:
+        `obj (dict)`: The freshly decoded JSON object
+
+    Returns:
+        `dict | list`: The object unchanged, or the selected keys if it is an option map
+    """
+    if not obj:
+        return obj
+
+    # Cheap rejection on the first value, most objects are not option maps
+    first = next(iter(obj.values()))
+    if not (isinstance(first, dict) and "selected" in first and "value" in first):
+        return obj
+
+    selected: list[str] = []
+    for key, option in obj.items():
+        if not (isinstance(option, dict) and "selected" in option):
+            return obj
+        if option["selected"] and option["selected"] != "0":
+            selected.append(key)
+    return selected
 
 
 class AliasController:
     """Alias API class for interacting with OPNSense Firewall API"""
 
-    def __init__(self, url: str, apiKey: str, apiSecret: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        apiKey: str,
+        apiSecret: str,
+        cache: StaticDataCache | None = None,
+        transport: Transport | None = None,
+    ) -> None:
         self.apiKey: str = apiKey
         self.apiSecret: str = apiSecret
         self.url: str = f"{url}/alias"
+        # Optional on-disk cache for the nearly static lookup endpoints
+        self.cache: StaticDataCache | None = cache
+        # Sends the requests, None uses the shared default transport
+        self.transport: Transport | None = transport
+        # Adapts the parallelism of the bulk operations, shared between them
+        self.limiter: AdaptiveLimiter = AdaptiveLimiter()
 
     def addItem(self, alias: dict) -> dict | None:
         """Add an alias to the OPNSense Firewall
@@ -80,16 +153,20 @@ class AliasController:
         """
         try:
             url = self.url + "/addItem"
-            validatedData = AliasItem(**alias).model_dump_json()
+            with phase("validate"):
+                validatedData = AliasItem(**alias).model_dump_json()
 
             if validatedData is None:
                 return dumps({"error": "Invalid Alias Data"})
 
+            with phase("encode"):
+                body: str = dumps({"alias": alias})
             response = _openSenseAPI(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
-                data=dumps({"alias": alias}),
+                transport=self.transport,
+                data=body,
                 Method="POST",
             )
 
@@ -97,9 +174,66 @@ class AliasController:
                 raise RuntimeError("Failed to add alias")
 
             return response.json()
-        except Exception:
-            print(f"Failed to add alias:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to add alias", e)
+
+    def bulkExport(self) -> dict | None:
+        """Export every alias from the OPNSense Firewall in a single request
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall (the
+            format `bulkImport()` accepts) or None if the request failed
+        """
+        try:
+            url = f"{self.url}/export"
+            return _openSenseJSON(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="GET",
+            )
+        except Exception as e:
+            return _failed("Failed to export aliases", e)
+
+    def bulkImport(
+        self, aliases: Iterable[AliasClass | dict], reconfigure: bool = True
+    ) -> BulkImportResult | None:
+        """Import many aliases in a single request
+
+        Every alias is validated against the model of its type while the request
+        body is streamed, invalid ones are left out. The firewall creates
+        aliases with new names and updates the ones whose name exists, but only
+        saves the import if all of them are valid.
+
+        Args:
+            `aliases (Iterable[AliasClass | dict])`: Alias models (e.g. `AliasHost`)
+            or dicts with a `type`, any iterable including generators
+            `reconfigure (bool, optional)`: Apply the aliases after a successful
+            import. Defaults to True.
+
+        Returns:
+            `BulkImportResult | None`: The import status and the errors mapped back
+            to input rows, or None if the request failed
+        """
+        try:
+            url = f"{self.url}/import"
+            errors: list[ImportLineError] = []
+            rows: dict[str, int] = {}
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                data=bulkImportBody(aliases, errors, rows),
+                Method="POST",
+            )
+            result: BulkImportResult = bulkImportResult(response.json(), errors, rows)
+            if reconfigure and result.status == "ok":
+                result.reconfigured = self.reconfigure()
+            return result
+        except Exception as e:
+            return _failed("Failed to import aliases", e)
 
     def delItem(self, uuid: str) -> dict | None:
         """Delete an alias from the OPNSense Firewall
@@ -117,31 +251,76 @@ class AliasController:
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="POST",
             )
             return response.json()
-        except Exception:
-            print(f"Failed to delete alias:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to delete alias", e)
+
+    def export(
+        self,
+        stream: TextIO,
+        format: str = "ndjson",
+        details: bool = False,
+        pageSize: int = 500,
+        maxWorkers: int | None = None,
+    ) -> int | None:
+        """Stream every alias to a text stream, one alias per line
+
+        The aliases are read page by page from `searchItem`, so memory use does
+        not depend on the size of the alias table.
+
+        Args:
+            `stream (TextIO)`: Where to write, e.g. an open file
+            `format (str, optional)`: `ndjson` or `csv` (see `EXPORT_FIELDS` for
+            the columns). Defaults to "ndjson".
+            `details (bool, optional)`: Fetch every alias with `getItem` to include
+            the fields search results lack (proto, interface, updatefreq,
+            counters). Defaults to False.
+            `pageSize (int, optional)`: Aliases per search page. Defaults to 500.
+            `maxWorkers (int | None, optional)`: Parallel `getItem` requests when
+            `details` is set, None adapts it with `limiter`. Defaults to None.
+
+        Returns:
+            `int | None`: The number of exported aliases or None if the export failed
+        """
+        try:
+            return exportAliases(
+                controller=self,
+                stream=stream,
+                format=format,
+                details=details,
+                pageSize=pageSize,
+                maxWorkers=self.limiter if maxWorkers is None else maxWorkers,
+            )
+        except Exception as e:
+            return _failed("Failed to export aliases", e)
 
-    def get(self) -> dict | None:
+    def get(self, lean: bool = False) -> dict | None:
         """Get all aliases from the OPNSense Firewall
 
+        Args:
+            `lean (bool, optional)`: Collapse the option maps the GUI uses for
+            selectable fields (countries, interfaces, categories, ...) into the
+            list of selected keys while the response is parsed. Defaults to False.
+
         Returns:
             `dict | None`: The json response from the OPNSense Firewall or None if
             the request failed
         """
         try:
             url = f"{self.url}/get"
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="GET",
+                objectHook=_collapseOptions if lean else None,
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to get aliases:\n{format_exc()}")
+        except Exception as e:
+            return _failed("Failed to get aliases", e)
 
     def getAliasUUID(self, name: str) -> dict | None:
         """Get an alias UUID from the OPNSense Firewall
@@ -154,16 +333,15 @@ class AliasController:
         """
         try:
             url = f"{self.url}/getAliasUUID/{name}"
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="GET",
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to get alias UUID:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to get alias UUID", e)
 
     def getGeoIP(self) -> dict | None:
         """Get GeoIP data from the OPNSense Firewall
@@ -174,22 +352,17 @@ class AliasController:
         """
         try:
             url = f"{self.url}/getGeoIP"
-            response = _openSenseAPI(
-                url=url,
-                apiKey=self.apiKey,
-                apiSecret=self.apiSecret,
-                Method="GET",
-            )
-            return response.json()
-        except Exception:
-            print(f"Failed to get GeoIP data:\n{format_exc()}")
-            return None
+            return self._cachedJSON(name="getGeoIP", url=url)
+        except Exception as e:
+            return _failed("Failed to get GeoIP data", e)
 
-    def getItem(self, uuid: str) -> dict | None:
+    def getItem(self, uuid: str, lean: bool = False) -> dict | None:
         """Get an alias from the OPNSense Firewall
 
         Args:
             `uuid (str)`: The UUID of the alias to get
+            `lean (bool, optional)`: Collapse the GUI option maps into the list of
+            selected keys, see `get()`. Defaults to False.
 
         Returns:
             `dict | None`: The json response from the OPNSense Firewall or None if
@@ -197,16 +370,16 @@ class AliasController:
         """
         try:
             url = f"{self.url}/getItem/{uuid}"
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="GET",
+                objectHook=_collapseOptions if lean else None,
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to get alias:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to get alias", e)
 
     def getTableSize(self) -> dict | None:
         """Get the size of the alias table from the OPNSense Firewall
@@ -217,16 +390,108 @@ class AliasController:
         """
         try:
             url = f"{self.url}/getTableSize"
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="GET",
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to get table size:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to get table size", e)
+
+    def import_(
+        self,
+        stream: TextIO,
+        format: str = "ndjson",
+        batchSize: int = 100,
+        maxWorkers: int | None = None,
+        reconfigure: bool = True,
+    ) -> ImportReport | None:
+        """Create aliases from a text stream written by `export()`
+
+        Lines are read, validated against the model of their alias type and
+        sent in batches of `batchSize`, so memory use stays flat regardless of
+        the size of the input. Invalid lines are reported and skipped.
+
+        Args:
+            `stream (TextIO)`: Where to read from, e.g. an open file
+            `format (str, optional)`: `ndjson` or `csv`. Defaults to "ndjson".
+            `batchSize (int, optional)`: Lines read and sent at a time. Defaults to 100.
+            `maxWorkers (int | None, optional)`: Parallel `addItem` requests, None
+            adapts it with `limiter`. Defaults to None.
+            `reconfigure (bool, optional)`: Apply the aliases once at the end.
+            Defaults to True.
+
+        Returns:
+            `ImportReport | None`: The number of imported aliases and an
+            `ImportLineError` per failed line, or None if the import failed
+        """
+        try:
+            return importAliases(
+                controller=self,
+                stream=stream,
+                format=format,
+                batchSize=batchSize,
+                maxWorkers=self.limiter if maxWorkers is None else maxWorkers,
+                reconfigure=reconfigure,
+            )
+        except Exception as e:
+            return _failed("Failed to import aliases", e)
+
+    def ingestFeed(
+        self,
+        name: str,
+        source: str | PathLike | TextIO | Iterable[str],
+        push: str = "setItem",
+        batchSize: int = 500,
+        maxWorkers: int | None = None,
+        reconfigure: bool = True,
+    ) -> FeedReport | None:
+        """Sync a host or network alias with a local blocklist file
+
+        The feed is streamed line by line, parsed, deduplicated and aggregated
+        into the fewest CIDRs (ranges for a host alias) in sorted runs of packed
+        integers, then diffed against the alias. Memory grows with the feed,
+        about 8 bytes per IPv4 entry, and with the current entries of the alias.
+        Nothing is sent if the alias is up to date.
+
+        - `setItem`: diffs against the saved content and saves the new content,
+          the firewall only accepts the whole content, then reconfigures once.
+          Entries that are no addresses, e.g. hostnames or nested aliases, are
+          kept.
+        - `table`: diffs against the live pf table of the alias, read page by
+          page, and adds and deletes only the changed entries, in batches of
+          `batchSize`, without touching the saved configuration; the next
+          reconfigure or refresh restores the saved content
+
+        Args:
+            `name (str)`: The name of the alias
+            `source (str | PathLike | TextIO | Iterable[str])`: The path of the
+            blocklist, an open file or its lines
+            `push (str, optional)`: `setItem` or `table`. Defaults to "setItem".
+            `batchSize (int, optional)`: Table updates sent at a time. Defaults to 500.
+            `maxWorkers (int | None, optional)`: Parallel table updates, None adapts
+            it with `limiter`. Defaults to None.
+            `reconfigure (bool, optional)`: Apply a saved change. Defaults to True.
+
+        Returns:
+            `FeedReport | None`: The counts, the first invalid lines and the
+            throughput, or None if the alias could not be read or the push mode
+            is unknown
+        """
+        try:
+            return ingestFeed(
+                controller=self,
+                name=name,
+                source=source,
+                push=push,
+                batchSize=batchSize,
+                maxWorkers=self.limiter if maxWorkers is None else maxWorkers,
+                reconfigure=reconfigure,
+            )
+        except Exception as e:
+            return _failed("Failed to ingest the feed", e)
 
     def listCategories(self) -> dict | None:
         """List alias categories from the OPNSense Firewall
@@ -237,16 +502,9 @@ class AliasController:
         """
         try:
             url = f"{self.url}/listCategories"
-            response = _openSenseAPI(
-                url=url,
-                apiKey=self.apiKey,
-                apiSecret=self.apiSecret,
-                Method="GET",
-            )
-            return response.json()
-        except Exception:
-            print(f"Failed to list categories:\n{format_exc()}")
-            return None
+            return self._cachedJSON(name="listCategories", url=url)
+        except Exception as e:
+            return _failed("Failed to list categories", e)
 
     def listCountries(self) -> dict | None:
         """List countries from the OPNSense Firewall
@@ -257,16 +515,9 @@ class AliasController:
         """
         try:
             url = f"{self.url}/listCountries"
-            response = _openSenseAPI(
-                url=url,
-                apiKey=self.apiKey,
-                apiSecret=self.apiSecret,
-                Method="GET",
-            )
-            return response.json()
-        except Exception:
-            print(f"Failed to list countries:\n{format_exc()}")
-            return None
+            return self._cachedJSON(name="listCountries", url=url)
+        except Exception as e:
+            return _failed("Failed to list countries", e)
 
     def listNetworkAliases(self) -> dict | None:
         """List network aliases from the OPNSense Firewall
@@ -277,16 +528,15 @@ class AliasController:
         """
         try:
             url = f"{self.url}/listNetworkAliases"
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="GET",
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to list network aliases:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to list network aliases", e)
 
     def listUserGroups(self) -> dict | None:
         """List user groups from the OPNSense Firewall
@@ -297,16 +547,56 @@ class AliasController:
         """
         try:
             url = f"{self.url}/listUserGroups"
+            return self._cachedJSON(name="listUserGroups", url=url)
+        except Exception as e:
+            return _failed("Failed to list user groups", e)
+
+    def planRefresh(
+        self, snapshot: dict | None = None, tick: int = 60
+    ) -> RefreshPlan | None:
+        """Spread the downloads of the urltable aliases over their refresh periods
+
+        Aliases created together with the same `updatefreq` download their tables
+        at the same moment on every refresh. The plan assigns each one an offset,
+        applied with `apply()` and made permanent with `settle()`.
+
+        Args:
+            `snapshot (dict | None, optional)`: A `get()` response, None fetches
+            `get(lean=True)`. Defaults to None.
+            `tick (int, optional)`: Seconds between the firewall's checks for due
+            tables, the resolution of the offsets. Defaults to 60.
+
+        Returns:
+            `RefreshPlan | None`: The plan or None if the snapshot could not be fetched
+        """
+        try:
+            if snapshot is None:
+                snapshot = self.get(lean=True)
+                if snapshot is None:
+                    return None
+            return planRefresh(snapshot, tick=tick)
+        except Exception as e:
+            return _failed("Failed to plan the urltable refreshes", e)
+
+    def reconfigure(self) -> dict | None:
+        """Apply the saved alias configuration on the OPNSense Firewall
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/reconfigure"
             response = _openSenseAPI(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
-                Method="GET",
+                transport=self.transport,
+                Method="POST",
             )
             return response.json()
-        except Exception:
-            print(f"Failed to list user groups:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to reconfigure aliases", e)
 
     def searchItem(self, searchParams: str) -> dict | None:
         """Search for an alias item in the OPNSense Firewall
@@ -320,16 +610,15 @@ class AliasController:
         """
         try:
             url = f"{self.url}/searchItem/{searchParams}"
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="GET",
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to search for alias item:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to search for alias item", e)
 
     def setItem(self, uuid: str, dataToSet: dict) -> dict | None:
         """Set an alias item in the OPNSense Firewall
@@ -344,17 +633,19 @@ class AliasController:
         """
         try:
             url = f"{self.url}/setItem/{uuid}"
+            with phase("encode"):
+                body: str = dumps(dataToSet)
             response = _openSenseAPI(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
-                data=dumps(dataToSet),
+                transport=self.transport,
+                data=body,
                 Method="POST",
             )
             return response.json()
-        except Exception:
-            print(f"Failed to set alias item:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to set alias item", e)
 
     def toggleItem(self, uuid: str, enabled: bool) -> dict | None:
         """Toggle an alias item in the OPNSense Firewall
@@ -373,9 +664,110 @@ class AliasController:
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
                 Method="POST",
             )
             return response.json()
-        except Exception:
-            print(f"Failed to toggle alias item:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to toggle alias item", e)
+
+    def transaction(
+        self, maxWorkers: int | None = None, captureRollback: bool = True
+    ) -> AliasTransaction:
+        """Queue alias mutations and apply them together
+
+        Args:
+            `maxWorkers (int | None, optional)`: Maximum number of requests in
+            flight while committing, None adapts it with `limiter`. Defaults to None.
+            `captureRollback (bool, optional)`: Fetch the current state of every
+            modified alias before committing so the changes can be reverted.
+            Defaults to True.
+
+        Returns:
+            `AliasTransaction`: A context manager that commits on a clean exit
+        """
+        return AliasTransaction(
+            controller=self,
+            maxWorkers=self.limiter if maxWorkers is None else maxWorkers,
+            captureRollback=captureRollback,
+        )
+
+    def watch(
+        self,
+        interval: float = 30,
+        maxInterval: float = 300,
+        backoff: float = 2.0,
+        details: bool = True,
+        emitInitial: bool = False,
+    ) -> AliasWatcher:
+        """Watch the alias table for changes
+
+        Args:
+            `interval (float, optional)`: Base poll interval in seconds. Defaults to 30.
+            `maxInterval (float, optional)`: Upper bound the interval backs off to
+            while nothing changes. Defaults to 300.
+            `backoff (float, optional)`: Interval multiplier for idle polls. Defaults to 2.0.
+            `details (bool, optional)`: Attach the `getItem` response to added and
+            updated events. Defaults to True.
+            `emitInitial (bool, optional)`: Report the aliases found by the first
+            poll as added. Defaults to False.
+
+        Returns:
+            `AliasWatcher`: An iterable (and async iterable) of `AliasEvent`s
+        """
+        return AliasWatcher(
+            controller=self,
+            interval=interval,
+            maxInterval=maxInterval,
+            backoff=backoff,
+            details=details,
+            emitInitial=emitInitial,
+        )
+
+    def _cachedJSON(self, name: str, url: str) -> dict:
+        """GET a lookup endpoint through the static data cache, if there is one"""
+        if self.cache is not None:
+            cached: dict | None = self.cache.get(name)
+            if cached is not None:
+                return cached
+
+        data: dict = _openSenseJSON(
+            url=url,
+            apiKey=self.apiKey,
+            apiSecret=self.apiSecret,
+            transport=self.transport,
+            Method="GET",
+        )
+        if self.cache is not None and data is not None:
+            self.cache.set(name, data)
+        return data
+
+    def _searchRows(self, rowCount: int = 500) -> Iterator[dict]:
+        """Page through the searchItem endpoint, yielding one row at a time
+
+        Args:
+            `rowCount (int, optional)`: The page size. Defaults to 500.
+
+        Raises:
+            `RuntimeError`: If a page could not be fetched
+        """
+        url = f"{self.url}/searchItem"
+        current: int = 1
+        while True:
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                data=dumps(
+                    {"current": current, "rowCount": rowCount, "searchPhrase": ""}
+                ),
+                Method="POST",
+            )
+            page: dict = response.json()
+            rows: list[dict] = page.get("rows", [])
+            yield from rows
+
+            if not rows or current * rowCount >= int(page.get("total", 0)):
+                return
+            current += 1
@@ -0,0 +1,279 @@
+from enum import Enum
+from threading import Lock
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable
+
+from NG_OPNSense.coalescing import CoalescingQueue, Mutation
+from NG_OPNSense.concurrency import AdaptiveLimiter, executor
+
+if TYPE_CHECKING:
+    from . import AliasController
+
+# The "result" values the alias endpoints report on success
+_SUCCESS: set[str] = {"saved", "deleted", "enabled", "disabled"}
+# Numeric fields `getItem` returns as "" when unset, which `addItem` rejects
+_NUMERIC_FIELDS: tuple[str, ...] = ("counters", "updatefreq")
+
+
+# Enum for the mutations a transaction can queue
+class AliasOperation(str, Enum):
+    add: str = "addItem"
+    set: str = "setItem"
+    toggle: str = "toggleItem"
+    delete: str = "delItem"
+
+
+# An operation of a commit step: what it does, the alias and the call sending it
+_Operation = tuple[AliasOperation, str | None, Callable[[], dict]]
+
+
+@dataclass(slots=True)
+class OperationResult:
+    """The outcome of one request sent by a transaction"""
+
+    operation: AliasOperation
+    uuid: str | None
+    response: dict | None
+
+    @property
+    def ok(self) -> bool:
+        if not isinstance(self.response, dict):
+            return False
+        return str(self.response.get("result", "")).lower() in _SUCCESS
+
+
+@dataclass(slots=True)
+class TransactionResult:
+    """The outcome of a committed transaction and what is needed to revert it
+
+    - `previous`: the aliases (in `setItem` format) as they were before they were
+      successfully modified or deleted, keyed by UUID
+    - `created`: the UUIDs of the aliases the transaction added
+    """
+
+    results: list[OperationResult] = field(default_factory=list)
+    reconfigured: dict | None = None
+    queued: int = 0  # mutations queued by the caller
+    previous: dict[str, dict] = field(default_factory=dict)
+    created: list[str] = field(default_factory=list)
+    deleted: list[str] = field(default_factory=list)
+
+    @property
+    def sent(self) -> int:
+        """Mutations sent after coalescing"""
+        return len(self.results)
+
+    @property
+    def failures(self) -> list[OperationResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures and (self.reconfigured is not None or not self.sent)
+
+    def rollback(
+        self, controller: "AliasController", maxWorkers: int | None = None
+    ) -> "TransactionResult":
+        """Revert the successful mutations of this transaction
+
+        Added aliases are deleted, modified aliases are restored and deleted
+        aliases are re-created (with a new UUID).
+
+        Args:
+            `controller (AliasController)`: The controller the transaction ran on
+            `maxWorkers (int | None, optional)`: Maximum number of requests in
+            flight, None adapts it to the firewall. Defaults to None.
+
+        Returns:
+            `TransactionResult`: The result of the reverting transaction
+        """
+        with controller.transaction(maxWorkers, captureRollback=False) as revert:
+            for uuid in self.created:
+                revert.delItem(uuid)
+            for uuid, alias in self.previous.items():
+                if uuid in self.deleted:
+                    revert.addItem(alias["alias"])
+                else:
+                    revert.setItem(uuid, alias)
+        return revert.result
+
+
+def _toSetFormat(item: dict) -> dict:
+    """Convert a `getItem` response into the body `setItem` and `addItem` expect
+
+    Option maps, collapsed (lean) or not, become their selected keys joined
+    into a string, and unset numeric fields are dropped.
+    """
+    alias: dict = {}
+    for key, value in item.get("alias", {}).items():
+        if isinstance(value, dict):
+            value = [
+                option
+                for option, state in value.items()
+                if isinstance(state, dict)
+                and state.get("selected") not in (None, 0, "0", "")
+            ]
+        if isinstance(value, list):
+            value = ("\n" if key == "content" else ",").join(value)
+        if key in _NUMERIC_FIELDS and value in ("", None):
+            continue
+        alias[key] = value
+    return {"alias": alias}
+
+
+class AliasTransaction:
+    """Queues alias mutations and applies them with a single reconfigure
+
+    Mutations are coalesced per UUID while they are queued: repeated `setItem`
+    calls are merged, a `toggleItem` is folded into a pending `setItem` (the
+    last write of `enabled` wins), and `delItem` drops everything queued before
+    it. On commit the remaining requests are sent in three steps, the creations,
+    then the updates and toggles, then the deletions, each with at most
+    `maxWorkers` in flight. Exactly one `reconfigure` follows.
+
+    Args:
+        `controller (AliasController)`: The controller to apply the mutations with
+        `maxWorkers (int | AdaptiveLimiter, optional)`: Maximum number of requests
+        in flight, or the limiter adapting it. Defaults to 4.
+        `captureRollback (bool, optional)`: Fetch the current state of the modified
+        aliases before committing. Defaults to True.
+
+    Usage:
+        ```python
+        with opnsense.coreAPI.firewall.alias.transaction() as tx:
+            tx.setItem(uuid, {"alias": {"content": "10.0.0.1"}})
+            tx.setItem(uuid, {"alias": {"description": "web"}})
+            tx.toggleItem(uuid, True)
+            tx.delItem(otherUUID)
+
+        if not tx.result.ok:
+            tx.result.rollback(opnsense.coreAPI.firewall.alias)
+        ```
+    """
+
+    def __init__(
+        self,
+        controller: "AliasController",
+        maxWorkers: int | AdaptiveLimiter = 4,
+        captureRollback: bool = True,
+    ) -> None:
+        if isinstance(maxWorkers, int) and maxWorkers < 1:
+            raise ValueError("maxWorkers must be at least 1")
+
+        self.controller: "AliasController" = controller
+        self.maxWorkers: int | AdaptiveLimiter = maxWorkers
+        self.captureRollback: bool = captureRollback
+        self.result: TransactionResult | None = None
+
+        self._lock: Lock = Lock()
+        self._queue: CoalescingQueue = CoalescingQueue("alias")
+
+    def addItem(self, alias: dict) -> None:
+        """Queue the creation of an alias, see `AliasController.addItem()`"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.add(alias)
+
+    def setItem(self, uuid: str, dataToSet: dict) -> None:
+        """Queue an update of an alias, merged with earlier updates of the same UUID"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.set(uuid, dataToSet)
+
+    def toggleItem(self, uuid: str, enabled: bool) -> None:
+        """Queue enabling or disabling an alias, the last state queued wins"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.toggle(uuid, enabled)
+
+    def delItem(self, uuid: str) -> None:
+        """Queue the deletion of an alias, dropping the mutations queued for it"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.delete(uuid)
+
+    def discard(self) -> None:
+        """Drop every queued mutation without sending anything"""
+        with self._lock:
+            self._queue.clear()
+
+    def commit(self) -> TransactionResult:
+        """Send the coalesced mutations and reconfigure the aliases once
+
+        Returns:
+            `TransactionResult`: The responses, failures and rollback information
+
+        Raises:
+            `RuntimeError`: If the transaction was already committed
+        """
+        with self._lock:
+            self._checkOpen()
+            self.result = result = TransactionResult(queued=self._queue.queued)
+            phases: list[list[_Operation]] = self._plan()
+
+        controller = self.controller
+        with executor(self.maxWorkers) as pool:
+            touched: list[str] = [
+                uuid for step in phases for _, uuid, _ in step if uuid
+            ]
+            originals: dict[str, dict | None] = {}
+            if self.captureRollback and touched:
+                fetched = pool.map(lambda u: controller.getItem(u, lean=True), touched)
+                originals = dict(zip(touched, fetched))
+
+            # A nested alias may name one created in this transaction, and a
+            # deleted alias may be referenced until an update drops it
+            sent: list[tuple[_Operation, dict]] = []
+            for step in phases:
+                sent += zip(
+                    step, list(pool.map(lambda operation: operation[2](), step))
+                )
+            for (operation, uuid, _), response in sent:
+                outcome = OperationResult(operation, uuid, response)
+                result.results.append(outcome)
+                if not outcome.ok:
+                    continue
+                if operation == AliasOperation.add:
+                    result.created.append(response.get("uuid"))
+                    continue
+                if operation == AliasOperation.delete:
+                    result.deleted.append(uuid)
+                if originals.get(uuid):
+                    result.previous[uuid] = _toSetFormat(originals[uuid])
+
+        if any(outcome.ok for outcome in result.results):
+            result.reconfigured = controller.reconfigure()
+        return result
+
+    def _plan(self) -> list[list[_Operation]]:
+        controller = self.controller
+        send: dict[Mutation, Callable[[str | None, Any], dict]] = {
+            Mutation.add: lambda _, alias: controller.addItem(alias),
+            Mutation.set: lambda uuid, data: controller.setItem(uuid, data),
+            Mutation.toggle: lambda uuid, enabled: controller.toggleItem(uuid, enabled),
+            Mutation.delete: lambda uuid, _: controller.delItem(uuid),
+        }
+        return [
+            [
+                (
+                    AliasOperation[mutation.name],
+                    uuid,
+                    lambda m=mutation, u=uuid, p=payload: send[m](u, p),
+                )
+                for mutation, uuid, payload in step
+            ]
+            for step in self._queue.phases()
+        ]
+
+    def _checkOpen(self) -> None:
+        if self.result is not None:
+            raise RuntimeError("Transaction was already committed")
+
+    def __enter__(self) -> "AliasTransaction":
+        return self
+
+    def __exit__(self, excType, *_) -> None:
+        if excType is None:
+            self.commit()
+        else:
+            self.discard()
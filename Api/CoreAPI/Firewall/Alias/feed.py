@@ -0,0 +1,425 @@
+from re import compile
+from os import PathLike
+from array import array
+from heapq import merge
+from json import dumps
+from itertools import islice
+from time import perf_counter
+from dataclasses import dataclass, field
+from socket import AF_INET, AF_INET6, inet_ntop, inet_pton
+from typing import TYPE_CHECKING, Iterable, Iterator, TextIO
+
+from NG_OPNSense.concurrency import AdaptiveLimiter, executor
+from NG_OPNSense.exceptions import _failed
+from NG_OPNSense.helpers import _openSenseAPI
+
+from NG_OPNSense.Api.CoreAPI.Diagnostics.paging import PagedRows
+
+from .model.content import ContentError
+from .refresh import _selected
+
+if TYPE_CHECKING:
+    from . import AliasController
+
+# How the changes reach the firewall, see `ingestFeed()`
+PUSH_MODES: tuple[str, ...] = ("setItem", "table")
+# Alias types a feed can be ingested into
+FEED_TYPES: tuple[str, ...] = ("host", "network")
+# Invalid lines kept as examples in the report
+MAX_ERRORS: int = 20
+# Keys sorted at a time, about 8 MB per IPv4 run
+RUN_SIZE: int = 1 << 20
+# Addresses read per page of a live pf table
+PAGE_SIZE: int = 5000
+
+_COMMENT = compile(r"#|;|//")
+_TOKEN_END = compile(r"[\s,]")
+_FAMILIES: tuple[tuple[int, int], ...] = ((AF_INET, 32), (AF_INET6, 128))
+
+
+@dataclass(slots=True)
+class FeedReport:
+    """The outcome of a feed ingestion, see `ingestFeed()`
+
+    - `entries`: valid addresses and networks read from the feed
+    - `errors`: the first `MAX_ERRORS` invalid lines, `index` is the line number
+    - `unique`: entries the feed aggregates to, the desired content
+    - `kept`: saved entries that are no addresses (hostnames, nested aliases,
+      negations), left as they are
+    - `requests`: requests sent to push the changes
+    """
+
+    lines: int = 0
+    entries: int = 0
+    invalid: int = 0
+    errors: list[ContentError] = field(default_factory=list)
+    unique: int = 0
+    added: int = 0
+    removed: int = 0
+    kept: int = 0
+    requests: int = 0
+    failed: int = 0
+    reconfigured: dict | None = None
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    @property
+    def linesPerSecond(self) -> float:
+        return round(self.lines / self.seconds, 1) if self.seconds else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "lines": self.lines,
+            "entries": self.entries,
+            "invalid": self.invalid,
+            "unique": self.unique,
+            "added": self.added,
+            "removed": self.removed,
+            "kept": self.kept,
+            "requests": self.requests,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 3),
+            "linesPerSecond": self.linesPerSecond,
+        }
+
+
+class _Networks:
+    """The networks of one address family, deduplicated and merged in sorted runs
+
+    A network is packed into one integer, `start << 8 | prefix`. IPv4 keys are
+    held in typed arrays at 8 bytes each, so the feed takes O(entries) compact
+    memory rather than a string per line. Every `RUN_SIZE` keys are sorted
+    into a run and `ranges()` merges the runs lazily.
+    """
+
+    def __init__(self, family: int, bits: int, runSize: int = RUN_SIZE) -> None:
+        self.family: int = family
+        self.bits: int = bits
+        self.runSize: int = runSize
+        self._pending: array | list = self._run()
+        self._runs: list[array | list] = []
+
+    def add(self, start: int, prefix: int) -> None:
+        self._pending.append(start << 8 | prefix)
+        if len(self._pending) >= self.runSize:
+            self._seal()
+
+    def ranges(self) -> Iterator[tuple[int, int]]:
+        """The merged `(first, last)` address ranges in ascending order"""
+        self._seal()
+        first: int = -1
+        last: int = -2
+        for key in merge(*self._runs):
+            start: int = key >> 8
+            end: int = start + (1 << (self.bits - (key & 0xFF))) - 1
+            if start <= last + 1:
+                last = max(last, end)
+                continue
+            if first >= 0:
+                yield first, last
+            first, last = start, end
+        if first >= 0:
+            yield first, last
+
+    def _run(self) -> array | list:
+        # IPv6 keys don't fit in 64 bits
+        return array("Q") if self.bits == 32 else []
+
+    def _seal(self) -> None:
+        if not self._pending:
+            return
+        keys: list[int] = sorted(self._pending)
+        self._pending = self._run()
+        self._runs.append(array("Q", keys) if self.bits == 32 else keys)
+
+
+def _parse(entry: str) -> tuple[int, int, int]:
+    """`(family index, network address, prefix)` of an address or a CIDR
+
+    Host bits are masked, like the firewall does for a network alias.
+
+    Raises:
+        `ValueError`: If the entry is no IP address or network
+    """
+    address, slash, prefix = entry.partition("/")
+    for index, (family, bits) in enumerate(_FAMILIES):
+        try:
+            packed: bytes = inet_pton(family, address)
+        except OSError:
+            continue
+        if not slash:
+            return index, int.from_bytes(packed, "big"), bits
+        if not prefix.isdigit() or int(prefix) > bits:
+            raise ValueError("prefix length out of range")
+        length: int = int(prefix)
+        mask: int = ~((1 << (bits - length)) - 1)
+        return index, int.from_bytes(packed, "big") & mask, length
+    raise ValueError("not an IP address or network")
+
+
+def _cidrs(first: int, last: int, bits: int) -> Iterator[tuple[int, int]]:
+    """The fewest `(start, prefix)` networks covering a range"""
+    while first <= last:
+        aligned: int = (first & -first).bit_length() - 1 if first else bits
+        size: int = (last - first + 1).bit_length() - 1
+        prefix: int = bits - min(aligned, size)
+        yield first, prefix
+        first += 1 << (bits - prefix)
+
+
+def _forms(index: int, first: int, last: int, ranges: bool) -> Iterator[str]:
+    """A range of addresses as one `first-last` entry or as CIDRs"""
+    family, bits = _FAMILIES[index]
+    text = lambda address: inet_ntop(family, address.to_bytes(bits // 8, "big"))
+    if ranges:
+        yield text(first) if first == last else f"{text(first)}-{text(last)}"
+        return
+    for start, prefix in _cidrs(first, last, bits):
+        yield text(start) if prefix == bits else f"{text(start)}/{prefix}"
+
+
+def _render(networks: list[_Networks], ranges: bool) -> Iterator[str]:
+    """The aggregated entries, as ranges for a host alias or CIDRs otherwise"""
+    for index, family in enumerate(networks):
+        for first, last in family.ranges():
+            yield from _forms(index, first, last, ranges)
+
+
+def _lines(source: str | PathLike | TextIO | Iterable[str]) -> Iterator[str]:
+    if isinstance(source, (str, PathLike)):
+        with open(source, encoding="utf-8", errors="replace") as stream:
+            yield from stream
+    else:
+        yield from source
+
+
+def _readFeed(
+    source: str | PathLike | TextIO | Iterable[str],
+    report: FeedReport | None = None,
+    runSize: int = RUN_SIZE,
+) -> list[_Networks]:
+    """Parse a blocklist into deduplicated IPv4 and IPv6 networks
+
+    The first token of a line is the entry, so `1.2.3.4 # comment`,
+    `1.2.3.4,source` and `1.2.3.4<tab>score` are accepted. Blank lines and
+    lines starting with `#`, `;` or `//` are skipped.
+
+    Args:
+        `source (str | PathLike | TextIO | Iterable[str])`: A file path, an
+        open file or the lines
+        `report (FeedReport | None, optional)`: Where to count the lines and
+        the invalid entries. Defaults to None.
+        `runSize (int, optional)`: Keys sorted at a time. Defaults to `RUN_SIZE`.
+
+    Returns:
+        `list`: The IPv4 and the IPv6 networks, for `ingestFeed()`
+    """
+    report = FeedReport() if report is None else report
+    networks: list[_Networks] = [
+        _Networks(family, bits, runSize) for family, bits in _FAMILIES
+    ]
+    for number, line in enumerate(_lines(source), start=1):
+        report.lines = number
+        line = line.strip()
+        if not line or _COMMENT.match(line):
+            continue
+        entry: str = _TOKEN_END.split(line, 1)[0]
+        try:
+            index, start, prefix = _parse(entry)
+        except ValueError as e:
+            report.invalid += 1
+            if len(report.errors) < MAX_ERRORS:
+                report.errors.append(ContentError(number, entry, str(e)))
+            continue
+        networks[index].add(start, prefix)
+        report.entries += 1
+    return networks
+
+
+def _entryForms(entry: str, ranges: bool) -> Iterator[str]:
+    """The aggregated forms of one address, network or range
+
+    Raises:
+        `ValueError`: If the entry is none of them
+    """
+    first, _, last = entry.partition("-")
+    if not last:
+        index, start, prefix = _parse(entry)
+        return _forms(
+            index, start, start + (1 << (_FAMILIES[index][1] - prefix)) - 1, ranges
+        )
+    (index, start, _), (other, end, _) = _parse(first), _parse(last)
+    if index != other or start > end or "/" in entry:
+        raise ValueError("invalid address range")
+    return _forms(index, start, end, ranges)
+
+
+def _current(entries: Iterable[str], ranges: bool) -> tuple[dict[str, str], list[str]]:
+    """Map the address entries of an alias to their aggregated form
+
+    Returns:
+        `tuple`: The rendered form of every address entry with the entry it
+        came from, and the entries that are no addresses
+    """
+    rendered: dict[str, str] = {}
+    others: list[str] = []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            forms: Iterator[str] = _entryForms(entry, ranges)
+        except ValueError:
+            others.append(entry)  # hostnames, nested aliases and negations
+            continue
+        for form in forms:
+            rendered.setdefault(form, entry)
+    return rendered, others
+
+
+def _tableEntries(controller: "AliasController", name: str) -> Iterator[str]:
+    """The addresses in the live pf table of an alias, page by page"""
+
+    def fetch(current: int, rowCount: int) -> dict:
+        response = _openSenseAPI(
+            url=f"{controller.url}_util/list/{name}",
+            apiKey=controller.apiKey,
+            apiSecret=controller.apiSecret,
+            transport=controller.transport,
+            data=dumps({"current": current, "rowCount": rowCount}),
+            Method="POST",
+        )
+        return response.json()
+
+    for row in PagedRows(fetch, rowCount=PAGE_SIZE):
+        yield row.get("ip", "")
+
+
+def _tableUpdate(
+    controller: "AliasController", action: str, name: str, address: str
+) -> dict | None:
+    """Add an address to or delete one from the pf table of an alias"""
+    try:
+        response = _openSenseAPI(
+            url=f"{controller.url}_util/{action}/{name}",
+            apiKey=controller.apiKey,
+            apiSecret=controller.apiSecret,
+            transport=controller.transport,
+            data=dumps({"address": address}),
+            Method="POST",
+        )
+        return response.json()
+    except Exception as e:
+        return _failed(f"Failed to {action} {address} in table {name}", e)
+
+
+def _pushTable(
+    controller: "AliasController",
+    name: str,
+    action: str,
+    addresses: Iterable[str],
+    batchSize: int,
+    maxWorkers: int | AdaptiveLimiter,
+    report: FeedReport,
+) -> None:
+    addresses = iter(addresses)
+    with executor(maxWorkers) as pool:
+        while batch := list(islice(addresses, batchSize)):
+            responses = pool.map(
+                lambda address: _tableUpdate(controller, action, name, address),
+                batch,
+            )
+            for response in responses:
+                report.requests += 1
+                if not isinstance(response, dict) or response.get("status") != "done":
+                    report.failed += 1
+
+
+def ingestFeed(
+    controller: "AliasController",
+    name: str,
+    source: str | PathLike | TextIO | Iterable[str],
+    push: str = "setItem",
+    batchSize: int = 500,
+    maxWorkers: int | AdaptiveLimiter = 4,
+    reconfigure: bool = True,
+) -> FeedReport:
+    """Sync a host or network alias with a blocklist, see `AliasController.ingestFeed()`
+
+    Memory grows with the size of the feed and of the alias: about 8 bytes per
+    IPv4 entry (more for IPv6) while the feed is aggregated, plus a map of the
+    current entries for the diff. Only the feed file is streamed. In `setItem`
+    mode the new content is also built as one string, the API takes it whole.
+    """
+    if push not in PUSH_MODES:
+        raise ValueError(f"Unknown push mode {push}, expected one of {PUSH_MODES}")
+    if batchSize < 1:
+        raise ValueError("batchSize must be at least 1")
+
+    started: float = perf_counter()
+    found: dict | None = controller.getAliasUUID(name)
+    uuid: str | None = (found or {}).get("uuid")
+    item: dict | None = controller.getItem(uuid, lean=True) if uuid else None
+    if item is None:
+        raise ValueError(f"Alias {name} not found")
+    alias: dict = item.get("alias", {})
+    aliasType: str = _selected(alias.get("type"))
+    if aliasType not in FEED_TYPES:
+        raise ValueError(f"Alias {name} is a {aliasType} alias, expected {FEED_TYPES}")
+
+    report = FeedReport()
+    networks: list[_Networks] = _readFeed(source, report)
+    # pf tables only take addresses and networks, a host alias lists ranges
+    ranges: bool = aliasType == "host" and push == "setItem"
+    if push == "table":
+        # Earlier table pushes are live but not saved, diff against the table
+        current, others = _current(_tableEntries(controller, name), ranges)
+    else:
+        content = alias.get("content") or []
+        if isinstance(content, str):
+            content = content.split("\n")
+        current, others = _current(content, ranges)
+    report.kept = len(others)
+
+    # One pass to find the additions, the desired content is never held
+    matched: set[str] = set()
+
+    def additions() -> Iterator[str]:
+        for entry in _render(networks, ranges):
+            report.unique += 1
+            if entry in current:
+                matched.add(entry)
+            else:
+                report.added += 1
+                yield entry
+
+    if push == "table":
+        _pushTable(controller, name, "add", additions(), batchSize, maxWorkers, report)
+        removals: list[str] = [entry for entry in current if entry not in matched]
+        report.removed = len(removals)
+        _pushTable(controller, name, "delete", removals, batchSize, maxWorkers, report)
+    else:
+        for _ in additions():
+            pass
+        # Entries split or merged by the aggregation are replaced as a whole
+        report.removed = len({current[e] for e in current if e not in matched})
+        if report.changed:
+            body: str = "\n".join([*others, *_render(networks, ranges)])
+            response: dict | None = controller.setItem(
+                uuid, {"alias": {"content": body}}
+            )
+            report.requests += 1
+            if str((response or {}).get("result", "")).lower() != "saved":
+                report.failed += 1
+            elif reconfigure:
+                report.reconfigured = controller.reconfigure()
+
+    report.seconds = perf_counter() - started
+    return report
@@ -0,0 +1,410 @@
+import os
+import csv
+import mmap
+import struct
+from io import TextIOWrapper
+from bisect import bisect_right
+from zipfile import ZipFile
+from dataclasses import dataclass, replace
+from ipaddress import ip_address, ip_network
+from typing import Iterable, Iterator
+
+from .model import AliasGeoIP
+from .model.regions import Region, RegionCountries
+
+# File layout: header, country codes, per country statistics, then for each
+# address family the sorted range starts, range ends (fixed width big endian,
+# so bytes compare like the numbers they encode) and country indexes.
+_MAGIC = b"NGGEOIP1"
+_HEADER = struct.Struct("<8sIII")
+_STATS = struct.Struct("<IIQII16s")
+_WIDTHS: dict[int, int] = {4: 4, 6: 16}
+
+_COUNTRY_LOOKUP: dict[str, tuple[str, Region]] = {
+    code: (name, region)
+    for region, countries in RegionCountries.items()
+    for name, code in countries.items()
+}
+
+
+@dataclass(frozen=True, slots=True)
+class GeoIPCountryStats:
+    """Number of ranges, CIDR prefixes and addresses a country expands to"""
+
+    code: str
+    name: str | None = None
+    region: Region | None = None
+    ipv4Ranges: int = 0
+    ipv4Prefixes: int = 0
+    ipv4Addresses: int = 0
+    ipv6Ranges: int = 0
+    ipv6Prefixes: int = 0
+    ipv6Addresses: int = 0
+
+    @property
+    def prefixes(self) -> int:
+        return self.ipv4Prefixes + self.ipv6Prefixes
+
+
+def _prefixCount(start: int, end: int, bits: int) -> int:
+    """The number of CIDR prefixes needed to cover the range [start, end]"""
+    count: int = 0
+    while start <= end:
+        size: int = start & -start if start else 1 << bits
+        while size > end - start + 1:
+            size >>= 1
+        start += size
+        count += 1
+    return count
+
+
+def _validCode(code: str) -> bool:
+    """Country codes are stored as fixed 2 byte records"""
+    return len(code) == 2 and code.isascii()
+
+
+def _parseRange(fields: list[str]) -> tuple[int, int, int, str] | None:
+    """Parse `network,code` or `start,end,code` (addresses or integers)"""
+    try:
+        if "/" in fields[0]:
+            network = ip_network(fields[0].strip(), strict=False)
+            first, last = network.network_address, network.broadcast_address
+            code: str = fields[1].strip().upper()
+            if not _validCode(code):
+                raise ValueError(f"Invalid country code {code!r}")
+            return network.version, int(first), int(last), code
+
+        start, end = fields[0].strip(), fields[1].strip()
+        if start.isdigit() and end.isdigit():
+            first, last = int(start), int(end)
+            version: int = 4 if last <= 0xFFFFFFFF else 6
+        else:
+            startAddress, endAddress = ip_address(start), ip_address(end)
+            first, last, version = (
+                int(startAddress),
+                int(endAddress),
+                startAddress.version,
+            )
+        code = fields[2].strip().upper()
+        if not _validCode(code):
+            raise ValueError(f"Invalid country code {code!r}")
+        return version, first, last, code
+    except (ValueError, IndexError):
+        # header rows and malformed lines
+        return None
+
+
+def _readMaxMind(source: str) -> Iterator[tuple[int, int, int, str]]:
+    """Read the GeoLite2 Country CSV files, from a zip archive or a directory"""
+    archive: ZipFile | None = ZipFile(source) if not os.path.isdir(source) else None
+
+    def _open(suffix: str) -> TextIOWrapper | None:
+        if archive is not None:
+            name = next((n for n in archive.namelist() if n.endswith(suffix)), None)
+            if name is None:
+                return None
+            return TextIOWrapper(archive.open(name), encoding="utf-8")
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.endswith(suffix):
+                    return open(os.path.join(root, name), encoding="utf-8")
+        return None
+
+    try:
+        locations = _open("Country-Locations-en.csv")
+        if locations is None:
+            raise ValueError("GeoLite2-Country-Locations-en.csv not found")
+        with locations:
+            countries: dict[str, str] = {
+                row["geoname_id"]: row["country_iso_code"]
+                for row in csv.DictReader(locations)
+                if row.get("country_iso_code")
+            }
+
+        for suffix in ("Country-Blocks-IPv4.csv", "Country-Blocks-IPv6.csv"):
+            blocks = _open(suffix)
+            if blocks is None:
+                continue
+            with blocks:
+                for row in csv.DictReader(blocks):
+                    code = countries.get(row["geoname_id"]) or countries.get(
+                        row["registered_country_geoname_id"]
+                    )
+                    if code and _validCode(code):
+                        network = ip_network(row["network"])
+                        yield (
+                            network.version,
+                            int(network.network_address),
+                            int(network.broadcast_address),
+                            code,
+                        )
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def _readRanges(source: str) -> Iterator[tuple[int, int, int, str]]:
+    if os.path.isdir(source) or source.endswith(".zip"):
+        yield from _readMaxMind(source)
+        return
+    with open(source, newline="", encoding="utf-8") as file:
+        for fields in csv.reader(file):
+            if fields and not fields[0].startswith("#"):
+                parsed = _parseRange(fields)
+                if parsed is not None:
+                    yield parsed
+
+
+class _Keys:
+    """Sequence view over fixed width keys in the mapped file, usable by bisect"""
+
+    __slots__ = ("_buffer", "_offset", "_width", "_count")
+
+    def __init__(self, buffer: mmap.mmap, offset: int, width: int, count: int) -> None:
+        self._buffer: mmap.mmap = buffer
+        self._offset: int = offset
+        self._width: int = width
+        self._count: int = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> bytes:
+        start: int = self._offset + index * self._width
+        return self._buffer[start : start + self._width]
+
+
+class GeoIPDatabase:
+    """Memory mapped GeoIP range database for offline country lookups
+
+    The database is compiled once from the GeoIP source OPNSense is configured
+    with (`getGeoIP()`), i.e. the MaxMind GeoLite2 Country CSV archive, or from a
+    plain `network,country` / `start,end,country` CSV file. The compiled file
+    holds sorted range arrays that are searched with `bisect` straight from the
+    memory map, so opening it costs nothing and it is shared by every process
+    that maps it.
+
+    Args:
+        `path (str)`: A database file written by `GeoIPDatabase.compile()`
+
+    Usage:
+        ```python
+        from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasGeoIP, GeoIPDatabase
+
+        database = GeoIPDatabase.compile("GeoLite2-Country-CSV.zip", "geoip.db")
+
+        database.lookup("8.8.8.8")  # "US"
+
+        alias = AliasGeoIP(name="NorthAmerica", content="US\\nCA\\nMX")
+        for code, stats in database.preview(alias).items():
+            print(code, stats.ipv4Prefixes, stats.ipv4Addresses)
+        ```
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        with open(path, "rb") as file:
+            self._buffer: mmap.mmap = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        magic, countryCount, ipv4Count, ipv6Count = _HEADER.unpack_from(self._buffer)
+        if magic != _MAGIC:
+            self._buffer.close()
+            raise ValueError(f"{path} is not a compiled GeoIP database")
+
+        offset: int = _HEADER.size
+        self._codes: list[str] = [
+            self._buffer[offset + i * 2 : offset + i * 2 + 2].decode()
+            for i in range(countryCount)
+        ]
+        offset += countryCount * 2
+
+        self._stats: dict[str, GeoIPCountryStats] = {}
+        for index, code in enumerate(self._codes):
+            v4Ranges, v4Prefixes, v4Addresses, v6Ranges, v6Prefixes, v6Addresses = (
+                _STATS.unpack_from(self._buffer, offset + index * _STATS.size)
+            )
+            name, region = _COUNTRY_LOOKUP.get(code, (None, None))
+            self._stats[code] = GeoIPCountryStats(
+                code=code,
+                name=name,
+                region=region,
+                ipv4Ranges=v4Ranges,
+                ipv4Prefixes=v4Prefixes,
+                ipv4Addresses=v4Addresses,
+                ipv6Ranges=v6Ranges,
+                ipv6Prefixes=v6Prefixes,
+                ipv6Addresses=int.from_bytes(v6Addresses, "big"),
+            )
+        offset += countryCount * _STATS.size
+
+        self._tables: dict[int, tuple[_Keys, _Keys, int]] = {}
+        for version, count in ((4, ipv4Count), (6, ipv6Count)):
+            width: int = _WIDTHS[version]
+            starts = _Keys(self._buffer, offset, width, count)
+            ends = _Keys(self._buffer, offset + count * width, width, count)
+            self._tables[version] = (starts, ends, offset + 2 * count * width)
+            offset += count * (2 * width + 2)
+
+    @classmethod
+    def compile(cls, source: str, target: str) -> "GeoIPDatabase":
+        """Compile a GeoIP source into a database file and open it
+
+        Args:
+            `source (str)`: A GeoLite2 Country CSV zip archive or directory, or a
+            CSV file with `network,country` or `start,end,country` rows
+            `target (str)`: The database file to write, replaced atomically
+
+        Returns:
+            `GeoIPDatabase`: The opened database
+        """
+        return cls.compileRanges(_readRanges(source), target)
+
+    @classmethod
+    def compileRanges(
+        cls, ranges: Iterable[tuple[int, int, int, str]], target: str
+    ) -> "GeoIPDatabase":
+        """Compile `(version, first, last, countryCode)` ranges into a database file
+
+        Args:
+            `ranges (Iterable[tuple[int, int, int, str]])`: Non overlapping ranges
+            `target (str)`: The database file to write, replaced atomically
+
+        Raises:
+            `ValueError`: If a country code is not 2 ASCII characters
+
+        Returns:
+            `GeoIPDatabase`: The opened database
+        """
+        families: dict[int, list[tuple[int, int, str]]] = {4: [], 6: []}
+        for version, first, last, code in ranges:
+            if not _validCode(code):
+                raise ValueError(f"Invalid country code {code!r}, expected 2 letters")
+            families[version].append((first, last, code))
+
+        codes: list[str] = sorted(
+            {code for rows in families.values() for _, _, code in rows}
+        )
+        indexes: dict[str, int] = {code: index for index, code in enumerate(codes)}
+        stats: dict[str, list[int]] = {code: [0, 0, 0, 0, 0, 0] for code in codes}
+
+        temporary: str = f"{target}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(
+                _HEADER.pack(_MAGIC, len(codes), len(families[4]), len(families[6]))
+            )
+            file.write("".join(codes).encode())
+
+            body: list[bytes] = []
+            for version, rows in families.items():
+                rows.sort()
+                width: int = _WIDTHS[version]
+                bits: int = width * 8
+                column: int = 0 if version == 4 else 3
+                for first, last, code in rows:
+                    counters = stats[code]
+                    counters[column] += 1
+                    counters[column + 1] += _prefixCount(first, last, bits)
+                    counters[column + 2] += last - first + 1
+                body.append(
+                    b"".join(first.to_bytes(width, "big") for first, _, _ in rows)
+                )
+                body.append(
+                    b"".join(last.to_bytes(width, "big") for _, last, _ in rows)
+                )
+                body.append(
+                    struct.pack(
+                        f"<{len(rows)}H", *(indexes[code] for _, _, code in rows)
+                    )
+                )
+
+            for code in codes:
+                v4Ranges, v4Prefixes, v4Addresses, v6Ranges, v6Prefixes, v6Addresses = (
+                    stats[code]
+                )
+                file.write(
+                    _STATS.pack(
+                        v4Ranges,
+                        v4Prefixes,
+                        v4Addresses,
+                        v6Ranges,
+                        v6Prefixes,
+                        v6Addresses.to_bytes(16, "big"),
+                    )
+                )
+            for chunk in body:
+                file.write(chunk)
+
+        os.replace(temporary, target)
+        return cls(target)
+
+    def lookup(self, address: str) -> str | None:
+        """The country code an IP address belongs to
+
+        Args:
+            `address (str)`: An IPv4 or IPv6 address
+
+        Returns:
+            `str | None`: The country code or None if the address is not covered
+        """
+        parsed = ip_address(address)
+        starts, ends, codeOffset = self._tables[parsed.version]
+        key: bytes = parsed.packed
+        index: int = bisect_right(starts, key) - 1
+        if index < 0 or ends[index] < key:
+            return None
+        (codeIndex,) = struct.unpack_from("<H", self._buffer, codeOffset + index * 2)
+        return self._codes[codeIndex]
+
+    def countries(self) -> dict[str, GeoIPCountryStats]:
+        """Statistics for every country in the database"""
+        return dict(self._stats)
+
+    def preview(
+        self, alias: AliasGeoIP | str | Iterable[str], proto: str | None = None
+    ) -> dict[str, GeoIPCountryStats]:
+        """What a GeoIP alias will expand to, per country
+
+        Args:
+            `alias (AliasGeoIP | str | Iterable[str])`: The alias, its newline
+            separated `content`, or the country codes
+            `proto (str | None, optional)`: `IPv4`, `IPv6` or a comma separated
+            combination, defaults to the alias `proto` (both when empty)
+
+        Returns:
+            `dict[str, GeoIPCountryStats]`: The statistics per requested country,
+            countries missing from the database have all counters at zero
+        """
+        if isinstance(alias, AliasGeoIP):
+            proto = alias.proto if proto is None else proto
+            alias = alias.content
+        codes: Iterable[str] = alias.split("\n") if isinstance(alias, str) else alias
+
+        families: set[str] = {
+            part.strip() for part in (proto or "").split(",") if part.strip()
+        }
+        result: dict[str, GeoIPCountryStats] = {}
+        for code in codes:
+            code = code.strip().upper()
+            if not code:
+                continue
+            name, region = _COUNTRY_LOOKUP.get(code, (None, None))
+            stats = self._stats.get(
+                code, GeoIPCountryStats(code=code, name=name, region=region)
+            )
+            if families and "IPv4" not in families:
+                stats = replace(stats, ipv4Ranges=0, ipv4Prefixes=0, ipv4Addresses=0)
+            if families and "IPv6" not in families:
+                stats = replace(stats, ipv6Ranges=0, ipv6Prefixes=0, ipv6Addresses=0)
+            result[code] = stats
+        return result
+
+    def close(self) -> None:
+        self._buffer.close()
+
+    def __enter__(self) -> "GeoIPDatabase":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
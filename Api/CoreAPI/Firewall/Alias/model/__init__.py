@@ -1,15 +1,38 @@
 from enum import Enum
 from typing import List, Optional, Literal
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
 
 from .regions import Region, RegionCountries
+from .content import ContentError, ContentReport, splitContent, validateContent
 from NG_OPNSense.validators import (
     PROPERTY_NAME_REGEX,
     REGION_COUNTRY_CODE_LIST_REGEX,
 )
 
 ENABLE_THE_ALIAS = "Enable the alias"
+# Validation context key that enables the bulk content validator, e.g.
+# AliasHost.model_validate(data, context={VALIDATE_CONTENT: True})
+VALIDATE_CONTENT = "validateContent"
+
+
+def _validateContent(aliasType: str, content: str, info: ValidationInfo) -> str:
+    """Run the bulk content validator when enabled through the validation context"""
+    if not (info.context and info.context.get(VALIDATE_CONTENT)):
+        return content
+
+    report: ContentReport = validateContent(aliasType, content)
+    if not report.valid:
+        shown: str = "\n".join(
+            f"  entry {error.index}: {error.entry!r} ({error.reason})"
+            for error in report.errors[:20]
+        )
+        more: int = len(report.errors) - 20
+        raise ValueError(
+            f"{len(report.errors)} invalid {aliasType} entries:\n{shown}"
+            + (f"\n  ... and {more} more" if more > 0 else "")
+        )
+    return report.content
 
 
 # Enum for Alias Type options
@@ -88,14 +111,26 @@ class AliasBaseWStatistics(AliasBaseOptions):
 class AliasHost(AliasBaseWStatistics):
     type: Literal["host"] = "host"
 
+    @field_validator("content")
+    def validate_content(cls, v, info: ValidationInfo):
+        return _validateContent("host", v, info)
+
 
 class AliasNetworks(AliasBaseWStatistics):
     type: Literal["network"] = "network"
 
+    @field_validator("content")
+    def validate_content(cls, v, info: ValidationInfo):
+        return _validateContent("network", v, info)
+
 
 class AliasPort(AliasBaseOptions):
     type: Literal["port"] = "port"
 
+    @field_validator("content")
+    def validate_content(cls, v, info: ValidationInfo):
+        return _validateContent("port", v, info)
+
 
 class AliasURL(AliasBaseWStatistics):
     type: Literal["url"] = "url"
@@ -132,6 +167,10 @@ class AliasNetworkGroup(AliasBaseWStatistics):
 class AliasMAC(AliasBaseWStatistics):
     type: Literal["mac"] = "mac"
 
+    @field_validator("content")
+    def validate_content(cls, v, info: ValidationInfo):
+        return _validateContent("mac", v, info)
+
 
 class AliasBgpASN(AliasBaseWStatistics):
     type: Literal["asn"] = "asn"
@@ -0,0 +1,211 @@
+from re import compile
+from dataclasses import dataclass, field
+from ipaddress import ip_address
+from socket import AF_INET, AF_INET6, inet_ntop, inet_pton
+from typing import Callable, Iterable
+
+# Entries are separated by newlines in the API, the GUI also accepts commas
+_SEPARATORS = compile(r"[\n,]")
+_HOSTNAME = compile(
+    r"(?=.{1,253}$)(?!-)[A-Za-z0-9_-]{1,63}(?<!-)(?:\.(?!-)[A-Za-z0-9_-]{1,63}(?<!-))*\.?"
+)
+_ALIAS_NAME = compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+_MAC = compile(r"[0-9A-Fa-f]{2}(?:([:-])[0-9A-Fa-f]{2}(?:\1[0-9A-Fa-f]{2}){0,4})?")
+_MAC_BARE = compile(r"[0-9A-Fa-f]{12}")
+
+
+@dataclass(frozen=True, slots=True)
+class ContentError:
+    """An alias content entry that failed validation"""
+
+    index: int  # Position of the entry in the input, starting at 0
+    entry: str
+    reason: str
+
+
+@dataclass(slots=True)
+class ContentReport:
+    """The result of validating alias content in bulk"""
+
+    entries: list[str] = field(default_factory=list)  # normalized, in input order
+    errors: list[ContentError] = field(default_factory=list)
+    duplicates: int = 0
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    @property
+    def content(self) -> str:
+        """The normalized entries joined the way the API expects them"""
+        return "\n".join(self.entries)
+
+
+def _address(entry: str) -> str:
+    # inet_pton is strict (no short forms or leading zeros) and runs in C
+    try:
+        inet_pton(AF_INET, entry)
+        return entry
+    except OSError:
+        pass
+    try:
+        return inet_ntop(AF_INET6, inet_pton(AF_INET6, entry))
+    except OSError:
+        raise ValueError("not an IP address") from None
+
+
+def _network(entry: str) -> str:
+    address, _, prefix = entry.partition("/")
+    if not prefix:
+        return _address(entry)
+
+    try:
+        family, packed = AF_INET, inet_pton(AF_INET, address)
+    except OSError:
+        try:
+            family, packed = AF_INET6, inet_pton(AF_INET6, address)
+        except OSError:
+            raise ValueError("not a network address") from None
+
+    bits: int = len(packed) * 8
+    if not prefix.isdigit() or int(prefix) > bits:
+        raise ValueError("prefix length out of range")
+
+    # Mask the host bits without building an ip_network
+    length: int = int(prefix)
+    value: int = int.from_bytes(packed, "big")
+    masked: int = value & ~((1 << (bits - length)) - 1)
+    if family == AF_INET and masked == value and prefix == str(length):
+        return entry
+    return f"{inet_ntop(family, masked.to_bytes(len(packed), 'big'))}/{length}"
+
+
+def _host(entry: str) -> str:
+    try:
+        return _address(entry)
+    except ValueError:
+        pass
+
+    if "-" in entry:
+        first, _, last = entry.partition("-")
+        try:
+            start, end = ip_address(first), ip_address(last)
+        except ValueError:
+            start = end = None
+        if start is not None:
+            if start.version != end.version or start > end:
+                raise ValueError("invalid address range")
+            return f"{start}-{end}"
+
+    # All numeric names are malformed addresses, not hostnames
+    if (
+        _HOSTNAME.fullmatch(entry)
+        and not entry.rstrip(".").rpartition(".")[2].isdigit()
+    ):
+        return entry.lower()
+    raise ValueError("not an IP address, range, hostname or alias")
+
+
+def _networkEntry(entry: str) -> str:
+    try:
+        return _network(entry)
+    except ValueError:
+        if _ALIAS_NAME.fullmatch(entry):
+            return entry
+        raise ValueError("not a network, IP address or alias")
+
+
+def _port(entry: str) -> str:
+    if entry.isdigit():
+        port = int(entry)
+        if 0 < port < 65536:
+            return str(port)
+        raise ValueError("port out of range")
+    if ":" in entry:
+        first, _, last = entry.partition(":")
+        if first.isdigit() and last.isdigit():
+            start, end = int(first), int(last)
+            if 0 < start <= end < 65536:
+                return f"{start}:{end}"
+            raise ValueError("invalid port range")
+    if _ALIAS_NAME.fullmatch(entry):
+        return entry
+    raise ValueError("not a port, port range or alias")
+
+
+def _mac(entry: str) -> str:
+    if _MAC_BARE.fullmatch(entry):
+        entry = ":".join(entry[i : i + 2] for i in range(0, 12, 2))
+    elif not _MAC.fullmatch(entry):
+        raise ValueError("not a (partial) MAC address")
+    return entry.replace("-", ":").lower()
+
+
+# Parser per alias type and whether entries may be negated with a leading "!"
+_PARSERS: dict[str, tuple[Callable[[str], str], bool]] = {
+    "host": (_host, True),
+    "network": (_networkEntry, True),
+    "port": (_port, False),
+    "mac": (_mac, False),
+}
+
+
+def splitContent(content: str | Iterable[str]) -> Iterable[str]:
+    """Split alias content on newlines and commas, a list is returned as is"""
+    if isinstance(content, str):
+        return _SEPARATORS.split(content)
+    return content
+
+
+def validateContent(
+    aliasType: str, content: str | Iterable[str], dedupe: bool = True
+) -> ContentReport:
+    """Validate and normalize alias content entries in bulk
+
+    Every entry is checked, so a single call reports all invalid lines with
+    their index instead of failing on the first one. Valid entries are
+    normalized (compressed IPv6, network addresses for CIDRs, lower case MACs
+    with colons, ports without leading zeros) and, optionally, deduplicated.
+
+    Args:
+        `aliasType (str)`: One of `host`, `network`, `port` or `mac`
+        `content (str | Iterable[str])`: Newline/comma separated content or the entries
+        `dedupe (bool, optional)`: Drop repeated entries after normalization.
+        Defaults to True.
+
+    Raises:
+        `ValueError`: If the alias type has no content validator
+
+    Returns:
+        `ContentReport`: The normalized entries and the errors
+    """
+    kind: str = str(getattr(aliasType, "value", aliasType))
+    if kind not in _PARSERS:
+        raise ValueError(f"No content validator for alias type {kind}")
+    parser, negatable = _PARSERS[kind]
+
+    report = ContentReport()
+    entries: list[str] = report.entries
+    errors: list[ContentError] = report.errors
+    seen: set[str] = set()
+
+    for index, raw in enumerate(splitContent(content)):
+        entry: str = raw.strip()
+        if not entry:
+            continue
+        negated: bool = negatable and entry[0] == "!"
+        try:
+            normalized: str = parser(entry[1:] if negated else entry)
+        except ValueError as e:
+            errors.append(ContentError(index, entry, str(e)))
+            continue
+        if negated:
+            normalized = "!" + normalized
+        if dedupe:
+            if normalized in seen:
+                report.duplicates += 1
+                continue
+            seen.add(normalized)
+        entries.append(normalized)
+
+    return report
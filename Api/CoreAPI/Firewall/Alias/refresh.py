@@ -0,0 +1,239 @@
+from math import ceil, gcd
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .batch import TransactionResult
+
+if TYPE_CHECKING:
+    from . import AliasController
+
+DAY: int = 86400
+# Longest cycle the planner balances over, periods that don't divide it are
+# balanced approximately
+MAX_HORIZON: int = 7 * DAY
+
+
+@dataclass(slots=True)
+class ScheduledRefresh:
+    """The refresh period of a urltable alias and the offset assigned to it
+
+    The firewall downloads a table once it is older than `updatefreq` days, so
+    the phase of an alias is the time of its last download. An offset is
+    applied by stretching one period: `staggered` days until the next download,
+    then `updatefreq` again.
+    """
+
+    uuid: str
+    name: str
+    period: int  # seconds
+    offset: int = 0  # seconds
+
+    @property
+    def updatefreq(self) -> str:
+        return _days(self.period)
+
+    @property
+    def staggered(self) -> str:
+        return _days(self.period + self.offset)
+
+
+@dataclass(slots=True)
+class FetchLoad:
+    """Simulated table downloads per minute, starting when the plan is applied"""
+
+    perMinute: list[int] = field(default_factory=list)
+
+    @property
+    def fetches(self) -> int:
+        return sum(self.perMinute)
+
+    @property
+    def peak(self) -> int:
+        return max(self.perMinute, default=0)
+
+    @property
+    def busiestMinute(self) -> int | None:
+        return self.perMinute.index(self.peak) if self.peak else None
+
+    def summary(self) -> dict:
+        busy: list[int] = [count for count in self.perMinute if count]
+        return {
+            "minutes": len(self.perMinute),
+            "fetches": self.fetches,
+            "peak": self.peak,
+            "busiestMinute": self.busiestMinute,
+            "busyMinutes": len(busy),
+            "meanPerBusyMinute": round(sum(busy) / len(busy), 2) if busy else 0,
+        }
+
+
+@dataclass(slots=True)
+class RefreshPlan:
+    """Refresh offsets for the urltable aliases of a snapshot, see `planRefresh()`
+
+    - `refreshes`: every scheduled urltable alias with its offset
+    - `unscheduled`: names of urltable aliases without an `updatefreq`
+    """
+
+    refreshes: list[ScheduledRefresh] = field(default_factory=list)
+    unscheduled: list[str] = field(default_factory=list)
+    tick: int = 60
+
+    @property
+    def settleAfter(self) -> int:
+        """Seconds after `apply()` every staggered alias has downloaded once"""
+        return (
+            max((r.period + r.offset for r in self.refreshes if r.offset), default=0)
+            + self.tick
+        )
+
+    def apply(
+        self, controller: "AliasController", maxWorkers: int | None = None
+    ) -> TransactionResult:
+        """Stretch the next period of every alias by its offset, one reconfigure
+
+        Call `settle()` once `settleAfter` seconds have passed.
+        """
+        with controller.transaction(maxWorkers, captureRollback=False) as tx:
+            for refresh in self.refreshes:
+                if refresh.offset:
+                    tx.setItem(
+                        refresh.uuid, {"alias": {"updatefreq": refresh.staggered}}
+                    )
+        return tx.result
+
+    def settle(
+        self, controller: "AliasController", maxWorkers: int | None = None
+    ) -> TransactionResult:
+        """Restore the periods, the aliases keep the offsets they downloaded at"""
+        with controller.transaction(maxWorkers, captureRollback=False) as tx:
+            for refresh in self.refreshes:
+                if refresh.offset:
+                    tx.setItem(
+                        refresh.uuid, {"alias": {"updatefreq": refresh.updatefreq}}
+                    )
+        return tx.result
+
+    def simulate(self, hours: float | None = None, staggered: bool = True) -> FetchLoad:
+        """Simulate the downloads per minute
+
+        Every alias is assumed to have downloaded its table when the plan is
+        applied, as they do after being created or reconfigured together. A
+        download happens on the first `tick` at which the table is due.
+
+        Args:
+            `hours (float | None, optional)`: Length of the simulation, defaults
+            to the settling time plus two of the longest periods
+            `staggered (bool, optional)`: Simulate with the plan applied, False
+            simulates the current schedule. Defaults to True.
+
+        Returns:
+            `FetchLoad`: Downloads per minute
+        """
+        if hours is None:
+            longest: int = max((r.period for r in self.refreshes), default=0)
+            hours = (self.settleAfter + 2 * longest) / 3600
+        end: float = hours * 3600
+        perMinute: list[int] = [0] * ceil(end / 60)
+        for refresh in self.refreshes:
+            due: int = refresh.period + (refresh.offset if staggered else 0)
+            while True:
+                fetched: int = ceil(due / self.tick) * self.tick
+                if fetched >= end:
+                    break
+                perMinute[fetched // 60] += 1
+                due = fetched + refresh.period
+        return FetchLoad(perMinute)
+
+    def report(self, hours: float | None = None) -> dict:
+        """The simulated load of the current schedule and of the plan"""
+        return {
+            "aliases": len(self.refreshes),
+            "unscheduled": len(self.unscheduled),
+            "settleAfter": self.settleAfter,
+            "before": self.simulate(hours, staggered=False).summary(),
+            "after": self.simulate(hours, staggered=True).summary(),
+        }
+
+
+def _days(seconds: int) -> str:
+    return f"{seconds / DAY:.6f}".rstrip("0").rstrip(".")
+
+
+def _selected(value) -> str:
+    """The value of a field from a lean or a full `get()` snapshot"""
+    if isinstance(value, list):
+        return value[0] if value else ""
+    if isinstance(value, dict):
+        return next((key for key, o in value.items() if o.get("selected")), "")
+    return "" if value is None else str(value)
+
+
+def _goldenOrder(ticks: int) -> list[int]:
+    """Every offset below `ticks`, each next one far from the ones before"""
+    step: int = max(1, round(ticks * 0.6180339887))
+    while gcd(step, ticks) != 1:
+        step += 1
+    return [(i * step) % ticks for i in range(ticks)]
+
+
+def urlTableAliases(snapshot: dict) -> list[tuple[str, dict]]:
+    """The `(uuid, alias)` pairs of the urltable aliases of a `get()` snapshot"""
+    aliases: dict = snapshot.get("alias", {}).get("aliases", {}).get("alias", {})
+    return [
+        (uuid, alias)
+        for uuid, alias in aliases.items()
+        if _selected(alias.get("type")) == "urltable"
+    ]
+
+
+def planRefresh(snapshot: dict, tick: int = 60) -> RefreshPlan:
+    """Spread the downloads of the urltable aliases of a snapshot over their periods
+
+    Aliases are placed one at a time, shortest period first, at the offset whose
+    downloads land on the least loaded ticks of a common cycle. Aliases with
+    the same period are spread evenly and longer periods fill the gaps between
+    the downloads of shorter ones. Offsets are multiples of `tick`.
+
+    Args:
+        `snapshot (dict)`: A `get()` or `get(lean=True)` response
+        `tick (int, optional)`: Seconds between the firewall's checks for due
+        tables, the resolution of the offsets. Defaults to 60.
+
+    Returns:
+        `RefreshPlan`: The offsets, to `apply()`, `settle()` and `simulate()`
+    """
+    plan = RefreshPlan(tick=tick)
+    for uuid, alias in urlTableAliases(snapshot):
+        try:
+            days: float = float(_selected(alias.get("updatefreq")))
+        except ValueError:
+            days = 0
+        if days <= 0:
+            plan.unscheduled.append(alias.get("name", uuid))
+            continue
+        period: int = max(1, round(days * DAY / tick)) * tick
+        plan.refreshes.append(ScheduledRefresh(uuid, alias.get("name", uuid), period))
+
+    if not plan.refreshes:
+        return plan
+
+    # The cycle after which every schedule repeats, in ticks
+    horizon: int = 1
+    for refresh in plan.refreshes:
+        ticks: int = refresh.period // tick
+        horizon = min(horizon * ticks // gcd(horizon, ticks), MAX_HORIZON // tick)
+    load: list[int] = [0] * horizon
+
+    for refresh in sorted(plan.refreshes, key=lambda r: (r.period, r.name)):
+        ticks = min(refresh.period // tick, horizon)
+        # Ties go to the first offset in golden ratio order, so aliases sharing
+        # a period are spaced evenly rather than in consecutive minutes
+        best: int = min(
+            _goldenOrder(ticks),
+            key=lambda offset: (max(load[offset::ticks]), sum(load[offset::ticks])),
+        )
+        for slot in range(best, horizon, ticks):
+            load[slot] += 1
+        refresh.offset = best * tick
+    return plan
@@ -0,0 +1,186 @@
+"""
+An alias snapshot shared by the worker processes of a host
+
+Sharing saves requests, not memory: the firewall is asked once per `ttl` for
+the whole host, but every process decodes its own copy of the snapshot, since
+the controllers hand out plain dicts. The snapshot is written with `marshal`,
+which decodes several times faster than JSON, and the file is only mapped while
+it is decoded.
+"""
+
+import os
+import mmap
+import struct
+import marshal
+from time import monotonic, sleep, time
+from threading import Lock
+from typing import TYPE_CHECKING, Any
+
+from NG_OPNSense.cache import cacheKey, userCacheDir
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows, every process refreshes on its own
+    fcntl = None
+
+if TYPE_CHECKING:
+    from . import AliasController
+
+# magic, fetched at (epoch seconds), marshal format version
+_HEADER = struct.Struct("<8sdI")
+_MAGIC = b"NGALIAS1"
+
+
+class SharedAliasCache:
+    """Alias snapshot shared by every process on the host through a mapped file
+
+    One serialized `get()` snapshot is kept per firewall in the user cache
+    directory. Processes decode the file once per generation into a private
+    copy, so workers don't send their own requests. When the snapshot is older than
+    `ttl`, a single process wins a non-blocking file lock and refreshes it by
+    writing a new file and atomically renaming it over the old one, while the
+    others keep serving the previous snapshot. Only a process with no
+    snapshot at all waits for the refresher.
+
+    Args:
+        `controller (AliasController)`: The controller used to refresh the snapshot
+        `ttl (float, optional)`: Seconds a snapshot is considered fresh. Defaults to 30.
+        `lean (bool, optional)`: Store the lean form of `get()`. Defaults to True.
+        `path (str | None, optional)`: The snapshot file, defaults to a file per
+        firewall in the user cache directory.
+        `waitTimeout (float, optional)`: Seconds to wait for another process's
+        refresh when there is no snapshot yet. Defaults to 30.
+
+    Note:
+        The returned snapshot is shared by all callers in the process and must
+        not be modified.
+
+    Usage:
+        ```python
+        cache = SharedAliasCache(opnsense.coreAPI.firewall.alias, ttl=30)
+        aliases = cache.get()
+        ```
+    """
+
+    def __init__(
+        self,
+        controller: "AliasController",
+        ttl: float = 30,
+        lean: bool = True,
+        path: str | None = None,
+        waitTimeout: float = 30,
+    ) -> None:
+        self.controller: "AliasController" = controller
+        self.ttl: float = ttl
+        self.lean: bool = lean
+        self.waitTimeout: float = waitTimeout
+        self.path: str = path or os.path.join(
+            userCacheDir(),
+            f"aliases-{cacheKey(controller.url, controller.apiKey, str(lean))}.snapshot",
+        )
+        self.refreshes: int = 0  # refreshes performed by this process
+
+        self._lock: Lock = Lock()
+        # The inode and mtime of the decoded file, None without a snapshot
+        self._identity: tuple[int, int] | None = None
+        self._fetchedAt: float = 0.0
+        self._data: Any = None
+
+    @property
+    def age(self) -> float | None:
+        """Seconds since the loaded snapshot was fetched, None without a snapshot"""
+        return None if self._identity is None else time() - self._fetchedAt
+
+    def get(self) -> dict | None:
+        """The alias snapshot, refreshed first if it is stale and no one else is
+
+        Returns:
+            `dict | None`: The snapshot or None if there is none and it could not
+            be fetched
+        """
+        with self._lock:
+            self._remap()
+            if self._identity is not None and time() - self._fetchedAt < self.ttl:
+                return self._data
+
+            if self._refresh(blocking=self._identity is None):
+                self._remap()
+            return self._data
+
+    def refresh(self) -> dict | None:
+        """Fetch a new snapshot now, waiting for a concurrent refresh if needed"""
+        with self._lock:
+            self._refresh(blocking=True, force=True)
+            self._remap()
+            return self._data
+
+    def close(self) -> None:
+        with self._lock:
+            self._identity = self._data = None
+
+    def _refresh(self, blocking: bool, force: bool = False) -> bool:
+        """Refresh the file if this process wins the election, True if it changed"""
+        with open(f"{self.path}.lock", "a+") as lockFile:
+            if not self._acquire(lockFile, blocking):
+                return False
+            try:
+                # Someone else may have refreshed while we waited for the lock
+                if not force and self._remap() and time() - self._fetchedAt < self.ttl:
+                    return True
+
+                data: dict | None = self.controller.get(lean=self.lean)
+                if data is None:
+                    return False
+                self._write(data)
+                self.refreshes += 1
+                return True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    def _acquire(self, lockFile, blocking: bool) -> bool:
+        if fcntl is None:
+            return True
+        deadline: float = monotonic() + self.waitTimeout
+        while True:
+            try:
+                fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if not blocking or monotonic() > deadline:
+                    return False
+                sleep(0.05)
+
+    def _write(self, data: dict) -> None:
+        temporary: str = f"{self.path}.{os.getpid()}.tmp"
+        fd: int = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, time(), marshal.version))
+            file.write(marshal.dumps(data))
+        os.replace(temporary, self.path)
+
+    def _remap(self) -> bool:
+        """Load the snapshot file if it was replaced since it was last loaded
+
+        Returns:
+            `bool`: True if a snapshot is loaded
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._identity is not None
+
+        identity: tuple[int, int] = (stat.st_ino, stat.st_mtime_ns)
+        if identity == self._identity:
+            return True
+
+        # Decoded straight from the mapping, which is closed right after
+        with open(self.path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                magic, fetchedAt, version = _HEADER.unpack_from(buffer)
+                if magic != _MAGIC or version != marshal.version:
+                    return self._identity is not None
+                with memoryview(buffer) as view:
+                    data = marshal.loads(view[_HEADER.size :])
+        self._identity, self._fetchedAt, self._data = identity, fetchedAt, data
+        return True
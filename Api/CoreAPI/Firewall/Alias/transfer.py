@@ -0,0 +1,287 @@
+import csv
+from json import dumps, loads
+from itertools import islice
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, Iterator, TextIO
+
+from pydantic import ValidationError
+
+from NG_OPNSense.concurrency import AdaptiveLimiter, executor
+
+from .model import AliasClass, AliasType
+
+if TYPE_CHECKING:
+    from . import AliasController
+
+# Columns of an exported alias, in CSV column order
+EXPORT_FIELDS: list[str] = [
+    "name",
+    "type",
+    "enabled",
+    "proto",
+    "interface",
+    "counters",
+    "updatefreq",
+    "content",
+    "categories",
+    "description",
+]
+FORMATS: tuple[str, ...] = ("ndjson", "csv")
+
+
+@dataclass(frozen=True, slots=True)
+class ImportLineError:
+    """A line of an import that could not be parsed, validated or saved"""
+
+    line: int
+    name: str | None
+    error: str
+
+
+@dataclass(slots=True)
+class ImportReport:
+    """The outcome of a streamed import"""
+
+    imported: int = 0
+    errors: list[ImportLineError] = field(default_factory=list)
+    reconfigured: dict | None = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def _checkFormat(format: str) -> None:
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported format {format!r}, use one of {FORMATS}")
+
+
+def _exportRecord(row: dict) -> dict:
+    alias: dict = row.get("alias", row)
+    record: dict = {}
+    for name in EXPORT_FIELDS:
+        value = alias.get(name, "")
+        if isinstance(value, list):
+            value = ("\n" if name == "content" else ",").join(value)
+        record[name] = "" if value is None else value
+    return record
+
+
+def exportAliases(
+    controller: "AliasController",
+    stream: TextIO,
+    format: str = "ndjson",
+    details: bool = False,
+    pageSize: int = 500,
+    maxWorkers: int | AdaptiveLimiter = 4,
+) -> int:
+    """Write every alias to a text stream, one alias per line
+
+    See `AliasController.export()`.
+    """
+    _checkFormat(format)
+    writer: csv.DictWriter | None = None
+    if format == "csv":
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    def fetchDetails(rows: list[dict]) -> Iterable[dict]:
+        if not details:
+            return rows
+        return pool.map(lambda row: controller.getItem(row["uuid"], lean=True), rows)
+
+    written: int = 0
+    rows: Iterator[dict] = controller._searchRows(rowCount=pageSize)
+    with executor(maxWorkers) as pool:
+        while page := list(islice(rows, pageSize)):
+            for item in fetchDetails(page):
+                if item is None:
+                    raise RuntimeError("Failed to fetch alias details")
+                record: dict = _exportRecord(item)
+                if writer is not None:
+                    writer.writerow(record)
+                else:
+                    stream.write(dumps(record) + "\n")
+                written += 1
+    return written
+
+
+def _readRecords(stream: TextIO, format: str) -> Iterator[tuple[int, dict | None, str]]:
+    """Yield `(line, record, error)` for every non blank line of the stream"""
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record, ""
+        return
+
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = loads(text)
+        except ValueError as e:
+            yield line, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line, None, "Expected a JSON object"
+            continue
+        yield line, record, ""
+
+
+def _validateRecord(record: dict) -> dict:
+    """Validate a record against the model of its alias type
+
+    Returns:
+        `dict`: The record to send, empty fields removed and model defaults applied
+
+    Raises:
+        `ValueError`: If the type is unknown or the record is invalid
+    """
+    record = {key: value for key, value in record.items() if value not in ("", None)}
+    try:
+        modelClass = AliasClass[AliasType(record.get("type")).name].value
+    except ValueError:
+        raise ValueError(f"Unknown alias type {record.get('type')!r}") from None
+
+    try:
+        model = modelClass(**record)
+    except ValidationError as e:
+        reasons: str = "; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+            for error in e.errors()
+        )
+        raise ValueError(reasons) from None
+
+    # Fields the model doesn't know about (proto, interface, ...) are kept as is
+    return {**record, **model.model_dump(exclude_none=True)}
+
+
+def _saveError(response: dict | None) -> str | None:
+    if response is None:
+        return "Request failed"
+    if str(response.get("result", "")).lower() == "saved":
+        return None
+    validations: dict = response.get("validations") or {}
+    if validations:
+        return "; ".join(f"{key}: {message}" for key, message in validations.items())
+    return f"Unexpected response: {dumps(response)}"
+
+
+def importAliases(
+    controller: "AliasController",
+    stream: TextIO,
+    format: str = "ndjson",
+    batchSize: int = 100,
+    maxWorkers: int | AdaptiveLimiter = 4,
+    reconfigure: bool = True,
+) -> ImportReport:
+    """Create the aliases read from a text stream, see `AliasController.import_()`"""
+    _checkFormat(format)
+    report = ImportReport()
+    records: Iterator[tuple[int, dict | None, str]] = _readRecords(stream, format)
+
+    with executor(maxWorkers) as pool:
+        while batch := list(islice(records, batchSize)):
+            pending: list[tuple[int, dict]] = []
+            for line, record, error in batch:
+                if record is None:
+                    report.errors.append(ImportLineError(line, None, error))
+                    continue
+                try:
+                    pending.append((line, _validateRecord(record)))
+                except ValueError as e:
+                    report.errors.append(
+                        ImportLineError(line, record.get("name"), str(e))
+                    )
+
+            responses = pool.map(lambda item: controller.addItem(item[1]), pending)
+            for (line, alias), response in zip(pending, responses):
+                error = _saveError(response)
+                if error is None:
+                    report.imported += 1
+                else:
+                    report.errors.append(
+                        ImportLineError(line, alias.get("name"), error)
+                    )
+
+    report.errors.sort(key=lambda error: error.line)
+    if reconfigure and report.imported:
+        report.reconfigured = controller.reconfigure()
+    return report
+
+
+@dataclass(slots=True)
+class BulkImportResult:
+    """The outcome of a server side bulk import
+
+    The firewall only saves an import if every alias in it is valid, `errors`
+    holds the rows that were rejected client side or by the firewall, numbered
+    from 1 in input order.
+    """
+
+    status: str | None = None
+    new: int = 0
+    existing: int = 0
+    sent: int = 0
+    errors: list[ImportLineError] = field(default_factory=list)
+    reconfigured: dict | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok" and not self.errors
+
+
+def _bulkRecord(alias) -> dict:
+    if hasattr(alias, "model_dump"):
+        return alias.model_dump(exclude_none=True)
+    return alias
+
+
+def bulkImportBody(
+    aliases: Iterable, errors: list[ImportLineError], rows: dict[str, int]
+) -> Iterator[bytes]:
+    """Yield the `import` request body, validating the aliases as it is streamed
+
+    The firewall reports validations by alias name, so the row of every sent
+    alias is recorded in `rows` by name. Invalid rows are left out and added
+    to `errors`.
+    """
+    yield b'{"data":{'
+    separator: bytes = b""
+    for row, alias in enumerate(aliases, start=1):
+        record: dict = _bulkRecord(alias)
+        try:
+            validated: dict = _validateRecord(record)
+        except ValueError as e:
+            errors.append(ImportLineError(row, record.get("name"), str(e)))
+            continue
+        # A repeated name updates the same alias, the last row is the one saved
+        rows[validated["name"]] = row
+        yield separator + f'"row{row}":'.encode() + dumps(validated).encode()
+        separator = b","
+    yield b"}}"
+
+
+def bulkImportResult(
+    response: dict, errors: list[ImportLineError], rows: dict[str, int]
+) -> BulkImportResult:
+    """Map the response of the `import` endpoint back to input rows
+
+    Validations are keyed `<alias name>.<field>`, rows that can't be resolved
+    are reported as line 0.
+    """
+    result = BulkImportResult(
+        status=response.get("status"),
+        new=int(response.get("new", 0)),
+        existing=int(response.get("existing", 0)),
+        errors=errors,
+    )
+    for key, message in (response.get("validations") or {}).items():
+        # Alias names can't contain dots, the field name follows the last one
+        name, dot, fieldName = str(key).rpartition(".")
+        if not dot:
+            name, fieldName = fieldName, ""
+        error: str = f"{fieldName}: {message}" if fieldName else str(message)
+        errors.append(ImportLineError(rows.get(name, 0), name or None, error))
+    errors.sort(key=lambda error: error.line)
+    return result
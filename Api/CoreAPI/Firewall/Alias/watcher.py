@@ -0,0 +1,185 @@
+import asyncio
+from enum import Enum
+from hashlib import blake2b
+from json import dumps
+from threading import Event
+from time import monotonic
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+
+from NG_OPNSense.exceptions import _report
+
+if TYPE_CHECKING:
+    from . import AliasController
+
+
+# Enum for the kind of change detected by the watcher
+class AliasEventType(str, Enum):
+    added: str = "added"
+    updated: str = "updated"
+    deleted: str = "deleted"
+
+
+@dataclass(frozen=True, slots=True)
+class AliasEvent:
+    """A change to a single alias detected between two polls"""
+
+    type: AliasEventType
+    uuid: str
+    name: str | None
+    item: dict | None = None  # getItem response for added/updated aliases
+
+
+def _fingerprint(row: dict, tableSize: int | None) -> bytes:
+    """Hash a searchItem row together with the pf table size of the alias"""
+    digest = blake2b(digest_size=16)
+    digest.update(dumps(row, sort_keys=True, separators=(",", ":")).encode())
+    digest.update(str(tableSize).encode())
+    return digest.digest()
+
+
+class AliasWatcher:
+    """Detects alias changes with cheap probes and yields them as events
+
+    Every poll fetches the `searchItem` rows (which carry no GUI option maps)
+    and `getTableSize`, and reduces each alias to a 16 byte fingerprint. Only
+    aliases whose fingerprint appeared, changed or vanished are reported, and
+    `getItem` is called for those alone when `details` is set.
+
+    The poll interval starts at `interval` and is multiplied by `backoff` after
+    every poll that found nothing, up to `maxInterval`. Any change snaps it back
+    to `interval`.
+
+    Args:
+        `controller (AliasController)`: The controller to watch
+        `interval (float, optional)`: Base poll interval in seconds. Defaults to 30.
+        `maxInterval (float, optional)`: Upper bound for the poll interval. Defaults to 300.
+        `backoff (float, optional)`: Interval multiplier for idle polls. Defaults to 2.0.
+        `details (bool, optional)`: Fetch `getItem` for added and updated aliases.
+        Defaults to True.
+        `emitInitial (bool, optional)`: Report every alias found by the first poll
+        as added. Defaults to False.
+
+    Usage:
+        ```python
+        for event in opnsense.coreAPI.firewall.alias.watch(interval=30):
+            print(event.type, event.name)
+        ```
+    """
+
+    def __init__(
+        self,
+        controller: "AliasController",
+        interval: float = 30,
+        maxInterval: float = 300,
+        backoff: float = 2.0,
+        details: bool = True,
+        emitInitial: bool = False,
+    ) -> None:
+        if interval <= 0 or maxInterval < interval or backoff < 1:
+            raise ValueError("Invalid poll interval configuration")
+
+        self.controller: "AliasController" = controller
+        self.interval: float = interval
+        self.maxInterval: float = maxInterval
+        self.backoff: float = backoff
+        self.details: bool = details
+        self.emitInitial: bool = emitInitial
+
+        # The interval that will be used before the next poll
+        self.currentInterval: float = interval
+        self._fingerprints: dict[str, bytes] | None = None
+        self._names: dict[str, str] = {}
+        self._stopped: Event = Event()
+
+    def poll(self) -> list[AliasEvent]:
+        """Probe the firewall once and return the changes since the previous poll
+
+        Returns:
+            `list[AliasEvent]`: The detected changes, empty if nothing changed or
+            the probe failed
+        """
+        try:
+            tableSizes: dict | None = self.controller.getTableSize()
+            if tableSizes is None:
+                # Already reported, empty sizes would flag every alias as updated
+                self._adjustInterval(changed=False)
+                return []
+            fingerprints: dict[str, bytes] = {}
+            names: dict[str, str] = {}
+            for row in self.controller._searchRows():
+                uuid: str = row["uuid"]
+                names[uuid] = row.get("name")
+                fingerprints[uuid] = _fingerprint(row, tableSizes.get(names[uuid]))
+        except Exception as e:
+            # Keep watching through outages, even in the raise error mode
+            _report("Failed to poll aliases", e)
+            self._adjustInterval(changed=False)
+            return []
+
+        previous: dict[str, bytes] | None = self._fingerprints
+        events: list[AliasEvent] = []
+
+        if previous is None:
+            if self.emitInitial:
+                events = [
+                    self._event(AliasEventType.added, uuid, names)
+                    for uuid in fingerprints
+                ]
+        else:
+            for uuid, fingerprint in fingerprints.items():
+                before: bytes | None = previous.get(uuid)
+                if before is None:
+                    events.append(self._event(AliasEventType.added, uuid, names))
+                elif before != fingerprint:
+                    events.append(self._event(AliasEventType.updated, uuid, names))
+            for uuid in previous.keys() - fingerprints.keys():
+                events.append(
+                    AliasEvent(
+                        type=AliasEventType.deleted,
+                        uuid=uuid,
+                        name=self._names.get(uuid),
+                    )
+                )
+
+        self._fingerprints = fingerprints
+        self._names = names
+        self._adjustInterval(changed=bool(events))
+        return events
+
+    def stop(self) -> None:
+        """Stop the iteration after the current poll"""
+        self._stopped.set()
+
+    def _event(
+        self, kind: AliasEventType, uuid: str, names: dict[str, str]
+    ) -> AliasEvent:
+        item: dict | None = self.controller.getItem(uuid) if self.details else None
+        return AliasEvent(type=kind, uuid=uuid, name=names.get(uuid), item=item)
+
+    def _adjustInterval(self, changed: bool) -> None:
+        if changed:
+            self.currentInterval = self.interval
+        else:
+            self.currentInterval = min(
+                self.currentInterval * self.backoff, self.maxInterval
+            )
+
+    def __iter__(self) -> Iterator[AliasEvent]:
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            started: float = monotonic()
+            yield from self.poll()
+            remaining: float = self.currentInterval - (monotonic() - started)
+            if remaining > 0:
+                self._stopped.wait(remaining)
+
+    async def __aiter__(self) -> AsyncIterator[AliasEvent]:
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            started: float = monotonic()
+            for event in await asyncio.to_thread(self.poll):
+                yield event
+            remaining: float = self.currentInterval - (monotonic() - started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
@@ -0,0 +1,322 @@
+from json import dumps
+from NG_OPNSense.exceptions import _failed
+from NG_OPNSense.helpers import _openSenseAPI, _openSenseJSON
+from NG_OPNSense.profiling import phase
+from NG_OPNSense.transport import Transport
+
+from .model import *
+from .batch import BatchResult, FilterBatch, RuleOperation, RuleResult
+
+
+class FilterController:
+    """Filter API class for managing the automation rules of the OPNSense Firewall
+
+    Rule changes are saved to the configuration and only take effect after
+    `apply()`. See `batch()` to apply many changes with a single reload.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        apiKey: str,
+        apiSecret: str,
+        transport: Transport | None = None,
+    ) -> None:
+        self.apiKey: str = apiKey
+        self.apiSecret: str = apiSecret
+        self.url: str = f"{url}/filter"
+        # Sends the requests, None uses the shared default transport
+        self.transport: Transport | None = transport
+
+    def addRule(self, rule: FilterRule | dict) -> dict | None:
+        """Add a filter rule to the OPNSense Firewall
+
+        Args:
+            `rule (FilterRule | dict)`: The rule, a dict is validated against
+            `FilterRule`, e.g.:
+
+            ```python
+            {
+                "action": "block",  # or FilterAction.block
+                "interface": "lan",
+                "protocol": "TCP",
+                "source_net": "10.0.0.0/24",
+                "destination_port": "22",
+                "description": "No SSH from the lab",
+            }
+            ```
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/addRule"
+            with phase("validate"):
+                if not isinstance(rule, FilterRule):
+                    rule = FilterRule(**rule)
+
+            with phase("encode"):
+                body: str = dumps(rule.body())
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                data=body,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to add filter rule", e)
+
+    def apply(self, rollbackRevision: str | None = None) -> dict | None:
+        """Apply the saved rules on the OPNSense Firewall
+
+        Args:
+            `rollbackRevision (str | None, optional)`: A revision from `savepoint()`.
+            The firewall restores it after 60 seconds unless `cancelRollback()`
+            is called. Defaults to None.
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/apply"
+            if rollbackRevision is not None:
+                url = f"{url}/{rollbackRevision}"
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to apply filter rules", e)
+
+    def batch(
+        self, maxWorkers: int = 4, confirm: bool = True, revertOnFailure: bool = True
+    ) -> FilterBatch:
+        """Stage rule changes and apply them with one savepoint, apply and confirm
+
+        Args:
+            `maxWorkers (int, optional)`: Maximum number of requests in flight
+            while committing. Defaults to 4.
+            `confirm (bool, optional)`: Cancel the rollback once the rules are
+            applied. Defaults to True.
+            `revertOnFailure (bool, optional)`: Restore the savepoint instead of
+            applying when a request failed. Defaults to True.
+
+        Returns:
+            `FilterBatch`: A context manager that commits on a clean exit
+        """
+        return FilterBatch(
+            controller=self,
+            maxWorkers=maxWorkers,
+            confirm=confirm,
+            revertOnFailure=revertOnFailure,
+        )
+
+    def cancelRollback(self, revision: str) -> dict | None:
+        """Keep the applied rules, stopping the rollback to `revision`
+
+        Args:
+            `revision (str)`: The revision passed to `apply()`
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/cancelRollback/{revision}"
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to cancel the filter rollback", e)
+
+    def delRule(self, uuid: str) -> dict | None:
+        """Delete a filter rule from the OPNSense Firewall
+
+        Args:
+            `uuid (str)`: The UUID of the rule to delete
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/delRule/{uuid}"
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to delete filter rule", e)
+
+    def getRule(self, uuid: str | None = None) -> dict | None:
+        """Get a filter rule from the OPNSense Firewall
+
+        Args:
+            `uuid (str | None, optional)`: The UUID of the rule, None returns the
+            defaults of a new rule. Defaults to None.
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/getRule"
+            if uuid is not None:
+                url = f"{url}/{uuid}"
+            return _openSenseJSON(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="GET",
+            )
+        except Exception as e:
+            return _failed("Failed to get filter rule", e)
+
+    def revert(self, revision: str) -> dict | None:
+        """Restore the rules saved in a savepoint
+
+        Args:
+            `revision (str)`: A revision from `savepoint()`
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/revert/{revision}"
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to revert filter rules", e)
+
+    def savepoint(self) -> dict | None:
+        """Save the current configuration as a revision to roll back to
+
+        Returns:
+            `dict | None`: The json response, with the `revision`, from the
+            OPNSense Firewall or None if the request failed
+        """
+        try:
+            url = f"{self.url}/savepoint"
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to create a filter savepoint", e)
+
+    def searchRule(
+        self, searchPhrase: str = "", current: int = 1, rowCount: int = -1
+    ) -> dict | None:
+        """Search the filter rules of the OPNSense Firewall
+
+        Args:
+            `searchPhrase (str, optional)`: Matched against the rule fields.
+            Defaults to "".
+            `current (int, optional)`: The page to return. Defaults to 1.
+            `rowCount (int, optional)`: The page size, -1 returns every rule.
+            Defaults to -1.
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/searchRule"
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                data=dumps(
+                    {
+                        "current": current,
+                        "rowCount": rowCount,
+                        "searchPhrase": searchPhrase,
+                    }
+                ),
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to search filter rules", e)
+
+    def setRule(self, uuid: str, dataToSet: dict) -> dict | None:
+        """Update a filter rule of the OPNSense Firewall
+
+        Args:
+            `uuid (str)`: The UUID of the rule to update
+            `dataToSet (dict)`: The fields to change, e.g. `{"rule": {"log": "1"}}`
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/setRule/{uuid}"
+            with phase("encode"):
+                body: str = dumps(dataToSet)
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                data=body,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to set filter rule", e)
+
+    def toggleRule(self, uuid: str, enabled: bool) -> dict | None:
+        """Enable or disable a filter rule
+
+        Args:
+            `uuid (str)`: The UUID of the rule to toggle
+            `enabled (bool)`: The state to set
+
+        Returns:
+            `dict | None`: The json response from the OPNSense Firewall or None if
+            the request failed
+        """
+        try:
+            url = f"{self.url}/toggleRule/{uuid}/{int(enabled)}"
+            response = _openSenseAPI(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+                Method="POST",
+            )
+            return response.json()
+        except Exception as e:
+            return _failed("Failed to toggle filter rule", e)
@@ -0,0 +1,234 @@
+from enum import Enum
+from threading import Lock
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable
+
+from NG_OPNSense.coalescing import CoalescingQueue, Mutation
+
+if TYPE_CHECKING:
+    from . import FilterController
+
+# The "result" values the rule endpoints report on success
+_SUCCESS: set[str] = {"saved", "deleted", "enabled", "disabled"}
+
+
+# Enum for the mutations a batch can stage
+class RuleOperation(str, Enum):
+    add: str = "addRule"
+    set: str = "setRule"
+    toggle: str = "toggleRule"
+    delete: str = "delRule"
+
+
+@dataclass(slots=True)
+class RuleResult:
+    """The outcome of one request sent by a batch"""
+
+    operation: RuleOperation
+    uuid: str | None
+    response: dict | None
+
+    @property
+    def ok(self) -> bool:
+        if not isinstance(self.response, dict):
+            return False
+        return str(self.response.get("result", "")).lower() in _SUCCESS
+
+
+@dataclass(slots=True)
+class BatchResult:
+    """The outcome of a committed batch
+
+    - `revision`: the savepoint the firewall rolls back to if the apply isn't
+      confirmed within 60 seconds
+    - `applied`: the response of `apply`, None if the rules weren't applied
+    - `confirmed`: the rollback timer was cancelled, the rules are final
+    - `reverted`: a request failed and the configuration was restored to the
+      savepoint without applying anything
+    """
+
+    results: list[RuleResult] = field(default_factory=list)
+    queued: int = 0  # mutations staged by the caller
+    revision: str | None = None
+    applied: dict | None = None
+    confirmed: bool = False
+    reverted: bool = False
+    created: list[str] = field(default_factory=list)
+
+    @property
+    def sent(self) -> int:
+        """Mutations sent after coalescing"""
+        return len(self.results)
+
+    @property
+    def failures(self) -> list[RuleResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures and (self.confirmed or not self.sent)
+
+
+def _statusOK(response: dict | None) -> bool:
+    """Whether a savepoint endpoint reported success, configd pads its "OK" """
+    if not isinstance(response, dict):
+        return False
+    return str(response.get("status", "")).strip().lower() == "ok"
+
+
+class FilterBatch:
+    """Stages filter rule changes and applies them with one savepoint cycle
+
+    Changes are coalesced per UUID while they are staged, like an
+    `AliasTransaction`. On commit the firewall takes a savepoint, the remaining
+    requests are sent with at most `maxWorkers` in flight, the rules are
+    applied once with the savepoint as rollback revision and the rollback is
+    cancelled. Applying reloads the whole ruleset, so 500 changes cost one
+    reload instead of 500.
+
+    If a request fails (and `revertOnFailure` is set) the configuration is
+    restored to the savepoint and nothing is applied. If the firewall can't be
+    reached after the apply, the rollback isn't cancelled and the firewall
+    restores the savepoint on its own after 60 seconds, so a rule that locks
+    out the API undoes itself.
+
+    Args:
+        `controller (FilterController)`: The controller to apply the changes with
+        `maxWorkers (int, optional)`: Maximum number of requests in flight. Defaults to 4.
+        `confirm (bool, optional)`: Cancel the rollback after the apply. Without it
+        the caller confirms with `cancelRollback(result.revision)`. Defaults to True.
+        `revertOnFailure (bool, optional)`: Restore the savepoint if a request
+        failed. Defaults to True.
+
+    Usage:
+        ```python
+        with opnsense.coreAPI.firewall.filter.batch() as batch:
+            for address in blocked:
+                batch.addRule({"action": "block", "source_net": address})
+            batch.toggleRule(uuid, False)
+
+        print(batch.result.ok, batch.result.revision)
+        ```
+    """
+
+    def __init__(
+        self,
+        controller: "FilterController",
+        maxWorkers: int = 4,
+        confirm: bool = True,
+        revertOnFailure: bool = True,
+    ) -> None:
+        if maxWorkers < 1:
+            raise ValueError("maxWorkers must be at least 1")
+
+        self.controller: "FilterController" = controller
+        self.maxWorkers: int = maxWorkers
+        self.confirm: bool = confirm
+        self.revertOnFailure: bool = revertOnFailure
+        self.result: BatchResult | None = None
+
+        self._lock: Lock = Lock()
+        self._queue: CoalescingQueue = CoalescingQueue("rule")
+
+    def addRule(self, rule) -> None:
+        """Stage the creation of a rule, see `FilterController.addRule()`"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.add(rule)
+
+    def setRule(self, uuid: str, dataToSet: dict) -> None:
+        """Stage an update of a rule, merged with earlier updates of the same UUID"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.set(uuid, dataToSet)
+
+    def toggleRule(self, uuid: str, enabled: bool) -> None:
+        """Stage enabling or disabling a rule, the last state staged wins"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.toggle(uuid, enabled)
+
+    def delRule(self, uuid: str) -> None:
+        """Stage the deletion of a rule, dropping the changes staged for it"""
+        with self._lock:
+            self._checkOpen()
+            self._queue.delete(uuid)
+
+    def discard(self) -> None:
+        """Drop every staged change without sending anything"""
+        with self._lock:
+            self._queue.clear()
+
+    def commit(self) -> BatchResult:
+        """Send the coalesced changes inside one savepoint, apply and confirm them
+
+        Returns:
+            `BatchResult`: The responses, the savepoint and how far the cycle got
+
+        Raises:
+            `RuntimeError`: If the batch was already committed
+        """
+        with self._lock:
+            self._checkOpen()
+            self.result = result = BatchResult(queued=self._queue.queued)
+            operations: list[tuple[RuleOperation, str | None, Callable[[], dict]]] = (
+                self._plan()
+            )
+        if not operations:
+            return result
+
+        controller = self.controller
+        savepoint: dict | None = controller.savepoint()
+        result.revision = (savepoint or {}).get("revision")
+        if not result.revision:
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.maxWorkers) as pool:
+            responses = pool.map(lambda operation: operation[2](), operations)
+            for (operation, uuid, _), response in zip(operations, responses):
+                outcome = RuleResult(operation, uuid, response)
+                result.results.append(outcome)
+                if outcome.ok and operation == RuleOperation.add:
+                    result.created.append(response.get("uuid"))
+
+        if result.failures and self.revertOnFailure:
+            result.reverted = _statusOK(controller.revert(result.revision))
+            return result
+        if not any(outcome.ok for outcome in result.results):
+            return result
+
+        result.applied = controller.apply(result.revision)
+        if _statusOK(result.applied) and self.confirm:
+            result.confirmed = _statusOK(controller.cancelRollback(result.revision))
+        return result
+
+    def _plan(self) -> list[tuple[RuleOperation, str | None, Callable[[], dict]]]:
+        controller = self.controller
+        send: dict[Mutation, Callable[[str | None, Any], dict]] = {
+            Mutation.add: lambda _, rule: controller.addRule(rule),
+            Mutation.set: lambda uuid, data: controller.setRule(uuid, data),
+            Mutation.toggle: lambda uuid, enabled: controller.toggleRule(uuid, enabled),
+            Mutation.delete: lambda uuid, _: controller.delRule(uuid),
+        }
+        return [
+            (
+                RuleOperation[mutation.name],
+                uuid,
+                lambda m=mutation, u=uuid, p=payload: send[m](u, p),
+            )
+            for mutation, uuid, payload in self._queue.plan()
+        ]
+
+    def _checkOpen(self) -> None:
+        if self.result is not None:
+            raise RuntimeError("Batch was already committed")
+
+    def __enter__(self) -> "FilterBatch":
+        return self
+
+    def __exit__(self, excType, *_) -> None:
+        if excType is None:
+            self.commit()
+        else:
+            self.discard()
@@ -0,0 +1,71 @@
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+ENABLE_THE_RULE = "Enable the rule"
+# Protocols that can match on ports
+PORT_PROTOCOLS: set[str] = {"TCP", "UDP", "TCP/UDP"}
+
+
+# Enum for the Action options, `pass` is a keyword so the member is `allow`
+class FilterAction(str, Enum):
+    allow: str = "pass"
+    block: str = "block"
+    reject: str = "reject"
+
+
+# Enum for the Direction options
+class FilterDirection(str, Enum):
+    inbound: str = "in"
+    outbound: str = "out"
+
+
+# Enum for the TCP/IP Version options
+class IPProtocol(str, Enum):
+    inet: str = "inet"
+    inet6: str = "inet6"
+    inet46: str = "inet46"
+
+
+# Filter Rule Class
+# Describes the fields of a rule, to view these go to Firewall -> Automation ->
+# Filter -> Add from the GUI. Multiple interfaces and categories are comma separated.
+class FilterRule(BaseModel):
+    enabled: int = Field(1, description=ENABLE_THE_RULE)
+    sequence: Optional[int] = Field(None, ge=1, le=999999)
+    action: FilterAction = FilterAction.allow
+    quick: int = Field(1, description="Stop processing on the first match")
+    interface: Optional[str] = None
+    direction: FilterDirection = FilterDirection.inbound
+    ipprotocol: IPProtocol = IPProtocol.inet
+    protocol: str = "any"
+    source_net: str = "any"
+    source_not: int = 0
+    source_port: Optional[str] = None
+    destination_net: str = "any"
+    destination_not: int = 0
+    destination_port: Optional[str] = None
+    gateway: Optional[str] = None
+    log: int = 0
+    categories: Optional[str] = None
+    description: Optional[str] = Field(None, max_length=255)
+
+    @field_validator("protocol")
+    def validate_protocol(cls, v):
+        return v if v.lower() == "any" else v.upper()
+
+    # The firewall rejects ports on protocols without them, fail before sending
+    @model_validator(mode="after")
+    def validate_ports(self):
+        if (self.source_port or self.destination_port) and (
+            self.protocol not in PORT_PROTOCOLS
+        ):
+            raise ValueError(
+                f"Ports can only be used with {', '.join(sorted(PORT_PROTOCOLS))}"
+            )
+        return self
+
+    def body(self) -> dict:
+        """The request body `addRule` and `setRule` expect"""
+        return {"rule": self.model_dump(mode="json", exclude_none=True)}
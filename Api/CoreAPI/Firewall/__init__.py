@@ -1,15 +1,36 @@
+from NG_OPNSense.cache import StaticDataCache
+from NG_OPNSense.transport import Transport
+
 from .Alias import AliasController
+from .Filter import FilterController
 
 
 class Firewall:
     """Firewall API class for interacting with OPNSense Firewall API"""
 
-    def __init__(self, url: str, apiKey: str, apiSecret: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        apiKey: str,
+        apiSecret: str,
+        cache: StaticDataCache | None = None,
+        transport: Transport | None = None,
+    ) -> None:
 
         self.apiKey: str = apiKey
         self.apiSecret: str = apiSecret
         self.url: str = f"{url}/firewall"
 
         self.alias: AliasController = AliasController(
-            url=self.url, apiKey=self.apiKey, apiSecret=self.apiSecret
+            url=self.url,
+            apiKey=self.apiKey,
+            apiSecret=self.apiSecret,
+            cache=cache,
+            transport=transport,
+        )
+        self.filter: FilterController = FilterController(
+            url=self.url,
+            apiKey=self.apiKey,
+            apiSecret=self.apiSecret,
+            transport=transport,
         )
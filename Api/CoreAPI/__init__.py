@@ -1,13 +1,29 @@
+from NG_OPNSense.cache import StaticDataCache
+from NG_OPNSense.transport import Transport
+
+from .Diagnostics import DiagnosticsController
 from .Firewall import Firewall
 
 
 class CoreAPI:
     """Main API class for interacting with OPNSense API"""
 
-    def __init__(self, url: str, apiKey: str, apiSecret: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        apiKey: str,
+        apiSecret: str,
+        cache: StaticDataCache | None = None,
+        transport: Transport | None = None,
+    ) -> None:
 
         self.apiKey: str = apiKey
         self.url: str = f"{url}/api"
         self.apiSecret: str = apiSecret
 
-        self.firewall = Firewall(self.url, self.apiKey, self.apiSecret)
+        self.firewall = Firewall(
+            self.url, self.apiKey, self.apiSecret, cache=cache, transport=transport
+        )
+        self.diagnostics: DiagnosticsController = DiagnosticsController(
+            self.url, self.apiKey, self.apiSecret, transport=transport
+        )
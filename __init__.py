@@ -4,22 +4,36 @@ All Rights Reserved.
 """
 
 from os import environ
-from traceback import format_exc
+from typing import TYPE_CHECKING
 
-from .Api import CoreAPI
-from .helpers import validateParams, _openSenseAPI
+from .cache import StaticDataCache, firmwareVersion
+from .tls import TLSConfig
+from .exceptions import _failed
+from .ha import HATransport
+from .helpers import defaultTransport, validateParams, _openSenseJSON
+from .transport import Transport, makeTransport
+
+if TYPE_CHECKING:
+    from .Api.CoreAPI.Diagnostics import ARPSnapshot
 
 
 class OPNSenseAPI:
     """Class to interact with the OPNSense API
 
     Args:
-        `url (str, optional)`: The URL of the OPNSense instance.
+        `url (str | list[str], optional)`: The URL of the OPNSense instance, or
+        the URLs of the nodes of a CARP cluster (see `HATransport`).
         Defaults to None.
         `apiKey (str, optional)`: The API key for the OPNSense instance.
         Defaults to None.
         `apiSecret (str, optional)`: The API secret for the OPNSense instance.
         Defaults to None.
+        `cache (bool | str, optional)`: Keep nearly static lookup data (countries,
+        categories, user groups, GeoIP settings) in an on-disk cache that is
+        invalidated on firmware upgrades. Pass a directory to override the user
+        cache directory. Defaults to False.
+        `probeInterval (float, optional)`: Seconds between the health probes of
+        a cluster. Defaults to 5.
 
     Raises:
         `AssertionError`: If the connection to the OPNSense instance fails
@@ -31,7 +45,8 @@ class OPNSenseAPI:
           environment variables.
 
         - The environment variables are: `OPNSENSE_URL`, `OPNSENSE_API_KEY`,
-          and `OPNSENSE_API_SECRET`.
+          and `OPNSENSE_API_SECRET`. `OPNSENSE_URL` may list the nodes of a
+          cluster separated by commas.
 
 
     Usage:
@@ -58,17 +73,30 @@ class OPNSenseAPI:
 
     def __init__(
         self,
-        url: str | None = None,
+        url: str | list[str] | None = None,
         apiKey: str | None = None,
         apiSecret: str | None = None,
+        cache: bool | str = False,
+        transport: Transport | str | None = None,
+        tls: TLSConfig | None = None,
+        probeInterval: float = 5.0,
     ) -> None:
         # Fetch the parameters from the environment if not provided
-        url: str = url or environ.get("OPNSENSE_URL")
+        url: str | list[str] = url or environ.get("OPNSENSE_URL")
         apiKey: str = apiKey or environ.get("OPNSENSE_API_KEY")
         apiSecret: str = apiSecret or environ.get("OPNSENSE_API_SECRET")
 
+        # A cluster is given as a list or as comma separated URLs
+        nodes: list[str] = (
+            [node.strip() for node in url.split(",") if node.strip()]
+            if isinstance(url, str)
+            else list(url or [])
+        )
+        url = nodes[0] if nodes else None
+
         # Validate the parameters
-        validateParams(url=url, apiKey=apiKey, apiSecret=apiSecret)
+        for node in nodes or [url]:
+            validateParams(url=node, apiKey=apiKey, apiSecret=apiSecret)
 
         # Set the parameters
         self.url: str = url
@@ -80,40 +108,127 @@ class OPNSenseAPI:
         assert self.apiKey is not None
         assert self.apiSecret is not None
 
+        # Sends the requests, None uses the shared default transport
+        self.transport: Transport | None = makeTransport(transport, tls=tls)
+        if len(nodes) > 1:
+            # Requests are built against the first node and routed by the probes
+            self.transport = HATransport(
+                nodes,
+                apiKey,
+                apiSecret,
+                transport=self.transport,
+                probeInterval=probeInterval,
+            )
+
         # Ensure a successful connection
         status: str | None = self.getSystemStatus()
         assert status is not None
 
-        # Attach the CoreAPI
+        # Load the on-disk cache for the current firmware, if enabled
+        self.staticCache: StaticDataCache | None = None
+        if cache:
+            version: str | None = firmwareVersion(status) or firmwareVersion(
+                self.getFirmwareStatus()
+            )
+            if version is not None:
+                self.staticCache = StaticDataCache(
+                    url=self.url,
+                    version=version,
+                    directory=cache if isinstance(cache, str) else None,
+                )
+
+        # Attach the CoreAPI, imported here so `import NG_OPNSense` stays cheap
+        # for the command line interface
         # https://docs.opnsense.org/development/api.html#core-api
-        self.coreAPI = CoreAPI(self.url, self.apiKey, self.apiSecret)
+        from .Api.CoreAPI import CoreAPI
+
+        self.coreAPI = CoreAPI(
+            self.url,
+            self.apiKey,
+            self.apiSecret,
+            cache=self.staticCache,
+            transport=self.transport,
+        )
+
+    def close(self) -> None:
+        """Close the connections of the transport selected for this instance"""
+        if self.transport is not None:
+            self.transport.close()
+
+    def stats(self) -> dict:
+        """Counters of the transport of this instance, e.g. TLS handshakes
+
+        Returns:
+            `dict`: `{"transport": "requests", "tls": {"handshakes": 2,
+            "resumed": 1, "handshakeSeconds": 0.03, "averageHandshakeMs": 15.0}}`,
+            a cluster adds the state of each node under `nodes` and
+            `concurrency` holds the adaptive limit of the bulk alias operations
+        """
+        return {
+            **(self.transport or defaultTransport).stats(),
+            "concurrency": {"alias": self.coreAPI.firewall.alias.limiter.stats()},
+        }
 
     def getSystemStatus(self) -> str | None:
         """Fetch the system status from the OPNSense API as a JSON string"""
         try:
             url = self.url + "/api/core/system/status"
 
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to fetch system status:\n{format_exc()}")
-            return None
+        except Exception as e:
+            return _failed("Failed to fetch system status", e)
+
+    def getFirmwareStatus(self) -> dict | None:
+        """Fetch the firmware status (product version, pending updates) from the OPNSense API"""
+        try:
+            url = self.url + "/api/core/firmware/status"
+
+            return _openSenseJSON(
+                url=url,
+                apiKey=self.apiKey,
+                apiSecret=self.apiSecret,
+                transport=self.transport,
+            )
+        except Exception as e:
+            return _failed("Failed to fetch firmware status", e)
 
     def getARPTable(self) -> str | None:
         """Fetch the ARP table from the OPNSense API as a JSON string"""
         try:
             url = self.url + "/api/diagnostics/interface/getArp"
 
-            response = _openSenseAPI(
+            return _openSenseJSON(
                 url=url,
                 apiKey=self.apiKey,
                 apiSecret=self.apiSecret,
+                transport=self.transport,
             )
-            return response.json()
-        except Exception:
-            print(f"Failed to fetch ARP table:\n{format_exc()}")
+        except Exception as e:
+            return _failed("Failed to fetch ARP table", e)
+
+    def getARPSnapshot(self) -> "ARPSnapshot | None":
+        """Fetch the ARP table as an `ARPSnapshot` indexed by MAC, IP and interface
+
+        Returns:
+            `ARPSnapshot | None`: The indexed ARP table or None if the request failed
+
+        Usage:
+            ```python
+            previous = opnsense.getARPSnapshot()
+            current = opnsense.getARPSnapshot()
+
+            changes = current.diff(previous)
+            print(changes.appeared, changes.disappeared, changes.moved)
+            ```
+        """
+        from .Api.CoreAPI.Diagnostics import ARPSnapshot
+
+        table: list[dict] | None = self.getARPTable()
+        if table is None:
             return None
+        return ARPSnapshot.fromTable(table)
@@ -0,0 +1,164 @@
+"""
+Compare the per-request CPU cost and throughput of the transports
+
+Starts a local HTTPS server with a self-signed certificate (needs `openssl`) in
+a separate process, so the CPU time measured is the client's only, and sends
+the same GET through `_openSenseAPI` with every available transport. The
+server only speaks HTTP/1.1, so `http2` measures the httpx client without
+multiplexing; point `--url` at a firewall to compare it over HTTP/2.
+
+Usage:
+    ```bash
+    python -m NG_OPNSense.benchmarks.transport --requests 2000 --threads 8
+    ```
+"""
+
+import os
+import ssl
+import subprocess
+from json import dumps
+from tempfile import mkdtemp
+from argparse import ArgumentParser
+from multiprocessing import Event, Process
+from time import perf_counter, process_time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from NG_OPNSense.helpers import _openSenseAPI
+from NG_OPNSense.transport import TRANSPORTS, makeTransport
+
+KEY: str = "k" * 80
+# About the size of a searchItem page of a few aliases
+BODY: bytes = dumps(
+    {
+        "rows": [
+            {"uuid": f"{i:08x}-uuid", "name": f"alias_{i}", "content": "10.0.0.1"}
+            for i in range(20)
+        ]
+    }
+).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+def _serve(certificate: str, key: str, port: int, ready) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate, key)
+    context.set_alpn_protocols(["http/1.1"])
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    ready.set()
+    server.serve_forever()
+
+
+def _certificate(directory: str) -> tuple[str, str]:
+    certificate: str = os.path.join(directory, "cert.pem")
+    key: str = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes"]
+        + ["-keyout", key, "-out", certificate, "-days", "1"]
+        + ["-subj", "/CN=localhost"],
+        check=True,
+        capture_output=True,
+    )
+    return certificate, key
+
+
+def benchmark(
+    url: str, key: str, secret: str, transportName: str, requests: int, threads: int
+) -> dict:
+    """Sequential CPU per request and threaded throughput of one transport"""
+    transport = makeTransport(transportName)
+
+    def call(_=None) -> None:
+        _openSenseAPI(url, key, secret, transport=transport).json()
+
+    for _ in range(50):  # warm up the pool
+        call()
+
+    cpu, wall = process_time(), perf_counter()
+    for _ in range(requests):
+        call()
+    cpu, wall = process_time() - cpu, perf_counter() - wall
+
+    with ThreadPoolExecutor(threads) as executor:
+        started: float = perf_counter()
+        list(executor.map(call, range(requests)))
+        threaded: float = perf_counter() - started
+
+    transport.close()
+    return {
+        "transport": transportName,
+        "cpuPerRequestUs": round(cpu / requests * 1e6, 1),
+        "sequentialPerSecond": round(requests / wall),
+        "threadedPerSecond": round(requests / threaded),
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--port", type=int, default=18443)
+    parser.add_argument("--url", help="benchmark against this GET endpoint instead")
+    parser.add_argument("--json", action="store_true", help="machine readable output")
+    args = parser.parse_args()
+
+    url: str | None = args.url
+    key: str = os.environ.get("OPNSENSE_API_KEY", KEY)
+    secret: str = os.environ.get("OPNSENSE_API_SECRET", KEY)
+    server: Process | None = None
+    if url is None:
+        certificate, privateKey = _certificate(mkdtemp())
+        ready = Event()
+        server = Process(
+            target=_serve, args=(certificate, privateKey, args.port, ready), daemon=True
+        )
+        server.start()
+        ready.wait(10)
+        url = f"https://127.0.0.1:{args.port}/api/firewall/alias/searchItem"
+
+    results: list[dict] = []
+    try:
+        for name in TRANSPORTS:
+            try:
+                results.append(
+                    benchmark(url, key, secret, name, args.requests, args.threads)
+                )
+            except ImportError as e:
+                results.append({"transport": name, "skipped": str(e)})
+    finally:
+        if server is not None:
+            server.terminate()
+
+    if args.json:
+        print(dumps(results, indent=2))
+        return
+
+    print(f"{args.requests} GETs of {url}, {args.threads} threads")
+    print(f"{'transport':<10} {'CPU/request':>12} {'seq req/s':>10} {'thr req/s':>10}")
+    for result in results:
+        if "skipped" in result:
+            print(f"{result['transport']:<10} skipped: {result['skipped']}")
+            continue
+        print(
+            f"{result['transport']:<10} {result['cpuPerRequestUs']:>10}us"
+            f" {result['sequentialPerSecond']:>10} {result['threadedPerSecond']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
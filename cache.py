@@ -0,0 +1,120 @@
+import os
+import sys
+from json import dump, load
+from hashlib import sha256
+from threading import Lock
+from typing import Any
+
+
+def userCacheDir() -> str:
+    """The per-user cache directory for this package, created if missing
+
+    Honours `NG_OPNSENSE_CACHE_DIR`, then the platform conventions
+    (`XDG_CACHE_HOME`, `~/Library/Caches`, `%LOCALAPPDATA%`).
+
+    Returns:
+        `str`: The absolute path of the cache directory
+    """
+    directory: str | None = os.environ.get("NG_OPNSENSE_CACHE_DIR")
+    if not directory:
+        if sys.platform == "win32":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        elif sys.platform == "darwin":
+            base = os.path.expanduser("~/Library/Caches")
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        directory = os.path.join(base, "NG_OPNSense")
+
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return directory
+
+
+def cacheKey(*parts: str) -> str:
+    """A short, filesystem safe key for a firewall (URL, API key, ...)"""
+    return sha256("\0".join(parts).encode()).hexdigest()[:24]
+
+
+class StaticDataCache:
+    """On-disk cache of nearly static lookup data for one firewall
+
+    Entries are stored in a JSON file per firewall URL that is loaded once at
+    construction. The file records the firmware version it was filled with,
+    and a different version (i.e. after an upgrade) discards every entry.
+
+    Args:
+        `url (str)`: The URL of the firewall
+        `version (str)`: The firmware version the entries belong to
+        `directory (str | None, optional)`: Where the file is kept. Defaults to
+        `userCacheDir()`.
+    """
+
+    def __init__(self, url: str, version: str, directory: str | None = None) -> None:
+        self.version: str = version
+        self.path: str = os.path.join(
+            directory or userCacheDir(), f"static-{cacheKey(url)}.json"
+        )
+        self._lock: Lock = Lock()
+        self._entries: dict[str, Any] = {}
+
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                stored: dict = load(file)
+            if stored.get("version") == version:
+                self._entries = stored.get("entries", {})
+        except (OSError, ValueError):
+            # Missing or corrupt files are treated as an empty cache
+            pass
+
+    def get(self, name: str) -> Any | None:
+        """The cached value or None"""
+        return self._entries.get(name)
+
+    def set(self, name: str, value: Any) -> None:
+        """Store a value and persist the cache"""
+        with self._lock:
+            self._entries[name] = value
+            self._save()
+
+    def invalidate(self, name: str | None = None) -> None:
+        """Drop one entry, or every entry when no name is given"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+            self._save()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def _save(self) -> None:
+        temporary: str = f"{self.path}.{os.getpid()}.tmp"
+        fd: int = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            dump({"version": self.version, "entries": self._entries}, file)
+        os.replace(temporary, self.path)
+
+
+def firmwareVersion(status: Any) -> str | None:
+    """Find the firmware version in a system or firmware status response
+
+    Args:
+        `status (Any)`: The decoded response
+
+    Returns:
+        `str | None`: The first `product_version` (or `version`) found, searching
+        breadth first
+    """
+    pending: list = [status]
+    fallback: str | None = None
+    while pending:
+        node = pending.pop(0)
+        if isinstance(node, dict):
+            if isinstance(node.get("product_version"), str):
+                return node["product_version"]
+            if fallback is None and isinstance(node.get("version"), str):
+                fallback = node["version"]
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+    return fallback
@@ -0,0 +1,405 @@
+"""
+Command line interface for the OPNSense API
+
+Only the standard library and `helpers` are imported up front, the controllers
+(and pydantic) are imported when a command needs them, and no status request
+is sent before the first command, so short-lived invocations start fast.
+
+Usage:
+    ```bash
+    export OPNSENSE_URL=https://opnsense.local
+    export OPNSENSE_API_KEY=... OPNSENSE_API_SECRET=...
+
+    ngs-opnsense status
+    ngs-opnsense alias get --lean
+    ngs-opnsense alias add '{"name": "web", "type": "port", "content": "443"}'
+
+    # one operation per line in, one result per line out (as they complete)
+    ngs-opnsense batch --parallel 8 < operations.ndjson
+    ```
+"""
+
+import sys
+from os import environ
+from time import perf_counter
+from threading import BoundedSemaphore, Lock
+from json import JSONDecodeError, dumps, loads
+from contextlib import redirect_stdout
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Iterable, TextIO
+
+from .exceptions import OPNSenseError, clearLastError, lastError
+from .helpers import _openSenseJSON, configurePool, validateParams
+from .tls import TLSConfig
+from .transport import TRANSPORTS, Transport, makeTransport
+
+if TYPE_CHECKING:
+    from argparse import Namespace
+    from .Api.CoreAPI.Firewall.Alias import AliasController
+
+# AliasController methods available as `alias.<name>` operations, the short
+# names of the `alias` subcommands are accepted too
+ALIAS_METHODS: frozenset[str] = frozenset(
+    {
+        "addItem",
+        "delItem",
+        "get",
+        "getAliasUUID",
+        "getGeoIP",
+        "getItem",
+        "getTableSize",
+        "listCategories",
+        "listCountries",
+        "listNetworkAliases",
+        "listUserGroups",
+        "reconfigure",
+        "searchItem",
+        "setItem",
+        "toggleItem",
+    }
+)
+ALIAS_SHORT_NAMES: dict[str, str] = {
+    "add": "addItem",
+    "del": "delItem",
+    "item": "getItem",
+    "search": "searchItem",
+    "set": "setItem",
+    "toggle": "toggleItem",
+    "uuid": "getAliasUUID",
+}
+
+
+class Client:
+    """Runs named operations against one OPNSense instance
+
+    Args:
+        `url (str)`: The URL of the OPNSense instance
+        `apiKey (str)`: The API key
+        `apiSecret (str)`: The API secret
+        `transport (Transport | str | None, optional)`: See `OPNSenseAPI`.
+        Defaults to None.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        apiKey: str,
+        apiSecret: str,
+        transport: Transport | str | None = None,
+    ) -> None:
+        validateParams(url=url, apiKey=apiKey, apiSecret=apiSecret)
+        self.url: str = url.rstrip("/")
+        self.apiKey: str = apiKey
+        self.apiSecret: str = apiSecret
+        self.transport: Transport | None = makeTransport(transport)
+        self._alias: "AliasController | None" = None
+        self._lock: Lock = Lock()
+
+    @property
+    def alias(self) -> "AliasController":
+        """The alias controller, imported and created on first use"""
+        with self._lock:
+            if self._alias is None:
+                from .Api.CoreAPI.Firewall.Alias import AliasController
+
+                self._alias = AliasController(
+                    f"{self.url}/api/firewall",
+                    self.apiKey,
+                    self.apiSecret,
+                    transport=self.transport,
+                )
+            return self._alias
+
+    def call(self, op: str, args: dict | None = None) -> Any:
+        """Run an operation
+
+        Args:
+            `op (str)`: `status`, `arp` or `alias.<method>`, e.g. `alias.addItem`
+            `args (dict, optional)`: Keyword arguments of the method
+
+        Raises:
+            `ValueError`: If the operation is unknown
+
+        Returns:
+            `Any`: The decoded response, None if the request failed
+        """
+        args = args or {}
+        if op == "status":
+            return self._get("/api/core/system/status")
+        if op == "arp":
+            return self._get("/api/diagnostics/interface/getArp")
+
+        group, _, method = op.partition(".")
+        method = ALIAS_SHORT_NAMES.get(method, method)
+        if group != "alias" or method not in ALIAS_METHODS:
+            raise ValueError(f"Unknown operation {op!r}")
+        return getattr(self.alias, method)(**args)
+
+    def _get(self, path: str) -> Any:
+        return _openSenseJSON(
+            url=self.url + path,
+            apiKey=self.apiKey,
+            apiSecret=self.apiSecret,
+            transport=self.transport,
+        )
+
+
+class DaemonOperations:
+    """Runs the operations of `Client` in a running `ngs-opnsense daemon`"""
+
+    OPERATIONS: dict[str, str] = {
+        "status": "api.getSystemStatus",
+        "arp": "api.getARPTable",
+    }
+
+    def __init__(self, url: str, apiKey: str, apiSecret: str, socketPath: str | None):
+        from .daemon import DaemonClient
+
+        self.client = DaemonClient(url, apiKey, apiSecret, socketPath=socketPath)
+
+    def call(self, op: str, args: dict | None = None) -> Any:
+        return self.client.request(self.OPERATIONS.get(op, op), kwargs=args)
+
+
+def _run(client: Client, request: dict) -> dict:
+    started: float = perf_counter()
+    result: dict = {"id": request.get("id"), "op": request.get("op")}
+    try:
+        clearLastError()
+        value: Any = client.call(str(request.get("op")), request.get("args"))
+        result.update(ok=value is not None, result=value)
+        if value is None:
+            error: OPNSenseError | None = lastError()
+            result["error"] = str(error) if error else "Request failed, see stderr"
+            result["retryable"] = error.retryable if error else False
+    except OPNSenseError as e:
+        result.update(ok=False, error=str(e), retryable=e.retryable)
+    except Exception as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    result["elapsed"] = round(perf_counter() - started, 6)
+    return result
+
+
+def runBatch(
+    client: Client, lines: Iterable[str], out: TextIO, parallel: int = 4
+) -> int:
+    """Run NDJSON operations and write one NDJSON result per operation
+
+    Each input line is an object with `op`, optional `args` and an optional
+    `id` that is echoed back. Results are written as operations complete, so
+    their order may differ from the input, at most `parallel` operations are
+    in flight and input is read as slots free up.
+
+    Args:
+        `client (Client)`: Runs the operations
+        `lines (Iterable[str])`: The operations, e.g. `sys.stdin`
+        `out (TextIO)`: Where to write the results
+        `parallel (int, optional)`: Operations run at once. Defaults to 4.
+
+    Returns:
+        `int`: The number of failed operations
+    """
+    failed: int = 0
+    writeLock: Lock = Lock()
+    slots: BoundedSemaphore = BoundedSemaphore(max(1, parallel))
+
+    def write(result: dict) -> None:
+        nonlocal failed
+        with writeLock:
+            failed += not result["ok"]
+            out.write(dumps(result, default=str) + "\n")
+            out.flush()
+
+    def done(future: Future) -> None:
+        slots.release()
+        write(future.result())
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                request: Any = loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Expected a JSON object")
+            except (JSONDecodeError, ValueError) as e:
+                write({"id": None, "line": number, "ok": False, "error": str(e)})
+                continue
+            slots.acquire()
+            executor.submit(_run, client, request).add_done_callback(done)
+    return failed
+
+
+def _parser():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog="ngs-opnsense", description=__doc__.split("\n")[1])
+    parser.add_argument("--url", help="defaults to $OPNSENSE_URL")
+    parser.add_argument(
+        "--daemon", action="store_true", help="send requests through the daemon"
+    )
+    parser.add_argument("--socket", help="daemon socket, see defaultSocketPath()")
+    parser.add_argument(
+        "--transport", choices=TRANSPORTS, help="HTTP client (default: requests)"
+    )
+    parser.add_argument(
+        "--fingerprint", help="pinned SHA-256 certificate fingerprint of the firewall"
+    )
+    parser.add_argument("--ca-bundle", help="verify the certificate with this CA file")
+    parser.add_argument(
+        "--indent", type=int, default=None, help="pretty print single results"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="system status")
+    commands.add_parser("arp", help="ARP table")
+
+    alias = commands.add_parser("alias", help="firewall aliases")
+    aliasCommands = alias.add_subparsers(dest="aliasCommand", required=True)
+    get = aliasCommands.add_parser("get", help="all aliases, or one by UUID")
+    get.add_argument("uuid", nargs="?")
+    get.add_argument("--lean", action="store_true", help="selected options only")
+    add = aliasCommands.add_parser("add", help="add an alias")
+    add.add_argument("alias", help="the alias as a JSON object, - reads stdin")
+    delete = aliasCommands.add_parser("del", help="delete an alias")
+    delete.add_argument("uuid")
+    search = aliasCommands.add_parser("search", help="search aliases")
+    search.add_argument("phrase")
+    aliasCommands.add_parser("reconfigure", help="apply alias changes")
+
+    daemon = commands.add_parser("daemon", help="serve scripts over a Unix socket")
+    daemon.add_argument(
+        "--read-ttl",
+        type=float,
+        default=0,
+        help="seconds alias reads are cached (default: 0)",
+    )
+    daemon.add_argument(
+        "--max-clients",
+        type=int,
+        default=64,
+        help="firewalls kept warm, least recently used first out (default: 64)",
+    )
+    daemon.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=3600,
+        help="seconds an unused firewall is kept warm (default: 3600)",
+    )
+
+    daemon.add_argument(
+        "--max-reads",
+        type=int,
+        default=1024,
+        help="alias reads cached at most, oldest first out (default: 1024)",
+    )
+
+    batch = commands.add_parser("batch", help="NDJSON operations from stdin")
+    batch.add_argument(
+        "--parallel",
+        type=int,
+        default=4,
+        help="operations in flight, also the connection pool size of the "
+        "transport (default: 4)",
+    )
+    return parser
+
+
+def _configurePool(client: "Client | DaemonOperations", connections: int) -> None:
+    """Size the pool of the transport the client sends its requests with"""
+    if isinstance(client, DaemonOperations):
+        return  # the daemon pools its own connections
+    if client.transport is None:
+        configurePool(connections)
+    else:
+        client.transport.configurePool(connections)
+
+
+def _operation(args: "Namespace") -> tuple[str, dict]:
+    if args.command != "alias":
+        return args.command, {}
+    if args.aliasCommand == "get":
+        if args.uuid:
+            return "alias.getItem", {"uuid": args.uuid, "lean": args.lean}
+        return "alias.get", {"lean": args.lean}
+    if args.aliasCommand == "add":
+        body: str = sys.stdin.read() if args.alias == "-" else args.alias
+        alias: Any = loads(body)
+        # The request body of the API, {"alias": {...}}, is accepted as well
+        if isinstance(alias, dict) and list(alias) == ["alias"]:
+            alias = alias["alias"]
+        return "alias.addItem", {"alias": alias}
+    if args.aliasCommand == "del":
+        return "alias.delItem", {"uuid": args.uuid}
+    if args.aliasCommand == "search":
+        return "alias.searchItem", {"searchParams": args.phrase}
+    return "alias.reconfigure", {}
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point of the `ngs-opnsense` command
+
+    Credentials are read from `OPNSENSE_API_KEY` and `OPNSENSE_API_SECRET` so
+    they don't show up in the process list.
+
+    Returns:
+        `int`: The exit status, 1 if any operation failed
+    """
+    args = _parser().parse_args(argv)
+    if args.command == "daemon":
+        from signal import SIGTERM, signal
+        from .daemon import OPNSenseDaemon
+
+        # Exit through serve() so the socket is removed
+        signal(SIGTERM, lambda *_: sys.exit(0))
+        try:
+            OPNSenseDaemon(
+                args.socket,
+                readTTL=args.read_ttl,
+                maxClients=args.max_clients,
+                idleTimeout=args.idle_timeout,
+                maxReads=args.max_reads,
+            ).serve()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    url: str | None = args.url or environ.get("OPNSENSE_URL")
+    apiKey: str | None = environ.get("OPNSENSE_API_KEY")
+    apiSecret: str | None = environ.get("OPNSENSE_API_SECRET")
+    try:
+        if args.daemon:
+            client = DaemonOperations(url, apiKey, apiSecret, args.socket)
+        else:
+            tls: TLSConfig | None = None
+            if args.fingerprint or args.ca_bundle:
+                tls = TLSConfig(fingerprint=args.fingerprint, caBundle=args.ca_bundle)
+            client = Client(
+                url, apiKey, apiSecret, transport=makeTransport(args.transport, tls)
+            )
+    except (AssertionError, ImportError, TypeError, ValueError) as e:
+        print(f"ngs-opnsense: invalid connection settings: {e}", file=sys.stderr)
+        return 2
+    except (OSError, RuntimeError) as e:
+        print(f"ngs-opnsense: daemon: {e}", file=sys.stderr)
+        return 2
+
+    # The controllers report failures on stdout, keep it for results only
+    out: TextIO = sys.stdout
+    with redirect_stdout(sys.stderr):
+        if args.command == "batch":
+            _configurePool(client, args.parallel)
+            return int(runBatch(client, sys.stdin, out, args.parallel) > 0)
+
+        op, opArgs = _operation(args)
+        result: dict = _run(client, {"op": op, "args": opArgs})
+
+    if not result["ok"]:
+        print(f"ngs-opnsense: {result.get('error', 'request failed')}", file=sys.stderr)
+        return 1
+    out.write(dumps(result["result"], indent=args.indent, default=str) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Coalescing of queued mutations for batches that are applied once
+
+Alias transactions and filter rule batches queue create, update, toggle and
+delete calls and send what is left of them when they commit. `CoalescingQueue`
+holds the queued calls and folds the ones for the same UUID together, so a
+record changed many times is sent once.
+"""
+
+from enum import Enum
+from typing import Any
+
+
+# Enum for the kinds of mutation a queue holds
+class Mutation(str, Enum):
+    add: str = "add"
+    set: str = "set"
+    toggle: str = "toggle"
+    delete: str = "delete"
+
+
+# The step of a plan each mutation is sent in, see `CoalescingQueue.phases()`
+_PHASES: dict[Mutation, int] = {
+    Mutation.add: 0,
+    Mutation.set: 1,
+    Mutation.toggle: 1,
+    Mutation.delete: 2,
+}
+
+
+def mergeInto(target: dict, data: dict) -> None:
+    """Merge `data` into `target` in place, nested dicts key by key"""
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            mergeInto(target[key], value)
+        else:
+            target[key] = value
+
+
+class CoalescingQueue:
+    """Queued mutations of one kind of record, coalesced per UUID
+
+    Repeated updates are merged, the last toggle wins, a toggle is folded into
+    a pending update and an update that sets `enabled` overrides a toggle
+    queued before it. A delete drops everything queued for the UUID before it.
+    The queue is not locked, its owner serializes the calls.
+
+    Args:
+        `key (str)`: The key of the record in an update body, e.g. `alias`
+    """
+
+    def __init__(self, key: str) -> None:
+        self.key: str = key
+        self.queued: int = 0  # calls queued, before coalescing
+        self._adds: list[Any] = []
+        self._sets: dict[str, dict] = {}
+        self._toggles: dict[str, bool] = {}
+        self._deletes: dict[str, None] = {}
+
+    def add(self, item: Any) -> None:
+        self.queued += 1
+        self._adds.append(item)
+
+    def set(self, uuid: str, data: dict) -> None:
+        self.queued += 1
+        if uuid in self._deletes:
+            return
+        if "enabled" in data.get(self.key, {}):
+            self._toggles.pop(uuid, None)
+        mergeInto(self._sets.setdefault(uuid, {}), data)
+
+    def toggle(self, uuid: str, enabled: bool) -> None:
+        self.queued += 1
+        if uuid not in self._deletes:
+            self._toggles[uuid] = enabled
+
+    def delete(self, uuid: str) -> None:
+        self.queued += 1
+        self._sets.pop(uuid, None)
+        self._toggles.pop(uuid, None)
+        self._deletes[uuid] = None
+
+    def clear(self) -> None:
+        self._adds.clear()
+        self._sets.clear()
+        self._toggles.clear()
+        self._deletes.clear()
+        self.queued = 0
+
+    def plan(self) -> list[tuple[Mutation, str | None, Any]]:
+        """The coalesced mutations: adds, updates, toggles, then deletes
+
+        Returns:
+            `list`: `(mutation, uuid, payload)` tuples, the payload is the item
+            to add, the update body, the enabled state or None for a delete
+        """
+        plan: list[tuple[Mutation, str | None, Any]] = [
+            (Mutation.add, None, item) for item in self._adds
+        ]
+        for uuid, data in self._sets.items():
+            if uuid in self._toggles:
+                record: dict = {
+                    **data.get(self.key, {}),
+                    "enabled": str(int(self._toggles[uuid])),
+                }
+                data = {**data, self.key: record}
+            plan.append((Mutation.set, uuid, data))
+        plan += [
+            (Mutation.toggle, uuid, enabled)
+            for uuid, enabled in self._toggles.items()
+            if uuid not in self._sets
+        ]
+        plan += [(Mutation.delete, uuid, None) for uuid in self._deletes]
+        return plan
+
+    def phases(self) -> list[list[tuple[Mutation, str | None, Any]]]:
+        """The plan split into steps that must be sent one after the other
+
+        Records are created before the updates that may reference them, and
+        deleted after the updates that may drop the last reference to them.
+        The mutations of one step don't depend on each other.
+
+        Returns:
+            `list`: The non-empty steps of adds, updates and toggles, deletes
+        """
+        steps: list[list[tuple[Mutation, str | None, Any]]] = [[], [], []]
+        for entry in self.plan():
+            steps[_PHASES[entry[0]]].append(entry)
+        return [step for step in steps if step]
@@ -0,0 +1,229 @@
+"""
+Adaptive concurrency for bulk requests
+
+`AdaptiveLimiter` finds how many requests a firewall handles in parallel the
+way TCP congestion control finds the window of a link: additive increase while
+the latency stays flat, multiplicative decrease when it inflates or requests
+fail. `AdaptiveExecutor` runs the calls of a bulk operation under a limiter.
+"""
+
+from time import monotonic, perf_counter
+from threading import Condition
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from .exceptions import OPNSenseError, clearLastError, lastError
+
+# Latency changes below this are jitter, not congestion
+_JITTER: float = 0.002
+
+
+def congested(error: BaseException | None) -> bool:
+    """Whether a failure means the firewall is overloaded
+
+    Timeouts, connection errors, 429 and 5xx statuses count, a validation error
+    or a 404 doesn't.
+    """
+    if not isinstance(error, OPNSenseError):
+        return isinstance(error, OSError)
+    return error.retryable or (error.status or 0) >= 500
+
+
+class AdaptiveLimiter:
+    """Limits the requests in flight, adapting the limit with AIMD
+
+    Every completed call is a sample. The limit grows by one per limit of calls
+    that completed while it was fully used and the smoothed latency stayed
+    within `tolerance` times the baseline (the lowest latency of the last
+    `window` calls). On an inflated latency or a `congested()` failure it is
+    multiplied by `backoff`, at most once per round trip, so one burst of
+    errors cuts it only once.
+
+    Args:
+        `initial (int, optional)`: The starting limit. Defaults to 4.
+        `minimum (int, optional)`: The lowest limit. Defaults to 1.
+        `maximum (int, optional)`: The highest limit and the number of worker
+        threads of an `AdaptiveExecutor`. Defaults to 32.
+        `tolerance (float, optional)`: Latency inflation over the baseline that
+        counts as congestion. Defaults to 2.
+        `backoff (float, optional)`: Factor the limit is cut by. Defaults to 0.5.
+        `window (int, optional)`: Calls after which the baseline is measured
+        again, so it follows lasting changes. Defaults to 500.
+
+    Usage:
+        ```python
+        limiter = AdaptiveLimiter(maximum=16)
+        with AdaptiveExecutor(limiter) as pool:
+            responses = list(pool.map(alias.addItem, aliases))
+        print(limiter.stats())
+        ```
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        tolerance: float = 2.0,
+        backoff: float = 0.5,
+        window: int = 500,
+    ) -> None:
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError("Expected 1 <= minimum <= initial <= maximum")
+        if tolerance <= 1 or not 0 < backoff < 1:
+            raise ValueError("Expected tolerance > 1 and 0 < backoff < 1")
+
+        self.minimum: int = minimum
+        self.maximum: int = maximum
+        self.tolerance: float = tolerance
+        self.backoff: float = backoff
+        self.window: int = window
+
+        self._condition: Condition = Condition()
+        self._limit: float = float(initial)
+        self._inFlight: int = 0
+        self._latency: float | None = None  # moving average
+        self._baseline: float | None = None
+        self._windowMin: float | None = None
+        self._windowCalls: int = 0
+        self._lastDecrease: float = 0.0
+
+        self.completed: int = 0
+        self.failures: int = 0  # calls that failed with congestion
+        self.increases: int = 0
+        self.decreases: int = 0
+
+    @property
+    def limit(self) -> int:
+        """The current number of calls allowed in flight"""
+        return int(self._limit)
+
+    @property
+    def inFlight(self) -> int:
+        return self._inFlight
+
+    def acquire(self) -> None:
+        """Wait until a call may start"""
+        with self._condition:
+            while self._inFlight >= int(self._limit):
+                self._condition.wait()
+            self._inFlight += 1
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        """Record the outcome of a call started with `acquire()`
+
+        Args:
+            `latency (float)`: Seconds the call took
+            `failed (bool, optional)`: The call failed because of congestion.
+            Defaults to False.
+        """
+        with self._condition:
+            saturated: bool = self._inFlight >= int(self._limit)
+            self._inFlight -= 1
+            self.completed += 1
+            if failed:
+                self.failures += 1
+            else:
+                self._sample(latency)
+
+            inflated: bool = self._baseline is not None and self._latency > max(
+                self._baseline * self.tolerance, self._baseline + _JITTER
+            )
+            if failed or inflated:
+                now: float = monotonic()
+                if now - self._lastDecrease >= (self._latency or 0.0):
+                    self._limit = max(float(self.minimum), self._limit * self.backoff)
+                    self._lastDecrease = now
+                    self.decreases += 1
+            elif saturated and self._limit < self.maximum:
+                previous: int = int(self._limit)
+                self._limit = min(float(self.maximum), self._limit + 1 / self._limit)
+                self.increases += int(self._limit) > previous
+            self._condition.notify_all()
+
+    def call(self, function: Callable, *args, **kwargs) -> Any:
+        """Run `function` once a slot is free and record how it went
+
+        A controller reports a failed request by returning None, the error it
+        logged is read from `lastError()`. Exceptions are recorded and re-raised.
+        """
+        self.acquire()
+        started: float = perf_counter()
+        error: BaseException | None = None
+        try:
+            clearLastError()
+            result = function(*args, **kwargs)
+            if result is None:
+                error = lastError()
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(perf_counter() - started, failed=congested(error))
+
+    def stats(self) -> dict:
+        """The current limit and the counters, latencies in milliseconds"""
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "inFlight": self._inFlight,
+                "latencyMs": _ms(self._latency),
+                "baselineMs": _ms(self._baseline),
+                "completed": self.completed,
+                "failures": self.failures,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+    def _sample(self, latency: float) -> None:
+        self._latency = (
+            latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        )
+        if self._windowMin is None or latency < self._windowMin:
+            self._windowMin = latency
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        self._windowCalls += 1
+        if self._windowCalls >= self.window:
+            self._baseline = self._windowMin
+            self._windowMin = None
+            self._windowCalls = 0
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+class AdaptiveExecutor(ThreadPoolExecutor):
+    """A thread pool that runs every submitted call under an `AdaptiveLimiter`
+
+    It starts up to `limiter.maximum` threads, the limiter decides how many of
+    them send requests at a time. Several executors may share a limiter.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter) -> None:
+        super().__init__(
+            max_workers=limiter.maximum, thread_name_prefix="ngs-opnsense-aimd"
+        )
+        self.limiter: AdaptiveLimiter = limiter
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return super().submit(self.limiter.call, fn, *args, **kwargs)
+
+
+def executor(workers: int | AdaptiveLimiter) -> ThreadPoolExecutor:
+    """A pool with a fixed number of workers, or one adapting to the firewall
+
+    Args:
+        `workers (int | AdaptiveLimiter)`: The number of calls in flight, or
+        the limiter that adapts it
+
+    Raises:
+        `ValueError`: If the number of workers is less than 1
+    """
+    if isinstance(workers, AdaptiveLimiter):
+        return AdaptiveExecutor(workers)
+    if workers < 1:
+        raise ValueError("maxWorkers must be at least 1")
+    return ThreadPoolExecutor(max_workers=workers)
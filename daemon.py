@@ -0,0 +1,393 @@
+"""
+Local sidecar that serves many short-lived scripts from one long-running process
+
+The daemon keeps one warm `OPNSenseAPI` per firewall (status checked once,
+pooled connections, on-disk static data cache) and optionally caches reads for
+a few seconds. Scripts talk to it over a Unix-domain socket with `DaemonClient`,
+which mirrors the `OPNSenseAPI` interface.
+
+Protocol: newline delimited JSON. A connection starts with
+`{"op": "connect", "url": ..., "apiKey": ..., "apiSecret": ...}`, every later
+request is `{"id": ..., "op": "alias.get", "args": [...], "kwargs": {...}}` and
+is answered with `{"id": ..., "ok": true, "result": ...}` or
+`{"id": ..., "ok": false, "error": "..."}`.
+
+Usage:
+    ```bash
+    ngs-opnsense daemon &
+    ```
+
+    ```python
+    from NG_OPNSense.daemon import DaemonClient
+
+    opnsense = DaemonClient(url="https://opnsense.local", apiKey="...", apiSecret="...")
+    aliases = opnsense.coreAPI.firewall.alias.get(lean=True)
+    ```
+"""
+
+import os
+import socket
+from time import monotonic
+from threading import Event, Lock
+from collections import OrderedDict
+from json import dumps, loads
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+from typing import Any, Callable
+
+from .cache import userCacheDir
+from .cli import ALIAS_METHODS, ALIAS_SHORT_NAMES
+from .exceptions import _failed
+from .helpers import validateParams
+from .registry import ClientRegistry
+
+# OPNSenseAPI methods served as `api.<name>`
+API_METHODS: frozenset[str] = frozenset(
+    {"getSystemStatus", "getFirmwareStatus", "getARPTable"}
+)
+# Alias reads that may be answered from the read cache, and the writes that
+# clear it for their firewall
+CACHED_READS: frozenset[str] = frozenset(
+    {
+        "get",
+        "getAliasUUID",
+        "getItem",
+        "getTableSize",
+        "listNetworkAliases",
+        "searchItem",
+    }
+)
+WRITES: frozenset[str] = frozenset(
+    {"addItem", "delItem", "reconfigure", "setItem", "toggleItem"}
+)
+
+
+def defaultSocketPath() -> str:
+    """`NG_OPNSENSE_SOCKET`, else `ngs-opnsense.sock` in the runtime or cache directory"""
+    path: str | None = os.environ.get("NG_OPNSENSE_SOCKET")
+    if path:
+        return path
+    directory: str = os.environ.get("XDG_RUNTIME_DIR") or userCacheDir()
+    return os.path.join(directory, "ngs-opnsense.sock")
+
+
+def _defaultFactory(url: str, apiKey: str, apiSecret: str) -> Any:
+    from . import OPNSenseAPI
+
+    # A transport of its own, so its pool is closed when the firewall is evicted
+    return OPNSenseAPI(
+        url=url, apiKey=apiKey, apiSecret=apiSecret, cache=True, transport="requests"
+    )
+
+
+class OPNSenseDaemon:
+    """Serves `OPNSenseAPI` and `AliasController` operations over a Unix socket
+
+    Args:
+        `socketPath (str | None, optional)`: Where to listen. Defaults to
+        `defaultSocketPath()`.
+        `readTTL (float, optional)`: Seconds alias reads are served from memory,
+        writes through the daemon clear them. Defaults to 0 (disabled).
+        `factory (Callable, optional)`: Builds the client of a firewall from
+        `(url, apiKey, apiSecret)`. Defaults to `OPNSenseAPI(..., cache=True)`.
+        `maxClients (int, optional)`: Firewalls kept warm at most, the least
+        recently used one is closed first. Defaults to 64.
+        `idleTimeout (float | None, optional)`: Seconds after which an unused
+        firewall is closed, None keeps it. Defaults to 3600.
+        `maxReads (int, optional)`: Reads cached at most, the oldest one is
+        dropped first. Defaults to 1024.
+    """
+
+    def __init__(
+        self,
+        socketPath: str | None = None,
+        readTTL: float = 0,
+        factory: Callable[[str, str, str], Any] = _defaultFactory,
+        maxClients: int = 64,
+        idleTimeout: float | None = 3600,
+        maxReads: int = 1024,
+    ) -> None:
+        if maxReads < 1:
+            raise ValueError("maxReads must be at least 1")
+
+        self.socketPath: str = socketPath or defaultSocketPath()
+        self.readTTL: float = readTTL
+        self.factory: Callable[[str, str, str], Any] = factory
+        self.maxReads: int = maxReads
+
+        self._lock: Lock = Lock()
+        # Evicted firewalls are rebuilt on their next request
+        self.clients: ClientRegistry = ClientRegistry(
+            factory=factory, maxClients=maxClients, idleTimeout=idleTimeout
+        )
+        # Cached reads in expiry order, they all live for `readTTL`
+        self._reads: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._stats: dict[str, int] = {"requests": 0, "cacheHits": 0, "errors": 0}
+        self._server: ThreadingUnixStreamServer | None = None
+        self.listening: Event = Event()  # Set once clients can connect
+
+    def serve(self) -> None:
+        """Listen on the socket and serve until `shutdown()` is called"""
+        self._bind()
+        self.listening.set()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.listening.clear()
+            self._server.server_close()
+            try:
+                os.unlink(self.socketPath)
+            except FileNotFoundError:
+                pass
+            self.clients.close()
+
+    def shutdown(self) -> None:
+        """Stop serving, from another thread"""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def stats(self) -> dict:
+        """Request, read cache hit and error counts, and the warm firewalls"""
+        with self._lock:
+            stats: dict = {**self._stats, "cachedReads": len(self._reads)}
+        return {
+            **stats,
+            "firewalls": len(self.clients),
+            "clients": self.clients.stats(),
+        }
+
+    def connect(self, url: str, apiKey: str, apiSecret: str) -> tuple[str, str, str]:
+        """Create the client of a firewall unless it exists, returns its key"""
+        validateParams(url=url, apiKey=apiKey, apiSecret=apiSecret)
+        self.clients.get(url, apiKey, apiSecret)
+        return (url, apiKey, apiSecret)
+
+    def call(self, key: tuple, op: str, args: list, kwargs: dict) -> Any:
+        """Run `op` (`api.<method>` or `alias.<method>`) for a connected firewall
+
+        Raises:
+            `ValueError`: If the operation is unknown
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+        client: Any = self.clients.get(*key)
+
+        group, _, method = op.partition(".")
+        if group == "api" and method in API_METHODS:
+            return getattr(client, method)(*args, **kwargs)
+
+        method = ALIAS_SHORT_NAMES.get(method, method)
+        if group != "alias" or method not in ALIAS_METHODS:
+            raise ValueError(f"Unknown operation {op!r}")
+        alias: Any = client.coreAPI.firewall.alias
+
+        if method in WRITES:
+            with self._lock:
+                for read in [read for read in self._reads if read[0] == key]:
+                    del self._reads[read]
+            return getattr(alias, method)(*args, **kwargs)
+
+        if not self.readTTL or method not in CACHED_READS:
+            return getattr(alias, method)(*args, **kwargs)
+
+        read: tuple = (key, method, dumps([args, kwargs], sort_keys=True))
+        with self._lock:
+            self._expireReads(monotonic())
+            cached: tuple[float, Any] | None = self._reads.get(read)
+            if cached is not None:
+                self._stats["cacheHits"] += 1
+                return cached[1]
+        value = getattr(alias, method)(*args, **kwargs)
+        if value is not None:
+            with self._lock:
+                now: float = monotonic()
+                self._expireReads(now)
+                self._reads.pop(read, None)
+                self._reads[read] = (now + self.readTTL, value)
+                while len(self._reads) > self.maxReads:
+                    self._reads.popitem(last=False)
+        return value
+
+    def _expireReads(self, now: float) -> None:
+        """Drop the expired reads, oldest first, the caller holds the lock"""
+        while self._reads:
+            expires, _ = next(iter(self._reads.values()))
+            if expires > now:
+                return
+            self._reads.popitem(last=False)
+
+    def _bind(self) -> None:
+        if os.path.exists(self.socketPath):
+            # Remove the socket of a daemon that didn't shut down cleanly
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socketPath)
+                raise OSError(f"A daemon is already listening on {self.socketPath}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socketPath)
+            finally:
+                probe.close()
+
+        # Only the owner may connect, requests carry API credentials
+        umask: int = os.umask(0o177)
+        try:
+            self._server = ThreadingUnixStreamServer(self.socketPath, _Handler)
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+        self._server.owner = self
+
+
+class _Handler(StreamRequestHandler):
+    def handle(self) -> None:
+        daemon: OPNSenseDaemon = self.server.owner
+        key: tuple | None = None
+
+        for line in self.rfile:
+            reply: dict = {"id": None}
+            try:
+                request: dict = loads(line)
+                reply["id"] = request.get("id")
+                if request.get("op") == "connect":
+                    key = daemon.connect(
+                        request.get("url"),
+                        request.get("apiKey"),
+                        request.get("apiSecret"),
+                    )
+                    result: Any = True
+                elif request.get("op") == "stats":
+                    result = daemon.stats()
+                elif key is None:
+                    raise ValueError("Send connect first")
+                else:
+                    result = daemon.call(
+                        key,
+                        str(request.get("op")),
+                        request.get("args") or [],
+                        request.get("kwargs") or {},
+                    )
+                reply.update(ok=True, result=result)
+            except Exception as e:
+                with daemon._lock:
+                    daemon._stats["errors"] += 1
+                reply.update(ok=False, error=f"{type(e).__name__}: {e}")
+            self.wfile.write(dumps(reply, default=str).encode() + b"\n")
+            self.wfile.flush()
+
+
+class DaemonError(RuntimeError):
+    """The daemon couldn't run an operation, e.g. the firewall was unreachable"""
+
+
+class _Proxy:
+    """Forwards method calls to the daemon as `<group>.<method>` operations"""
+
+    def __init__(self, client: "DaemonClient", group: str, methods: frozenset[str]):
+        self._client: "DaemonClient" = client
+        self._group: str = group
+        self._methods: frozenset[str] = methods
+
+    def __getattr__(self, method: str) -> Callable[..., Any]:
+        if method not in self._methods:
+            raise AttributeError(method)
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            return self._client.call(f"{self._group}.{method}", *args, **kwargs)
+
+        call.__name__ = method
+        return call
+
+
+class _Namespace:
+    def __init__(self, **attributes: Any) -> None:
+        self.__dict__.update(attributes)
+
+
+class DaemonClient:
+    """Thin client of `OPNSenseDaemon` with the interface of `OPNSenseAPI`
+
+    Methods return what the `OPNSenseAPI` methods return (None if a request
+    failed). Only JSON results are supported, so methods returning other
+    objects (`getARPSnapshot`, `transaction`, `watch`, ...) aren't available.
+
+    Args:
+        `url (str, optional)`: The URL of the OPNSense instance. Defaults to
+        `OPNSENSE_URL`.
+        `apiKey (str, optional)`: Defaults to `OPNSENSE_API_KEY`.
+        `apiSecret (str, optional)`: Defaults to `OPNSENSE_API_SECRET`.
+        `socketPath (str, optional)`: Defaults to `defaultSocketPath()`.
+
+    Raises:
+        `DaemonError`: If the daemon couldn't connect to the firewall
+        `OSError`: If the daemon isn't running
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        apiKey: str | None = None,
+        apiSecret: str | None = None,
+        socketPath: str | None = None,
+    ) -> None:
+        self.url: str | None = url or os.environ.get("OPNSENSE_URL")
+        self.apiKey: str | None = apiKey or os.environ.get("OPNSENSE_API_KEY")
+        self.apiSecret: str | None = apiSecret or os.environ.get("OPNSENSE_API_SECRET")
+
+        self._lock: Lock = Lock()
+        self._id: int = 0
+        self._socket: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socketPath or defaultSocketPath())
+        self._file = self._socket.makefile("rwb")
+        self._send(
+            op="connect", url=self.url, apiKey=self.apiKey, apiSecret=self.apiSecret
+        )
+
+        alias = _Proxy(self, "alias", ALIAS_METHODS | frozenset(ALIAS_SHORT_NAMES))
+        self.coreAPI = _Namespace(firewall=_Namespace(alias=alias))
+
+    def __getattr__(self, method: str) -> Callable[..., Any]:
+        if method in API_METHODS:
+            return getattr(_Proxy(self, "api", API_METHODS), method)
+        raise AttributeError(method)
+
+    def call(self, op: str, *args: Any, **kwargs: Any) -> Any:
+        """Run an operation in the daemon, e.g. `call("alias.getItem", uuid)`
+
+        Returns:
+            `Any`: The result of the operation or None if it failed
+        """
+        try:
+            return self.request(op, list(args), kwargs)
+        except DaemonError as e:
+            return _failed(f"Failed to run {op} in the daemon", e)
+
+    def request(self, op: str, args: list | None = None, kwargs: dict | None = None):
+        """Like `call()`, raising `DaemonError` if the operation failed"""
+        return self._send(op=op, args=args or [], kwargs=kwargs or {})
+
+    def daemonStats(self) -> dict:
+        """The counters of the daemon, see `OPNSenseDaemon.stats()`"""
+        return self._send(op="stats")
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def _send(self, **request: Any) -> Any:
+        with self._lock:
+            self._id += 1
+            request["id"] = self._id
+            self._file.write(dumps(request).encode() + b"\n")
+            self._file.flush()
+            line: bytes = self._file.readline()
+        if not line:
+            raise ConnectionError("The daemon closed the connection")
+        reply: dict = loads(line)
+        if not reply.get("ok"):
+            raise DaemonError(reply.get("error"))
+        return reply.get("result")
@@ -0,0 +1,259 @@
+"""
+Typed errors of the OPNSense API and how the controllers report them
+
+A failed call still returns None by default. What happens besides that is the
+error mode, set with `setErrorMode()` or the `NG_OPNSENSE_ERRORS` environment
+variable:
+
+- `log` (default): log one line per failure to the `NG_OPNSense` logger. The
+  traceback is only formatted when the logger is enabled for DEBUG.
+- `print`: print the message and the full traceback to stdout, the behavior
+  of earlier versions.
+- `raise`: raise the `OPNSenseError` instead of returning None.
+
+In every mode `lastError()` returns the last error of the calling thread, so
+a caller can tell a timeout from a 404 after getting None.
+"""
+
+import logging
+from os import environ
+from ssl import SSLCertVerificationError
+from json import JSONDecodeError
+from time import perf_counter
+from threading import local
+from urllib.parse import urlsplit
+from traceback import format_exception
+
+from requests import RequestException, Timeout
+from urllib3.exceptions import HTTPError as Urllib3Error
+from urllib3.exceptions import TimeoutError as Urllib3Timeout
+
+logger: logging.Logger = logging.getLogger("NG_OPNSense")
+
+ERROR_MODES: tuple[str, ...] = ("log", "print", "raise")
+# Statuses worth retrying: rate limited, or a proxy/web server that is restarting
+RETRYABLE_STATUSES: frozenset[int] = frozenset({408, 429, 502, 503, 504})
+
+_mode: str = environ.get("NG_OPNSENSE_ERRORS", "log")
+if _mode not in ERROR_MODES:
+    _mode = "log"
+_thread = local()
+
+
+class OPNSenseError(Exception):
+    """A failed call to the OPNSense API
+
+    The message is only built when the error is shown.
+
+    Attributes:
+        `url (str | None)`: The URL requested
+        `method (str | None)`: The HTTP method
+        `status (int | None)`: The HTTP status, None if no response arrived
+        `elapsed (float | None)`: Seconds from sending the request to the failure
+        `retryable (bool)`: Whether sending the request again may succeed
+    """
+
+    retryable: bool = False
+
+    def __init__(
+        self,
+        url: str | None = None,
+        method: str | None = None,
+        status: int | None = None,
+        elapsed: float | None = None,
+        reason: str = "",
+    ) -> None:
+        super().__init__(url, status)
+        self.url: str | None = url
+        self.method: str | None = method
+        self.status: int | None = status
+        self.elapsed: float | None = elapsed
+        self.reason: str = reason
+
+    @property
+    def endpoint(self) -> str | None:
+        """The path of the URL, e.g. `/api/firewall/alias/get`"""
+        return urlsplit(self.url).path if self.url else None
+
+    def __str__(self) -> str:
+        parts: list[str] = [type(self).__name__]
+        if self.status is not None:
+            parts.append(str(self.status))
+        if self.method or self.endpoint:
+            parts.append(f"{self.method or ''} {self.endpoint or ''}".strip())
+        if self.elapsed is not None:
+            parts.append(f"after {self.elapsed:.3f}s")
+        if self.reason:
+            parts.append(f"({self.reason})")
+        return " ".join(parts)
+
+
+class OPNSenseHTTPError(OPNSenseError):
+    """The API answered with a 4xx or 5xx status"""
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+class OPNSenseTimeout(OPNSenseError):
+    """No response arrived in time"""
+
+    retryable = True
+
+
+class OPNSenseConnectionError(OPNSenseError):
+    """The connection could not be made or broke"""
+
+    retryable = True
+
+
+class OPNSenseCertificateError(OPNSenseConnectionError):
+    """The certificate of the server failed verification or its pinned fingerprint
+
+    Not retryable: the same certificate would be presented again, and it may
+    belong to a server pretending to be the firewall.
+    """
+
+    retryable = False
+
+
+class OPNSenseResponseError(OPNSenseError):
+    """The response could not be used, e.g. the body isn't JSON"""
+
+
+def isCertificateError(error: BaseException) -> bool:
+    """Whether `error` was caused by a certificate that failed verification
+
+    requests and urllib3 wrap the `ssl.SSLCertVerificationError` (or the
+    `CertificatePinError` derived from it) in their own errors, so the causes,
+    contexts, arguments and `reason` of the chain are searched.
+    """
+    pending: list = [error]
+    seen: set[int] = set()
+    while pending:
+        current = pending.pop()
+        if not isinstance(current, BaseException) or id(current) in seen:
+            continue
+        if isinstance(current, SSLCertVerificationError):
+            return True
+        seen.add(id(current))
+        pending += [current.__cause__, current.__context__, *current.args]
+        pending.append(getattr(current, "reason", None))
+    return False
+
+
+def requestError(
+    error: BaseException, url: str, method: str, started: float
+) -> OPNSenseError:
+    """Wrap an exception raised while sending a request in a typed error
+
+    Args:
+        `error (BaseException)`: What the transport raised
+        `url (str)`: The URL requested
+        `method (str)`: The HTTP method
+        `started (float)`: `perf_counter()` when the request was sent
+
+    Returns:
+        `OPNSenseError`: The typed error, chained to `error` by the caller
+    """
+    if isinstance(error, OPNSenseError):
+        return error
+    elapsed: float = perf_counter() - started
+    status: int | None = getattr(error, "status", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+
+    if status is not None:
+        errorType: type[OPNSenseError] = OPNSenseHTTPError
+    elif isCertificateError(error):
+        errorType = OPNSenseCertificateError
+    elif isinstance(error, (TimeoutError, Timeout, Urllib3Timeout)):
+        errorType = OPNSenseTimeout
+    elif isinstance(error, (ConnectionError, RequestException, Urllib3Error, OSError)):
+        errorType = OPNSenseConnectionError
+    else:
+        errorType = OPNSenseError
+    return errorType(url, method, status, elapsed, type(error).__name__)
+
+
+def setErrorMode(mode: str) -> None:
+    """Select how failed calls are reported: `log`, `print` or `raise`
+
+    Raises:
+        `ValueError`: If the mode is unknown
+    """
+    global _mode
+    if mode not in ERROR_MODES:
+        raise ValueError(f"Unknown error mode {mode!r}, expected one of {ERROR_MODES}")
+    _mode = mode
+
+
+def getErrorMode() -> str:
+    """The current error mode, see `setErrorMode()`"""
+    return _mode
+
+
+def lastError() -> OPNSenseError | None:
+    """The last error reported on the calling thread, None if there was none"""
+    return getattr(_thread, "error", None)
+
+
+def clearLastError() -> None:
+    """Forget the last error of the calling thread"""
+    _thread.error = None
+
+
+def _report(message: str, error: BaseException) -> OPNSenseError:
+    """Record and show a failure according to the error mode, never raises
+
+    Args:
+        `message (str)`: What failed, e.g. "Failed to get aliases"
+        `error (BaseException)`: The exception that was caught
+
+    Returns:
+        `OPNSenseError`: The typed error, `error` itself if it already is one
+    """
+    typed: OPNSenseError
+    if isinstance(error, OPNSenseError):
+        typed = error
+    else:
+        typed = (
+            OPNSenseResponseError
+            if isinstance(error, JSONDecodeError)
+            else OPNSenseError
+        )(reason=f"{type(error).__name__}: {error}")
+        typed.__cause__ = error
+    _thread.error = typed
+
+    if _mode == "print":
+        # The legacy output: the message and the full traceback on stdout
+        trace: str = "".join(format_exception(error))
+        print(f"{message}:\n{trace}")
+    elif _mode == "log" and logger.isEnabledFor(logging.WARNING):
+        logger.warning(
+            "%s: %s",
+            message,
+            typed,
+            exc_info=error if logger.isEnabledFor(logging.DEBUG) else None,
+        )
+    return typed
+
+
+def _failed(message: str, error: BaseException) -> None:
+    """Report a failed call for a controller method that returns None on failure
+
+    Args:
+        `message (str)`: What failed, e.g. "Failed to get aliases"
+        `error (BaseException)`: The exception that was caught
+
+    Raises:
+        `OPNSenseError`: In the `raise` error mode
+    """
+    typed: OPNSenseError = _report(message, error)
+    if _mode == "raise":
+        if typed is error:
+            raise typed
+        raise typed from error
+    return None
@@ -0,0 +1,307 @@
+"""
+Routing for CARP high availability pairs
+
+`HATransport` sends the requests of one client to several firewall nodes.
+Background probes measure each node (with the `getSystemStatus` request) and
+read its CARP role. Reads go to the fastest healthy node. Writes go to the
+current master, so they land where the configuration is synchronised from.
+"""
+
+from time import monotonic, perf_counter
+from threading import Event, Lock, Thread
+from dataclasses import asdict, dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any
+
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+from .exceptions import isCertificateError
+from .transport import Transport
+
+# The endpoint of `OPNSenseAPI.getSystemStatus`, used as health probe
+SYSTEM_STATUS_PATH: str = "/api/core/system/status"
+# Lists the virtual IPs with their CARP status (MASTER, BACKUP, INIT)
+VIP_STATUS_PATH: str = "/api/diagnostics/interface/get_vip_status"
+# POST actions that only read, e.g. `searchItem` or `query_states`
+_READ_ACTIONS: tuple[str, ...] = ("search", "query", "get", "list")
+# Failures to reach a node, requests errors are OSErrors, urllib3 ones aren't
+_UNREACHABLE: tuple[type[Exception], ...] = (OSError, Urllib3Error)
+
+
+@dataclass(slots=True)
+class HANode:
+    """The last known state of one node
+
+    - `latency`: moving average of the probe round trip in seconds, None
+      until a probe succeeded
+    - `role`: `master`, `backup`, `mixed` (some VIPs are master) or None if
+      the node reported no CARP VIPs
+    """
+
+    url: str
+    healthy: bool = True
+    latency: float | None = None
+    role: str | None = None
+    failures: int = 0
+    lastProbe: float | None = None
+    lastError: str | None = None
+    probing: bool = False
+
+    @property
+    def master(self) -> bool:
+        return self.role == "master"
+
+
+def isWrite(method: str, path: str) -> bool:
+    """Whether a request changes the firewall, POSTs to search/get actions don't"""
+    if method.upper() in ("GET", "HEAD", "OPTIONS"):
+        return False
+    # /api/<module>/<controller>/<action>[/<parameters>]
+    segments: list[str] = path.split("?", 1)[0].strip("/").split("/")
+    action: str = segments[3] if len(segments) > 3 else segments[-1]
+    return not action.lower().startswith(_READ_ACTIONS)
+
+
+def carpRole(vipStatus: Any) -> str | None:
+    """The CARP role of a node from its `get_vip_status` response"""
+    rows: list = vipStatus.get("rows", []) if isinstance(vipStatus, dict) else []
+    statuses: list[str] = [
+        str(row.get("status", "")).upper()
+        for row in rows
+        if isinstance(row, dict) and (row.get("mode") == "carp" or "vhid" in row)
+    ]
+    if not statuses:
+        return None
+    if all(status == "MASTER" for status in statuses):
+        return "master"
+    if "MASTER" in statuses:
+        return "mixed"
+    return "backup"
+
+
+class HATransport(Transport):
+    """Routes requests between the nodes of a CARP cluster
+
+    Requests are built against the first URL and rewritten to the selected
+    node. Every `probeInterval` seconds all nodes are probed in parallel; a
+    node that doesn't answer within the interval is marked unhealthy, so a
+    failover is picked up within one interval. A read that fails to connect
+    is retried on the next node. A write is never retried, because it may
+    have been applied. Requests to a node give up after `timeout` seconds
+    without an answer, so a call doesn't hang with a node that stopped
+    answering; probes wait at most `probeInterval` seconds.
+
+    Args:
+        `urls (list[str])`: The base URLs of the nodes, the first is preferred
+        for writes while no master is known
+        `apiKey (str)`: The API key, shared by the nodes through the CARP sync
+        `apiSecret (str)`: The API secret
+        `transport (Transport | None, optional)`: Sends the requests. Defaults
+        to the shared default transport.
+        `probeInterval (float, optional)`: Seconds between probes. Defaults to 5.
+        `timeout (float | None, optional)`: Seconds to wait for a node to
+        connect or send data, None waits as long as the transport does.
+        Defaults to 30.
+        `start (bool, optional)`: Probe once and start the background probes.
+        Defaults to True.
+
+    Usage:
+        ```python
+        opnsense = OPNSenseAPI(
+            url=["https://fw-a.local", "https://fw-b.local"],
+            apiKey="myApiKey",
+            apiSecret="myApiSecret",
+        )
+        print(opnsense.transport.nodes())
+        ```
+    """
+
+    name = "ha"
+
+    def __init__(
+        self,
+        urls: list[str],
+        apiKey: str,
+        apiSecret: str,
+        transport: Transport | None = None,
+        probeInterval: float = 5.0,
+        timeout: float | None = 30.0,
+        start: bool = True,
+    ) -> None:
+        if not urls:
+            raise ValueError("HATransport needs at least one node URL")
+        if probeInterval <= 0:
+            raise ValueError("probeInterval must be positive")
+        # The shared default transport is left open on `close()`
+        self._ownsInner: bool = transport is not None
+        if transport is None:
+            from .helpers import defaultTransport
+
+            transport = defaultTransport
+
+        self.inner: Transport = transport
+        self.context = transport.context
+        self.auth: tuple[str, str] = (apiKey, apiSecret)
+        self.probeInterval: float = probeInterval
+        self.timeout: float | None = timeout
+        # Requests alternate between the nodes, each keeps its connections
+        transport.reserveHosts(len(urls))
+
+        self._lock: Lock = Lock()
+        self._nodes: list[HANode] = [HANode(url.rstrip("/")) for url in urls]
+        # Longest first, so a URL that prefixes another doesn't capture it
+        self._prefixes: list[HANode] = sorted(self._nodes, key=lambda n: -len(n.url))
+        self._stopped: Event = Event()
+        self._pool: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=len(self._nodes), thread_name_prefix="ngs-opnsense-probe"
+        )
+        self._thread: Thread | None = None
+        if start:
+            self.probe()
+            self._thread = Thread(target=self._run, name="ngs-opnsense-ha", daemon=True)
+            self._thread.start()
+
+    def request(self, method, url, auth, data=None, headers=None, timeout=None) -> Any:
+        timeout = self.timeout if timeout is None else timeout
+        node, path = self._split(url)
+        if node is None:
+            return self.inner.request(
+                method, url, auth, data=data, headers=headers, timeout=timeout
+            )
+
+        write: bool = isWrite(method, path)
+        # Streamed bodies can only be sent once
+        retry: bool = not write and (data is None or isinstance(data, (str, bytes)))
+        tried: set[str] = set()
+        while True:
+            node = self._select(write, tried)
+            tried.add(node.url)
+            try:
+                return self.inner.request(
+                    method,
+                    node.url + path,
+                    auth,
+                    data=data,
+                    headers=headers,
+                    timeout=timeout,
+                )
+            except _UNREACHABLE as e:
+                if isCertificateError(e):
+                    raise  # the node answered, with a certificate we don't trust
+                self._markDown(node, e)
+                if not retry or len(tried) == len(self._nodes):
+                    raise
+
+    def probe(self) -> None:
+        """Probe every node once, waiting at most `probeInterval` seconds"""
+        futures: dict[Future, HANode] = {}
+        with self._lock:
+            for node in self._nodes:
+                if not node.probing:  # a node that hangs keeps one probe only
+                    node.probing = True
+                    futures[self._pool.submit(self._probe, node)] = node
+
+        _, pending = wait(futures, timeout=self.probeInterval)
+        with self._lock:
+            for future in pending:
+                node: HANode = futures[future]
+                node.healthy = False
+                node.failures += 1
+                node.lastError = "probe timed out"
+
+    def nodes(self) -> list[dict]:
+        """The state of every node, see `HANode`"""
+        with self._lock:
+            return [
+                {key: value for key, value in asdict(node).items() if key != "probing"}
+                for node in self._nodes
+            ]
+
+    def stats(self) -> dict:
+        return {**self.inner.stats(), "transport": self.name, "nodes": self.nodes()}
+
+    def openConnections(self) -> int:
+        return self.inner.openConnections()
+
+    def close(self) -> None:
+        """Stop the probes and close the connections of the inner transport"""
+        self._stopped.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._ownsInner:
+            self.inner.close()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.probeInterval):
+            self.probe()
+
+    def _probe(self, node: HANode) -> None:
+        try:
+            started: float = perf_counter()
+            response = self.inner.request(
+                "GET",
+                node.url + SYSTEM_STATUS_PATH,
+                self.auth,
+                timeout=self.probeInterval,
+            )
+            response.raise_for_status()
+            response.json()
+            latency: float = perf_counter() - started
+
+            role: str | None = None
+            try:
+                vips = self.inner.request(
+                    "GET",
+                    node.url + VIP_STATUS_PATH,
+                    self.auth,
+                    timeout=self.probeInterval,
+                )
+                vips.raise_for_status()
+                role = carpRole(vips.json())
+            except Exception:
+                pass  # the key may not be allowed to read it, route on latency only
+        except Exception as e:
+            with self._lock:
+                node.healthy = False
+                node.failures += 1
+                node.lastError = f"{type(e).__name__}: {e}"
+                node.lastProbe = monotonic()
+                node.probing = False
+            return
+
+        with self._lock:
+            node.healthy = True
+            node.failures = 0
+            node.lastError = None
+            node.role = role
+            node.latency = (
+                latency if node.latency is None else 0.7 * node.latency + 0.3 * latency
+            )
+            node.lastProbe = monotonic()
+            node.probing = False
+
+    def _split(self, url: str) -> tuple[HANode | None, str]:
+        for node in self._prefixes:
+            if url.startswith(node.url):
+                return node, url[len(node.url) :]
+        return None, url
+
+    def _select(self, write: bool, tried: set[str]) -> HANode:
+        with self._lock:
+            candidates: list[HANode] = [n for n in self._nodes if n.url not in tried]
+            healthy: list[HANode] = [n for n in candidates if n.healthy]
+            if write:
+                masters: list[HANode] = [n for n in healthy if n.master]
+                # In configured order, the first node is preferred
+                return (masters or healthy or candidates)[0]
+            if healthy:
+                return min(
+                    healthy,
+                    key=lambda n: n.latency if n.latency is not None else float("inf"),
+                )
+            return candidates[0]
+
+    def _markDown(self, node: HANode, error: BaseException) -> None:
+        with self._lock:
+            node.healthy = False
+            node.failures += 1
+            node.lastError = f"{type(error).__name__}: {error}"
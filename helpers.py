@@ -1,16 +1,51 @@
-from typing import Any
-from traceback import print_exc
+from json import loads
+from time import perf_counter
+from typing import Any, Callable
 
-from requests import request
+from requests import Session
 from requests.models import Response
 from urllib3 import disable_warnings
 from urllib3.exceptions import InsecureRequestWarning
 
 from .validators import validateParams
+from .exceptions import requestError
+from .profiling import phase, profiledResponse, requestScope
+from .singleflight import SingleFlight
+from .transport import RequestsTransport, Transport
+
+# Shared by every client in the process, concurrent identical GET requests
+# are sent once. Set `requestFlight.enabled = False` to opt out.
+requestFlight: SingleFlight = SingleFlight()
+
+# Shared by every client in the process so connections (and TLS sessions)
+# are reused between requests, see `configurePool`.
+httpSession: Session = Session()
+
+# Used by clients that don't select a transport of their own
+defaultTransport: RequestsTransport = RequestsTransport(httpSession)
+
+# The default TLS settings accept the self signed certificate of the OPNSense
+# API, silence the warning urllib3 would print for every request
+disable_warnings(category=InsecureRequestWarning)
+
+
+def configurePool(connections: int) -> None:
+    """Keep up to `connections` open connections per host in the shared session
+
+    Args:
+        connections (int): The pool size, at least the number of threads that
+        send requests in parallel
+    """
+    defaultTransport.configurePool(connections)
 
 
 def _openSenseAPI(
-    url: str, apiKey: str, apiSecret: str, data: Any | None = None, Method="GET"
+    url: str,
+    apiKey: str,
+    apiSecret: str,
+    data: Any | None = None,
+    Method="GET",
+    transport: Transport | None = None,
 ) -> Response:
     """Helper function to interact with the OPNSense API
 
@@ -20,29 +55,81 @@ def _openSenseAPI(
         apiSecret (str): The API Secret
         data (str|None, optional): Stringified request body. Defaults to None.
         Method (str, optional): The HTTP method of the request. Defaults to "GET".
+        transport (Transport|None, optional): Sends the request. Defaults to
+        `defaultTransport`.
 
     Raises:
-        e: Re-raise the exception to ensure the caller knows the function failed
+        OPNSenseError: A typed error (`OPNSenseHTTPError`, `OPNSenseTimeout`,
+        `OPNSenseConnectionError`) chained to what the transport raised
 
     Returns:
-        Response: The response from the API call or an exception if an error occurred
+        Response: The response from the API call
     """
     validateParams(url=url, apiKey=apiKey, apiSecret=apiSecret)
 
-    # Suppress messages related to the self signed certificate from the OPNSense API
-    disable_warnings(category=InsecureRequestWarning)
-
+    started: float = perf_counter()
     try:
-        response: Response = request(
-            method=Method,
+        with requestScope(Method, url):
+            response: Response = (transport or defaultTransport).request(
+                method=Method,
+                url=url,
+                auth=(apiKey, apiSecret),
+                data=data,
+                headers={"Content-Type": "application/json"} if data else None,
+            )
+            response.raise_for_status()
+        return profiledResponse(response)
+    except Exception as e:
+        # Reported once by the caller, formatting a traceback here made every
+        # failure print twice
+        raise requestError(e, url, Method, started) from e
+
+
+def _openSenseJSON(
+    url: str,
+    apiKey: str,
+    apiSecret: str,
+    data: Any | None = None,
+    Method="GET",
+    objectHook: Callable[[dict], Any] | None = None,
+    transport: Transport | None = None,
+) -> Any:
+    """Helper function to interact with the OPNSense API, returning the parsed body
+
+    Concurrent identical GET requests (same URL, credentials and parsing) share
+    a single request and its parsed result, see `requestFlight`.
+
+    Args:
+        url (str): The URL of the API
+        apiKey (str): The API Key
+        apiSecret (str): The API Secret
+        data (str|None, optional): Stringified request body. Defaults to None.
+        Method (str, optional): The HTTP method of the request. Defaults to "GET".
+        objectHook (Callable|None, optional): `json.loads` object hook. Defaults to None.
+        transport (Transport|None, optional): Sends the request. Defaults to
+        `defaultTransport`.
+
+    Raises:
+        OPNSenseError: If the request failed, see `_openSenseAPI`
+
+    Returns:
+        Any: The decoded JSON body of the response
+    """
+
+    def fetch() -> Any:
+        response: Response = _openSenseAPI(
             url=url,
-            auth=(apiKey, apiSecret),
-            verify=False,
+            apiKey=apiKey,
+            apiSecret=apiSecret,
             data=data,
-            headers={"Content-Type": "application/json"} if data else None,
+            Method=Method,
+            transport=transport,
         )
-        response.raise_for_status()
-        return response
-    except Exception as e:
-        print_exc()
-        raise e  # Re-raise the exception to ensure the caller knows the function failed
+        if objectHook is None:
+            return response.json()
+        with phase("decode"):
+            return loads(response.content, object_hook=objectHook)
+
+    if Method != "GET" or data is not None or not requestFlight.enabled:
+        return fetch()
+    return requestFlight.do((url, apiKey, apiSecret, objectHook, transport), fetch)
@@ -0,0 +1,417 @@
+"""
+Opt-in profiling of API calls, broken down by phase
+
+Inside a `profile()` scope every call of the instrumented clients is recorded
+with the time spent in each phase:
+
+- `validate`: pydantic validation of the request data
+- `encode`: JSON encoding of the request body
+- `connect`: DNS lookup and TCP connect of new connections
+- `tls`: TLS handshakes of new connections
+- `server`: waiting for and reading the response, i.e. the server time and
+  the transfer
+- `decode`: JSON decoding of the response
+- `other`: everything else in the call
+
+Outside a scope the instrumentation points cost a global lookup.
+
+Usage:
+    ```python
+    from NG_OPNSense.profiling import profile
+
+    with profile(opnsense, memory=True) as run:
+        opnsense.coreAPI.firewall.alias.get()
+        opnsense.coreAPI.firewall.alias.addItem({...})
+
+    print(run.summary())
+    report = run.report()  # the same as a dict, plus every call
+    ```
+"""
+
+import tracemalloc
+from time import perf_counter
+from threading import Lock
+from dataclasses import asdict, dataclass, field
+from contextlib import ContextDecorator, nullcontext
+from contextvars import ContextVar, Token
+from typing import Any, Callable
+from urllib.parse import urlsplit
+
+# The phases reported for every call, in order
+PHASES: tuple[str, ...] = (
+    "validate",
+    "encode",
+    "connect",
+    "tls",
+    "server",
+    "decode",
+    "other",
+)
+
+# The active profile, one per process
+_profile: "Profile | None" = None
+# The call being recorded in the current thread or task
+_current: ContextVar["CallRecord | None"] = ContextVar("ngsProfileCall", default=None)
+_NOOP = nullcontext()
+
+
+@dataclass(slots=True)
+class CallRecord:
+    """The timings of one call, in seconds
+
+    `phases` holds the raw measurements. `request` is the whole time spent in
+    the transport, use `breakdown()` for the phases of `PHASES`.
+    """
+
+    name: str
+    elapsed: float = 0.0
+    phases: dict[str, float] = field(default_factory=dict)
+    requests: int = 0
+    # Net bytes still allocated after the call and the peak above the start
+    allocatedBytes: int | None = None
+    peakBytes: int | None = None
+    error: str | None = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def breakdown(self) -> dict[str, float]:
+        """The time of every phase in `PHASES`, `server` and `other` derived"""
+        phases: dict[str, float] = {name: self.phases.get(name, 0.0) for name in PHASES}
+        request: float = self.phases.get("request", 0.0)
+        phases["server"] = max(0.0, request - phases["connect"] - phases["tls"])
+        measured: float = sum(
+            value for name, value in phases.items() if name != "other"
+        )
+        phases["other"] = max(0.0, self.elapsed - measured)
+        return phases
+
+
+class _Phase:
+    """Adds the time spent in its block to a phase of a call"""
+
+    __slots__ = ("record", "name", "started")
+
+    def __init__(self, record: CallRecord, name: str) -> None:
+        self.record: CallRecord = record
+        self.name: str = name
+
+    def __enter__(self) -> None:
+        self.started: float = perf_counter()
+
+    def __exit__(self, *_) -> None:
+        self.record.add(self.name, perf_counter() - self.started)
+
+
+class _Call:
+    """Records a call unless it runs inside another recorded call"""
+
+    __slots__ = ("profile", "name", "record", "token", "started")
+
+    def __init__(self, profile: "Profile", name: str) -> None:
+        self.profile: "Profile" = profile
+        self.name: str = name
+        self.record: CallRecord | None = None
+
+    def __enter__(self) -> CallRecord | None:
+        if _current.get() is not None:
+            return None
+        self.record = CallRecord(self.name)
+        self.token: Token = _current.set(self.record)
+        if self.profile.memory:
+            self.record.allocatedBytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.started: float = perf_counter()
+        return self.record
+
+    def __exit__(self, excType, exc, _) -> None:
+        record: CallRecord | None = self.record
+        if record is None:
+            return
+        record.elapsed = perf_counter() - self.started
+        _current.reset(self.token)
+        if self.profile.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record.peakBytes = max(0, peak - record.allocatedBytes)
+            record.allocatedBytes = current - record.allocatedBytes
+        if excType is not None:
+            record.error = excType.__name__
+        self.profile._add(record)
+
+
+class _Request:
+    """Times a request, opening a call named after the endpoint if none is open"""
+
+    __slots__ = ("call", "phase")
+
+    def __init__(self, profile: "Profile", method: str, url: str) -> None:
+        record: CallRecord | None = _current.get()
+        self.call: _Call | None = None
+        if record is None:
+            self.call = _Call(profile, f"{method} {urlsplit(url).path}")
+        self.phase: _Phase | None = (
+            None if record is None else _Phase(record, "request")
+        )
+
+    def __enter__(self) -> None:
+        if self.call is not None:
+            self.phase = _Phase(self.call.__enter__(), "request")
+        self.phase.record.requests += 1
+        self.phase.__enter__()
+
+    def __exit__(self, *exc) -> None:
+        self.phase.__exit__()
+        if self.call is not None:
+            self.call.__exit__(*exc)
+
+
+class _ProfiledResponse:
+    """A response whose `json()` is timed as the `decode` phase"""
+
+    __slots__ = ("_response",)
+
+    def __init__(self, response: Any) -> None:
+        self._response: Any = response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._response, name)
+
+    def json(self) -> Any:
+        with phase("decode"):
+            return self._response.json()
+
+
+def phase(name: str):
+    """A context manager adding the time of its block to the current call
+
+    Returns a shared no-op context manager when nothing is being profiled.
+    """
+    if _profile is None:
+        return _NOOP
+    record: CallRecord | None = _current.get()
+    return _NOOP if record is None else _Phase(record, name)
+
+
+def requestScope(method: str, url: str):
+    """Times a request sent by `_openSenseAPI`, see `phase()`"""
+    if _profile is None:
+        return _NOOP
+    return _Request(_profile, method, url)
+
+
+def profiledResponse(response: Any) -> Any:
+    """The response, with a timed `json()` while profiling"""
+    return response if _profile is None else _ProfiledResponse(response)
+
+
+class Profile(ContextDecorator):
+    """Records the calls made while it is active, see the module documentation
+
+    Calls of the instrumented objects (and of the controllers reachable from
+    them, e.g. `opnsense.coreAPI.firewall.alias`) are recorded by name with all
+    their phases. A call made inside another recorded call is part of the outer
+    one. Requests sent outside an instrumented call are recorded as
+    `METHOD /api/...` with the network phases only.
+
+    Args:
+        `*targets (Any)`: Clients or controllers whose public methods are recorded
+        `memory (bool, optional)`: Record the memory allocated by every call with
+        `tracemalloc`, which slows the calls down considerably. The peak is
+        process wide, so it is only exact for calls that don't overlap.
+        Defaults to False.
+        `cprofile (bool, optional)`: Run `cProfile` over the whole scope, in the
+        thread that entered it. Defaults to False.
+
+    Raises:
+        `RuntimeError`: If another profile is active
+    """
+
+    def __init__(self, *targets: Any, memory: bool = False, cprofile: bool = False):
+        self.targets: tuple[Any, ...] = targets
+        self.memory: bool = memory
+        self.calls: list[CallRecord] = []
+        self.elapsed: float = 0.0
+        self.profiler = None
+        if cprofile:
+            from cProfile import Profile as CProfile
+
+            self.profiler = CProfile()
+
+        self._lock: Lock = Lock()
+        self._patched: list[tuple[Any, str]] = []
+        self._startedTracing: bool = False
+
+    def __enter__(self) -> "Profile":
+        global _profile
+        if _profile is not None:
+            raise RuntimeError("Another profile is active")
+
+        seen: set[int] = set()
+        for target in self.targets:
+            self._instrument(target, seen)
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._startedTracing = True
+
+        _profile = self
+        self._started: float = perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *_) -> None:
+        global _profile
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.elapsed += perf_counter() - self._started
+        _profile = None
+
+        if self._startedTracing:
+            tracemalloc.stop()
+            self._startedTracing = False
+        for target, name in self._patched:
+            delattr(target, name)
+        self._patched.clear()
+
+    def summary(self) -> str:
+        """A table of the calls by name, with the mean time of every phase in ms"""
+        report: dict = self.report(calls=False)
+        memory: bool = self.memory
+        header: str = f"{'call':<40} {'n':>5} {'total':>9} {'mean':>8}" + "".join(
+            f" {name:>8}" for name in PHASES
+        )
+        if memory:
+            header += f" {'peak KiB':>9}"
+        lines: list[str] = [header, "-" * len(header)]
+        for name, stats in report["summary"].items():
+            line: str = (
+                f"{name[-40:]:<40} {stats['calls']:>5} {stats['totalMs']:>9.1f}"
+                f" {stats['meanMs']:>8.2f}"
+                + "".join(f" {stats['phasesMs'][part]:>8.2f}" for part in PHASES)
+            )
+            if memory:
+                line += f" {stats['meanPeakBytes'] / 1024:>9.1f}"
+            lines.append(line)
+        lines.append(
+            f"{len(self.calls)} calls in {self.elapsed * 1000:.1f} ms, phases are"
+            " the mean ms per call"
+        )
+        return "\n".join(lines)
+
+    def report(self, calls: bool = True) -> dict:
+        """The profile as a JSON serializable dict
+
+        Args:
+            `calls (bool, optional)`: Include every call, not only the summary
+            per name. Defaults to True.
+
+        Returns:
+            `dict`: `elapsedMs`, `summary` (per name: `calls`, `errors`,
+            `totalMs`, `meanMs`, `maxMs`, `phasesMs`, `meanPeakBytes`,
+            `meanAllocatedBytes`) and `calls`
+        """
+        with self._lock:
+            records: list[CallRecord] = list(self.calls)
+
+        grouped: dict[str, list[CallRecord]] = {}
+        for record in records:
+            grouped.setdefault(record.name, []).append(record)
+
+        summary: dict[str, dict] = {}
+        for name, group in sorted(
+            grouped.items(), key=lambda item: -sum(r.elapsed for r in item[1])
+        ):
+            count: int = len(group)
+            breakdowns: list[dict[str, float]] = [r.breakdown() for r in group]
+            total: float = sum(r.elapsed for r in group)
+            summary[name] = {
+                "calls": count,
+                "errors": sum(r.error is not None for r in group),
+                "requests": sum(r.requests for r in group),
+                "totalMs": round(total * 1000, 3),
+                "meanMs": round(total * 1000 / count, 3),
+                "maxMs": round(max(r.elapsed for r in group) * 1000, 3),
+                "phasesMs": {
+                    part: round(sum(b[part] for b in breakdowns) * 1000 / count, 3)
+                    for part in PHASES
+                },
+                "meanPeakBytes": (
+                    sum(r.peakBytes for r in group) // count if self.memory else None
+                ),
+                "meanAllocatedBytes": (
+                    sum(r.allocatedBytes for r in group) // count
+                    if self.memory
+                    else None
+                ),
+            }
+
+        report: dict = {"elapsedMs": round(self.elapsed * 1000, 3), "summary": summary}
+        if calls:
+            report["calls"] = [
+                {**asdict(record), "phases": record.breakdown()} for record in records
+            ]
+        return report
+
+    def cprofileStats(self, sort: str = "cumulative", limit: int = 25) -> str:
+        """The `pstats` table of the `cProfile` run
+
+        Raises:
+            `RuntimeError`: If the profile was created without `cprofile=True`
+        """
+        if self.profiler is None:
+            raise RuntimeError("Create the profile with cprofile=True")
+        from io import StringIO
+        from pstats import Stats
+
+        out = StringIO()
+        Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def _add(self, record: CallRecord) -> None:
+        with self._lock:
+            self.calls.append(record)
+
+    def _instrument(self, target: Any, seen: set[int]) -> None:
+        """Record the public methods of `target` and of the controllers it holds"""
+        if id(target) in seen:
+            return
+        seen.add(id(target))
+
+        cls: type = type(target)
+        for name in dir(cls):
+            if name.startswith("_") or not callable(getattr(cls, name, None)):
+                continue
+            if isinstance(getattr(cls, name), type) or name in vars(target):
+                continue
+            setattr(target, name, self._wrap(f"{cls.__name__}.{name}", target, name))
+            self._patched.append((target, name))
+
+        for value in vars(target).values():
+            if type(value).__module__.startswith("NG_OPNSense.Api"):
+                self._instrument(value, seen)
+
+    def _wrap(self, name: str, target: Any, attribute: str) -> Callable[..., Any]:
+        method: Callable[..., Any] = getattr(target, attribute)
+
+        def recorded(*args: Any, **kwargs: Any) -> Any:
+            with _Call(self, name):
+                return method(*args, **kwargs)
+
+        recorded.__wrapped__ = method
+        recorded.__doc__ = method.__doc__
+        return recorded
+
+
+def profile(*targets: Any, memory: bool = False, cprofile: bool = False) -> Profile:
+    """Profile the calls made in a `with` block or a decorated function
+
+    Args:
+        `*targets (Any)`: Clients or controllers to instrument, e.g. `opnsense`
+        `memory (bool, optional)`: Record allocations with tracemalloc.
+        Defaults to False.
+        `cprofile (bool, optional)`: Run cProfile over the scope. Defaults to False.
+
+    Returns:
+        `Profile`: The profile, read `summary()` or `report()` after the scope
+    """
+    return Profile(*targets, memory=memory, cprofile=cprofile)
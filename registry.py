@@ -0,0 +1,249 @@
+"""
+A bounded registry of warm clients for services that talk to many firewalls
+
+Building an `OPNSenseAPI` costs a status round trip and a TLS handshake, so a
+service serving many tenants should reuse them. `ClientRegistry` keeps one
+client per `(url, apiKey)`, evicts the least recently used one when it is full
+and the ones that were idle for too long, and closes the connection pools of
+the clients it evicts.
+
+Usage:
+    ```python
+    from NG_OPNSense.registry import ClientRegistry
+
+    clients = ClientRegistry(maxClients=200, idleTimeout=900)
+
+    def handle(tenant):
+        opnsense = clients.get(tenant.url, tenant.apiKey, tenant.apiSecret)
+        return opnsense.coreAPI.firewall.alias.get(lean=True)
+
+    print(clients.stats())
+    ```
+"""
+
+from time import monotonic
+from threading import Lock
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import Future
+from typing import Any, Callable
+
+
+def _defaultFactory(url: str, apiKey: str, apiSecret: str) -> Any:
+    from . import OPNSenseAPI
+
+    # A transport of its own, so its pool is closed when the client is evicted
+    return OPNSenseAPI(
+        url=url, apiKey=apiKey, apiSecret=apiSecret, transport="requests"
+    )
+
+
+def _close(client: Any) -> None:
+    close: Callable[[], None] | None = getattr(client, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass  # the client is dropped either way
+
+
+@dataclass(slots=True)
+class _Entry:
+    client: Any
+    apiSecret: str
+    lastUsed: float
+
+
+class ClientRegistry:
+    """Thread-safe cache of clients keyed by `(url, apiKey)`
+
+    A client is built once per key, concurrent requests for a missing key with
+    the same `apiSecret` wait for the same build. A different `apiSecret` for a
+    known key, or for one being built, gets a client built with that secret,
+    which replaces the cached one, so rotated credentials take effect and a
+    wrong secret never receives a client authenticated with another one. Idle
+    clients are evicted on every `get()`; call `evictIdle()` to release them
+    while no requests come in. A request still running on an evicted client
+    reconnects.
+
+    Args:
+        `factory (Callable, optional)`: Builds a client from
+        `(url, apiKey, apiSecret)`. Defaults to an `OPNSenseAPI` with its own
+        `requests` transport.
+        `maxClients (int, optional)`: Clients kept at most. Defaults to 64.
+        `idleTimeout (float | None, optional)`: Seconds after the last use a
+        client is evicted, None keeps it until it is the least recently used.
+        Defaults to 600.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str, str, str], Any] = _defaultFactory,
+        maxClients: int = 64,
+        idleTimeout: float | None = 600,
+    ) -> None:
+        if maxClients < 1:
+            raise ValueError("maxClients must be at least 1")
+
+        self.factory: Callable[[str, str, str], Any] = factory
+        self.maxClients: int = maxClients
+        self.idleTimeout: float | None = idleTimeout
+
+        self._lock: Lock = Lock()
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        # The build in flight per key and the secret it authenticates with
+        self._building: dict[tuple[str, str], tuple[Future, str]] = {}
+        self._stats: dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "idleEvictions": 0,
+        }
+
+    def get(self, url: str, apiKey: str, apiSecret: str) -> Any:
+        """The client of a firewall, built by `factory` unless it is cached
+
+        Raises:
+            Whatever `factory` raises, e.g. `AssertionError` if the firewall
+            cannot be reached. Failed builds are not cached.
+        """
+        key: tuple[str, str] = (url, apiKey)
+        counted: bool = False
+        while True:
+            evicted: list[Any] = []
+            with self._lock:
+                now: float = monotonic()
+                evicted += self._expire(now)
+                entry: _Entry | None = self._entries.get(key)
+                hit: bool = entry is not None and entry.apiSecret == apiSecret
+                if hit:
+                    self._stats["hits"] += not counted
+                    entry.lastUsed = now
+                    self._entries.move_to_end(key)
+                else:
+                    self._stats["misses"] += not counted
+                    counted = True
+                    pending: tuple[Future, str] | None = self._building.get(key)
+                    owner: bool = pending is None
+                    if owner:
+                        building: Future = Future()
+                        self._building[key] = (building, apiSecret)
+                    else:
+                        building, secret = pending
+            for stale in evicted:
+                _close(stale)
+            if hit:
+                return entry.client
+            if owner:
+                break
+            if secret == apiSecret:
+                return building.result()
+            # Being built with another secret, never hand that client out
+            try:
+                building.result()
+            except BaseException:
+                pass
+
+        # Built outside the lock, the status check can take a while
+        try:
+            client: Any = self.factory(url, apiKey, apiSecret)
+        except BaseException as e:
+            with self._lock:
+                del self._building[key]
+            building.set_exception(e)
+            raise
+
+        evicted = []
+        with self._lock:
+            del self._building[key]
+            replaced: _Entry | None = self._entries.pop(key, None)
+            if replaced is not None:
+                evicted.append(replaced.client)
+            self._entries[key] = _Entry(client, apiSecret, monotonic())
+            while len(self._entries) > self.maxClients:
+                _, oldest = self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+                evicted.append(oldest.client)
+        building.set_result(client)
+        for stale in evicted:
+            _close(stale)
+        return client
+
+    def evict(self, url: str, apiKey: str) -> bool:
+        """Close and drop the client of a firewall, returns whether it was cached"""
+        with self._lock:
+            entry: _Entry | None = self._entries.pop((url, apiKey), None)
+            if entry is not None:
+                self._stats["evictions"] += 1
+        if entry is None:
+            return False
+        _close(entry.client)
+        return True
+
+    def evictIdle(self) -> int:
+        """Close the clients idle for longer than `idleTimeout`, returns how many"""
+        with self._lock:
+            evicted: list[Any] = self._expire(monotonic())
+        for client in evicted:
+            _close(client)
+        return len(evicted)
+
+    def close(self) -> None:
+        """Close and drop every client"""
+        with self._lock:
+            clients: list[Any] = [entry.client for entry in self._entries.values()]
+            self._entries.clear()
+        for client in clients:
+            _close(client)
+
+    def stats(self) -> dict:
+        """Hits, misses, hit rate, evictions and the pooled open connections
+
+        Returns:
+            `dict`: e.g. `{"clients": 12, "hits": 950, "misses": 50,
+            "hitRate": 0.95, "evictions": 3, "idleEvictions": 35,
+            "openConnections": 14}`
+        """
+        with self._lock:
+            stats: dict = {"clients": len(self._entries), **self._stats}
+            clients: list[Any] = [entry.client for entry in self._entries.values()]
+        lookups: int = stats["hits"] + stats["misses"]
+        stats["hitRate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats["openConnections"] = sum(_openConnections(client) for client in clients)
+        return stats
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __enter__(self) -> "ClientRegistry":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def _expire(self, now: float) -> list[Any]:
+        """Drop the idle entries, oldest first, the caller holds the lock"""
+        if self.idleTimeout is None:
+            return []
+        expired: list[Any] = []
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.lastUsed < self.idleTimeout:
+                break
+            del self._entries[key]
+            self._stats["idleEvictions"] += 1
+            expired.append(entry.client)
+        return expired
+
+
+def _openConnections(client: Any) -> int:
+    transport: Any = getattr(client, "transport", None)
+    openConnections: Callable[[], int] | None = getattr(
+        transport, "openConnections", None
+    )
+    return openConnections() if openConnections is not None else 0
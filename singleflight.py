@@ -0,0 +1,119 @@
+from threading import Lock
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one execution
+
+    While a call for a key is in flight, every other caller asking for the same
+    key waits for it and receives the same result (or exception) instead of
+    starting its own. Results are not cached, a call that starts after the
+    previous one finished executes again.
+
+    Both threads and coroutines can join the same flight since waiting is done
+    on a `concurrent.futures.Future`.
+
+    Note:
+        Every caller of a collapsed call receives the same object, callers
+        that need to modify the result should copy it first.
+
+    Usage:
+        ```python
+        flight = SingleFlight()
+        aliases = flight.do(("get", url), lambda: fetchAliases(url))
+        aliases = await flight.doAsync(("get", url), lambda: fetchAliases(url))
+        ```
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = True
+        self._lock: Lock = Lock()
+        self._inFlight: dict[Hashable, Future] = {}
+        self._calls: int = 0
+        self._executed: int = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run `fn`, or wait for the in-flight call with the same key
+
+        Args:
+            `key (Hashable)`: Identifies identical calls
+            `fn (Callable[[], Any])`: The call, only executed by the first caller
+
+        Returns:
+            `Any`: The result of the call
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            value: Any = fn()
+        except BaseException as e:
+            self._land(key, future, exception=e)
+            raise
+        self._land(key, future, value=value)
+        return value
+
+    async def doAsync(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Like `do()`, running the blocking `fn` in a worker thread
+
+        Args:
+            `key (Hashable)`: Identifies identical calls
+            `fn (Callable[[], Any])`: The blocking call, only executed by the first caller
+
+        Returns:
+            `Any`: The result of the call
+        """
+        import asyncio  # only needed by async callers, keeps the import cheap
+
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            value: Any = await asyncio.to_thread(fn)
+        except BaseException as e:
+            self._land(key, future, exception=e)
+            raise
+        self._land(key, future, value=value)
+        return value
+
+    def stats(self) -> dict[str, int]:
+        """Call counters
+
+        Returns:
+            `dict[str, int]`: `calls` made, calls `executed`, calls `collapsed`
+            into another one, and calls currently `inFlight`
+        """
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "executed": self._executed,
+                "collapsed": self._calls - self._executed,
+                "inFlight": len(self._inFlight),
+            }
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        with self._lock:
+            self._calls += 1
+            future: Future | None = self._inFlight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inFlight[key] = Future()
+            self._executed += 1
+            return future, True
+
+    def _land(
+        self,
+        key: Hashable,
+        future: Future,
+        value: Any = None,
+        exception: BaseException | None = None,
+    ) -> None:
+        with self._lock:
+            del self._inFlight[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(value)
@@ -0,0 +1,78 @@
+from NG_OPNSense.Api.CoreAPI.Diagnostics import ARPHistory, ARPSnapshot
+
+arpTable: list[dict] = [
+    {"mac": "AA:BB:CC:00:00:01", "ip": "192.168.1.10", "intf": "em0", "expires": 1200},
+    {"mac": "aa:bb:cc:00:00:02", "ip": "192.168.1.11", "intf": "em0", "expires": 1200},
+    {"mac": "aa:bb:cc:00:00:03", "ip": "10.0.0.5", "intf": "em1", "expires": 1200},
+]
+
+
+def test_indexes() -> None:
+    snapshot = ARPSnapshot.fromTable(arpTable)
+
+    assert len(snapshot) == 3
+    assert "AA:BB:CC:00:00:01" in snapshot
+    assert snapshot.lookupMAC("aa:bb:cc:00:00:01")[0].ip == "192.168.1.10"
+    assert snapshot.lookupIP("10.0.0.5").mac == "aa:bb:cc:00:00:03"
+    assert snapshot.lookupIP("10.0.0.6") is None
+    assert len(snapshot.onInterface("em0")) == 2
+
+
+def test_diff() -> None:
+    previous = ARPSnapshot.fromTable(arpTable)
+    current = ARPSnapshot.fromTable(
+        [
+            # expiry changes only, not reported
+            {
+                "mac": "aa:bb:cc:00:00:01",
+                "ip": "192.168.1.10",
+                "intf": "em0",
+                "expires": 30,
+            },
+            # moved to another interface
+            {"mac": "aa:bb:cc:00:00:03", "ip": "192.168.1.12", "intf": "em0"},
+            {"mac": "aa:bb:cc:00:00:04", "ip": "192.168.1.13", "intf": "em0"},
+        ]
+    )
+
+    changes = current.diff(previous)
+
+    assert [entry.mac for entry in changes.appeared] == ["aa:bb:cc:00:00:04"]
+    assert [entry.mac for entry in changes.disappeared] == ["aa:bb:cc:00:00:02"]
+    assert len(changes.moved) == 1
+    before, after = changes.moved[0]
+    assert (before[0].intf, after[0].intf) == ("em1", "em0")
+    assert not previous.diff(previous)
+    assert len(current.diff(None).appeared) == 3
+
+
+def test_history() -> None:
+    first = ARPSnapshot.fromTable(arpTable)
+    second = ARPSnapshot.fromTable(arpTable[:2])
+    third = ARPSnapshot.fromTable(
+        arpTable[:1] + [{"mac": "aa:bb:cc:00:00:03", "ip": "10.0.0.5", "intf": "em1"}]
+    )
+
+    with ARPHistory(":memory:", maxGap=120) as history:
+        for at in range(0, 600, 60):
+            history.record(first, at=at)
+        # Unchanged polls only extend the intervals
+        assert len(history) == 3
+
+        history.record(second, at=600)
+        history.record(third, at=660)
+        assert len(history) == 4
+
+        found = history.at(300, mac="AA:BB:CC:00:00:03")
+        assert [(entry.ip, entry.firstSeen, entry.lastSeen) for entry in found] == [
+            ("10.0.0.5", 0, 540)
+        ]
+        assert history.at(630, mac="aa:bb:cc:00:00:03") == []
+        assert len(history.history(ip="10.0.0.5", start=500)) == 2
+
+        # A gap longer than maxGap closes the intervals instead of extending them
+        history.record(third, at=1000)
+        assert len(history.history(mac="aa:bb:cc:00:00:01")) == 2
+
+        assert history.prune(before=900) == 4
+        assert len(history) == 2
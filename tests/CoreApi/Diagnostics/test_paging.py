@@ -0,0 +1,102 @@
+import time
+from json import dumps, loads
+from threading import Lock
+from importlib import import_module
+
+import pytest
+
+from NG_OPNSense.Api.CoreAPI.Diagnostics import DiagnosticsController, PagedRows
+
+
+class FakeTable:
+    """A paged search endpoint over `size` rows"""
+
+    def __init__(self, size: int, failOn: int | None = None) -> None:
+        self.size = size
+        self.failOn = failOn
+        self.lock = Lock()
+        self.requested: list[int] = []
+
+    def __call__(self, current: int, rowCount: int) -> dict:
+        with self.lock:
+            self.requested.append(current)
+        if current == self.failOn:
+            raise ConnectionError("page lost")
+        start: int = (current - 1) * rowCount
+        rows = [{"id": i} for i in range(start, min(start + rowCount, self.size))]
+        return {"rows": rows, "total": self.size, "current": current}
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 3])
+def test_pagesEveryRow(prefetch: int) -> None:
+    table = FakeTable(2500)
+    rows = PagedRows(table, rowCount=1000, prefetch=prefetch)
+
+    assert [row["id"] for row in rows] == list(range(2500))
+    assert rows.total == 2500 and rows.pages == 3 and rows.yielded == 2500
+    assert table.requested == [1, 2, 3]
+
+
+def test_backpressureAndEarlyExit() -> None:
+    table = FakeTable(100000)
+    rows = iter(PagedRows(table, rowCount=100, prefetch=2))
+
+    next(rows)
+    # the consumer holds page 1, pages 2-3 are queued and page 4 waits for room
+    for _ in range(50):
+        if len(table.requested) >= 4:
+            break
+        time.sleep(0.01)
+    time.sleep(0.2)
+    assert table.requested == [1, 2, 3, 4]
+
+    rows.close()
+    requested: int = len(table.requested)
+    time.sleep(0.3)
+    assert len(table.requested) == requested
+
+
+def test_limitAndErrors() -> None:
+    table = FakeTable(5000)
+    rows = PagedRows(table, rowCount=1000, prefetch=0, limit=1500)
+    assert len(list(rows)) == 1500 and table.requested == [1, 2]
+
+    failing = PagedRows(FakeTable(5000, failOn=2), rowCount=1000)
+    with pytest.raises(ConnectionError):
+        list(failing)
+    assert failing.yielded == 1000
+
+
+class FakeResponse:
+    def __init__(self, payload: dict) -> None:
+        self.content: bytes = dumps(payload).encode()
+
+    def json(self) -> dict:
+        return loads(self.content)
+
+
+def test_queryStates(monkeypatch) -> None:
+    module = import_module("NG_OPNSense.Api.CoreAPI.Diagnostics.controller")
+    sent: list[dict] = []
+
+    def fake(**kwargs) -> FakeResponse:
+        sent.append(kwargs)
+        body: dict = loads(kwargs["data"])
+        rows = [{"label": "r1"}] * (2 if body["current"] == 1 else 1)
+        return FakeResponse({"rows": rows, "total": 3})
+
+    monkeypatch.setattr(module, "_openSenseAPI", fake)
+    diagnostics = DiagnosticsController("https://fw/api", apiKey="", apiSecret="")
+
+    states = diagnostics.queryStates("10.0.0.5", ruleId="r1", rowCount=2)
+    assert len(list(states)) == 3
+    assert sent[0]["url"] == "https://fw/api/diagnostics/firewall/query_states"
+    assert loads(sent[1]["data"]) == {
+        "searchPhrase": "10.0.0.5",
+        "ruleid": "r1",
+        "current": 2,
+        "rowCount": 2,
+    }
+
+    list(diagnostics.queryPfTable("bogons", rowCount=2, limit=1))
+    assert sent[-1]["url"] == "https://fw/api/firewall/alias_util/list/bogons"
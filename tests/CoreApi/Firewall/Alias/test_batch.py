@@ -0,0 +1,206 @@
+from threading import Lock
+from time import sleep
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import (
+    AliasController,
+    AliasItem,
+    AliasOperation,
+)
+from NG_OPNSense.concurrency import AdaptiveLimiter
+
+
+class FakeController:
+    """Records the calls a transaction makes instead of sending them"""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.limiter = AdaptiveLimiter()
+        self.calls: list[tuple] = []
+        self.items: dict[str, dict] = {
+            "a": {"alias": {"name": "a", "content": ["10.0.0.1"], "enabled": "1"}},
+            "b": {"alias": {"name": "b", "content": ["80", "443"], "enabled": "1"}},
+            "c": {"alias": {"name": "c", "content": ["22"], "enabled": "0"}},
+        }
+
+    def _record(self, *call) -> None:
+        with self.lock:
+            self.calls.append(call)
+
+    def transaction(self, maxWorkers: int = 4, captureRollback: bool = True):
+        return AliasController.transaction(self, maxWorkers, captureRollback)
+
+    def getItem(self, uuid: str, lean: bool = False) -> dict:
+        return self.items[uuid]
+
+    def addItem(self, alias: dict) -> dict:
+        self._record("addItem", alias)
+        return {"result": "saved", "uuid": "new"}
+
+    def setItem(self, uuid: str, dataToSet: dict) -> dict:
+        self._record("setItem", uuid, dataToSet)
+        if uuid == "broken":
+            return {"result": "failed", "validations": {"alias.content": "bad"}}
+        return {"result": "saved"}
+
+    def toggleItem(self, uuid: str, enabled: bool) -> dict:
+        self._record("toggleItem", uuid, enabled)
+        return {"result": "Enabled" if enabled else "Disabled"}
+
+    def delItem(self, uuid: str) -> dict:
+        self._record("delItem", uuid)
+        return {"result": "deleted"}
+
+    def reconfigure(self) -> dict:
+        self._record("reconfigure")
+        return {"status": "ok"}
+
+
+def test_coalescing() -> None:
+    controller = FakeController()
+
+    with controller.transaction(maxWorkers=2) as tx:
+        tx.setItem("a", {"alias": {"content": "10.0.0.2"}})
+        tx.setItem("a", {"alias": {"description": "web"}})
+        tx.toggleItem("a", False)
+        tx.toggleItem("b", True)
+        tx.toggleItem("b", False)
+        tx.setItem("c", {"alias": {"content": "1"}})
+        tx.delItem("c")
+        tx.addItem({"name": "d", "type": "port", "content": "22"})
+
+    result = tx.result
+    assert result.ok
+    assert (result.queued, result.sent) == (8, 4)
+    assert sorted(controller.calls[:-1], key=str) == sorted(
+        [
+            (
+                "setItem",
+                "a",
+                {
+                    "alias": {
+                        "content": "10.0.0.2",
+                        "description": "web",
+                        "enabled": "0",
+                    }
+                },
+            ),
+            ("toggleItem", "b", False),
+            ("delItem", "c"),
+            ("addItem", {"name": "d", "type": "port", "content": "22"}),
+        ],
+        key=str,
+    )
+    assert controller.calls[-1] == ("reconfigure",)
+    assert result.created == ["new"]
+    assert result.previous["a"] == {
+        "alias": {"name": "a", "content": "10.0.0.1", "enabled": "1"}
+    }
+    assert result.deleted == ["c"]
+
+    controller.calls.clear()
+    assert result.rollback(controller).ok
+    assert ("delItem", "new") in controller.calls
+    assert (
+        "addItem",
+        {"name": "c", "content": "22", "enabled": "0"},
+    ) in controller.calls
+
+
+def test_failureAndRollback() -> None:
+    controller = FakeController()
+    controller.items["broken"] = {"alias": {"name": "broken"}}
+
+    with controller.transaction() as tx:
+        tx.setItem("a", {"alias": {"content": "10.0.0.2"}})
+        tx.setItem("broken", {"alias": {"content": "nope"}})
+
+    assert not tx.result.ok
+    assert [failure.uuid for failure in tx.result.failures] == ["broken"]
+    assert tx.result.failures[0].operation == AliasOperation.set
+    # Only the successful change needs to be reverted
+    assert list(tx.result.previous) == ["a"]
+    assert controller.calls.count(("reconfigure",)) == 1
+
+    controller.calls.clear()
+    reverted = tx.result.rollback(controller)
+    assert reverted.ok
+    assert ("setItem", "a", tx.result.previous["a"]) in controller.calls
+
+
+# A lean getItem response as the firewall returns it
+LEAN_ITEM: dict = {
+    "alias": {
+        "enabled": "1",
+        "name": "web",
+        "type": ["host"],
+        "path_expression": "",
+        "proto": [],
+        "interface": [],
+        "counters": "",
+        "updatefreq": "",
+        "content": ["10.0.0.1", "10.0.0.2"],
+        "password": "",
+        "username": "",
+        "authtype": [],
+        "expire": "",
+        "categories": {},
+        "description": "web servers",
+    }
+}
+
+
+def test_rollbackFromRealisticItem() -> None:
+    controller = FakeController()
+    controller.items["web"] = LEAN_ITEM
+    added: list[dict] = []
+    controller.addItem = lambda alias: (
+        added.append(AliasItem(**alias)) or {"result": "saved", "uuid": "new"}
+    )
+
+    with controller.transaction() as tx:
+        tx.delItem("web")
+    alias: dict = tx.result.previous["web"]["alias"]
+    assert alias["content"] == "10.0.0.1\n10.0.0.2"
+    assert (alias["type"], alias["proto"], alias["categories"]) == ("host", "", "")
+    assert "updatefreq" not in alias and "counters" not in alias
+
+    assert tx.result.rollback(controller).ok
+    assert added[0].name == "web" and added[0].content == "10.0.0.1\n10.0.0.2"
+
+
+def test_lastEnabledWriteWins() -> None:
+    controller = FakeController()
+
+    with controller.transaction() as tx:
+        tx.toggleItem("a", False)
+        tx.setItem("a", {"alias": {"enabled": "1"}})
+        tx.setItem("b", {"alias": {"enabled": "1"}})
+        tx.toggleItem("b", False)
+
+    sets: dict = {call[1]: call[2] for call in controller.calls if call[0] == "setItem"}
+    assert sets["a"]["alias"]["enabled"] == "1"
+    assert sets["b"]["alias"]["enabled"] == "0"
+
+
+def test_stepsAreSentInOrder() -> None:
+    class SlowController(FakeController):
+        def addItem(self, alias: dict) -> dict:
+            sleep(0.05)
+            return super().addItem(alias)
+
+        def setItem(self, uuid: str, dataToSet: dict) -> dict:
+            sleep(0.05)
+            return super().setItem(uuid, dataToSet)
+
+    controller = SlowController()
+    with controller.transaction(maxWorkers=4) as tx:
+        tx.delItem("c")
+        tx.setItem("b", {"alias": {"content": "a"}})  # drops the reference to c
+        tx.toggleItem("a", False)
+        tx.addItem({"name": "nested", "type": "network", "content": "new"})
+        tx.addItem({"name": "new", "type": "host", "content": "10.0.0.9"})
+
+    order: list[str] = [call[0] for call in controller.calls]
+    assert order[:2] == ["addItem", "addItem"]
+    assert sorted(order[2:4]) == ["setItem", "toggleItem"]
+    assert order[4:] == ["delItem", "reconfigure"]
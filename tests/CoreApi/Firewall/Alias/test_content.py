@@ -0,0 +1,63 @@
+import pytest
+from pydantic import ValidationError
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import (
+    VALIDATE_CONTENT,
+    AliasHost,
+    AliasMAC,
+    validateContent,
+)
+
+
+def test_validateHosts() -> None:
+    report = validateContent(
+        "host",
+        "10.0.0.1\nFiles.Example.com\n10.0.0.1-10.0.0.9\n2001:DB8::1\n"
+        "not a host\n!192.168.1.1\n10.0.0.1\n010.0.0.1",
+    )
+
+    assert report.entries == [
+        "10.0.0.1",
+        "files.example.com",
+        "10.0.0.1-10.0.0.9",
+        "2001:db8::1",
+        "!192.168.1.1",
+    ]
+    assert [(error.index, error.entry) for error in report.errors] == [
+        (4, "not a host"),
+        (7, "010.0.0.1"),
+    ]
+    assert report.duplicates == 1
+
+
+def test_validateNetworksPortsMACs() -> None:
+    networks = validateContent(
+        "network", "10.1.2.3/8, 2001:db8::1/32, lan_net, 1.2.3.4/33"
+    )
+    assert networks.entries == ["10.0.0.0/8", "2001:db8::/32", "lan_net"]
+    assert [error.index for error in networks.errors] == [3]
+
+    ports = validateContent("port", ["080", "1:1024", "70000", "5:2", "http_ports"])
+    assert ports.entries == ["80", "1:1024", "http_ports"]
+    assert [error.index for error in ports.errors] == [2, 3]
+
+    macs = validateContent("mac", "AA-BB-CC-DD-EE-FF\naabbccddeeff\n00:11:22\nzz:11")
+    assert macs.entries == ["aa:bb:cc:dd:ee:ff", "00:11:22"]
+    assert macs.duplicates == 1
+    assert [error.index for error in macs.errors] == [3]
+
+
+def test_modelOptIn() -> None:
+    data: dict = {"name": "macs", "content": "AA:BB:CC:DD:EE:FF\naa-bb-cc-dd-ee-ff"}
+
+    # Off by default
+    assert AliasMAC(**data).content == data["content"]
+
+    validated = AliasMAC.model_validate(data, context={VALIDATE_CONTENT: True})
+    assert validated.content == "aa:bb:cc:dd:ee:ff"
+
+    with pytest.raises(ValidationError, match="entry 1: 'nope!'"):
+        AliasHost.model_validate(
+            {"name": "hosts", "content": "10.0.0.1\nnope!"},
+            context={VALIDATE_CONTENT: True},
+        )
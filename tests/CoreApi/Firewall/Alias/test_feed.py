@@ -0,0 +1,130 @@
+from json import loads
+from io import StringIO
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasController, feed
+from NG_OPNSense.concurrency import AdaptiveLimiter
+
+FEED: str = """# blocklist
+10.0.0.0/25
+10.0.0.128/25 ; second half
+10.0.0.7
+192.168.1.1,spam
+192.168.1.1
+192.168.1.2\t90
+2001:db8::1
+not-an-address
+10.0.0.1/33
+"""
+
+
+class FakeController:
+    url: str = "https://fw/api/firewall/alias"
+    apiKey: str = "key"
+    apiSecret: str = "secret"
+    transport = None
+
+    def __init__(self, aliasType: str, content: list[str]) -> None:
+        self.limiter = AdaptiveLimiter()
+        self.alias: dict = {"name": "blocked", "type": [aliasType], "content": content}
+        self.sets: list[dict] = []
+        self.reconfigured: int = 0
+
+    def getAliasUUID(self, name: str) -> dict:
+        return {"uuid": "u1"} if name == "blocked" else {}
+
+    def getItem(self, uuid: str, lean: bool = False) -> dict:
+        return {"alias": self.alias}
+
+    def setItem(self, uuid: str, dataToSet: dict) -> dict:
+        self.sets.append(dataToSet)
+        return {"result": "saved"}
+
+    def reconfigure(self) -> dict:
+        self.reconfigured += 1
+        return {"status": "ok"}
+
+    def ingestFeed(self, name, source, **kwargs):
+        return AliasController.ingestFeed(self, name, source, **kwargs)
+
+
+def test_setItem_aggregates_and_keeps_other_entries() -> None:
+    controller = FakeController("network", ["10.0.0.0/24", "203.0.113.9", "lan_hosts"])
+    report = controller.ingestFeed("blocked", StringIO(FEED))
+
+    assert report.ok and report.changed
+    assert (report.lines, report.entries, report.invalid) == (10, 7, 2)
+    assert [error.index for error in report.errors] == [9, 10]
+    assert (report.unique, report.added, report.removed, report.kept) == (4, 3, 1, 1)
+    assert controller.sets[0]["alias"]["content"].split("\n") == [
+        "lan_hosts",
+        "10.0.0.0/24",
+        "192.168.1.1",
+        "192.168.1.2",
+        "2001:db8::1",
+    ]
+    assert controller.reconfigured == 1
+
+    # Up to date, nothing is sent
+    controller.alias["content"] = controller.sets[0]["alias"]["content"].split("\n")
+    report = controller.ingestFeed("blocked", FEED.splitlines())
+    assert not report.changed and report.requests == 0
+    assert len(controller.sets) == 1
+
+
+def test_host_alias_lists_ranges(tmp_path) -> None:
+    path = tmp_path / "feed.txt"
+    path.write_text("\n".join(f"10.1.0.{i}" for i in range(1, 11)))
+    controller = FakeController("host", ["example.com"])
+    report = controller.ingestFeed("blocked", path)
+
+    assert report.unique == 1
+    assert controller.sets[0]["alias"]["content"] == "example.com\n10.1.0.1-10.1.0.10"
+
+
+def test_table_diffs_against_the_live_table(monkeypatch) -> None:
+    sent: list[tuple[str, str]] = []
+    # 10.5.5.5 was pushed by an earlier run, it is live but not saved
+    live: list[str] = ["10.1.0.1", "10.1.0.2/31", "10.5.5.5", "10.9.9.9"]
+
+    class Response:
+        def __init__(self, body: dict) -> None:
+            self.body = body
+
+        def json(self) -> dict:
+            return self.body
+
+    def fakeAPI(url: str, data: str, **_) -> Response:
+        action: str = url.rsplit("/", 2)[1]
+        if action == "list":
+            page: dict = loads(data)
+            first: int = (page["current"] - 1) * page["rowCount"]
+            rows = [{"ip": ip} for ip in live[first : first + page["rowCount"]]]
+            return Response({"rows": rows, "total": len(live)})
+        sent.append((action, data))
+        return Response({"status": "done"})
+
+    monkeypatch.setattr(feed, "_openSenseAPI", fakeAPI)
+    monkeypatch.setattr(feed, "PAGE_SIZE", 3)
+    controller = FakeController("host", ["10.1.0.1-10.1.0.3", "10.9.9.9"])
+    report = controller.ingestFeed(
+        "blocked",
+        ["10.1.0.0/31", "10.1.0.2", "10.1.0.3", "10.1.0.4", "10.9.9.9"],
+        push="table",
+        batchSize=1,
+    )
+
+    # 10.1.0.0-10.1.0.4 is 10.1.0.0/30 and 10.1.0.4 in a pf table
+    assert report.ok and (report.added, report.removed) == (2, 3)
+    assert sorted(sent) == [
+        ("add", '{"address": "10.1.0.0/30"}'),
+        ("add", '{"address": "10.1.0.4"}'),
+        ("delete", '{"address": "10.1.0.1"}'),
+        ("delete", '{"address": "10.1.0.2/31"}'),
+        ("delete", '{"address": "10.5.5.5"}'),
+    ]
+    assert controller.sets == [] and controller.reconfigured == 0
+
+
+def test_unknown_alias_fails() -> None:
+    assert FakeController("network", []).ingestFeed("missing", []) is None
+    assert FakeController("port", []).ingestFeed("blocked", []) is None
@@ -0,0 +1,81 @@
+from zipfile import ZipFile
+
+import pytest
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasGeoIP, GeoIPDatabase
+
+locations: str = (
+    "geoname_id,locale_code,continent_code,continent_name,country_iso_code,"
+    "country_name,is_in_european_union\n"
+    "6252001,en,NA,North America,US,United States,0\n"
+    "6251999,en,NA,North America,CA,Canada,0\n"
+)
+blocksHeader: str = (
+    "network,geoname_id,registered_country_geoname_id,"
+    "represented_country_geoname_id,is_anonymous_proxy,is_satellite_provider\n"
+)
+ipv4Blocks: str = blocksHeader + (
+    "8.8.8.0/24,6252001,6252001,,0,0\n"
+    "24.48.0.0/15,6251999,6251999,,0,0\n"
+    "24.50.0.0/16,,6251999,,0,0\n"
+)
+ipv6Blocks: str = blocksHeader + "2001:4860::/32,6252001,6252001,,0,0\n"
+
+
+def test_compileMaxMind(tmp_path) -> None:
+    source = tmp_path / "GeoLite2-Country-CSV.zip"
+    with ZipFile(source, "w") as archive:
+        archive.writestr("GeoLite2/GeoLite2-Country-Locations-en.csv", locations)
+        archive.writestr("GeoLite2/GeoLite2-Country-Blocks-IPv4.csv", ipv4Blocks)
+        archive.writestr("GeoLite2/GeoLite2-Country-Blocks-IPv6.csv", ipv6Blocks)
+
+    with GeoIPDatabase.compile(str(source), str(tmp_path / "geoip.db")) as database:
+        assert database.lookup("8.8.8.8") == "US"
+        assert database.lookup("24.50.1.1") == "CA"
+        assert database.lookup("2001:4860::8888") == "US"
+        assert database.lookup("1.1.1.1") is None
+
+        preview = database.preview(
+            AliasGeoIP(name="NorthAmerica", proto="IPv4", content="US\nCA\nMX")
+        )
+        assert preview["US"].ipv4Prefixes == 1
+        assert preview["US"].ipv4Addresses == 256
+        assert preview["US"].ipv6Prefixes == 0
+        assert preview["CA"].name == "Canada"
+        assert preview["CA"].ipv4Ranges == 2
+        assert preview["CA"].ipv4Addresses == 3 * 65536
+        assert preview["MX"].prefixes == 0
+
+        assert database.preview(["US"])["US"].ipv6Addresses == 2**96
+
+
+def test_compileRanges(tmp_path) -> None:
+    source = tmp_path / "ranges.csv"
+    source.write_text(
+        "start,end,country\n" "10.0.0.0,10.0.0.255,DE\n" "10.0.1.0,10.0.1.4,FR\n"
+    )
+
+    with GeoIPDatabase.compile(str(source), str(tmp_path / "geoip.db")) as database:
+        assert database.lookup("10.0.0.200") == "DE"
+        assert database.lookup("10.0.1.5") is None
+        # 10.0.1.0/30 + 10.0.1.4/32
+        assert database.countries()["FR"].ipv4Prefixes == 2
+
+
+def test_invalidCountryCodes(tmp_path) -> None:
+    target = str(tmp_path / "geoip.db")
+    for code in ("EU1", "X", "É"):
+        with pytest.raises(ValueError):
+            GeoIPDatabase.compileRanges(
+                [(4, 0, 255, "DE"), (4, 256, 511, code)], target
+            )
+
+    # CSV rows with other codes are skipped like malformed lines
+    source = tmp_path / "ranges.csv"
+    source.write_text(
+        "10.0.0.0,10.0.0.255,EUR\n" "10.0.1.0,10.0.1.255,FR\n" "10.0.2.0/24,DE\n"
+    )
+    with GeoIPDatabase.compile(str(source), target) as database:
+        assert database.lookup("10.0.0.1") is None
+        assert database.lookup("10.0.1.1") == "FR"
+        assert database.lookup("10.0.2.1") == "DE"
@@ -0,0 +1,52 @@
+from json import dumps
+
+import NG_OPNSense.helpers as helpers
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasController
+
+aliasTable: dict = {
+    "alias": {
+        "aliases": {
+            "alias": {
+                "9f3c-uuid": {
+                    "enabled": "1",
+                    "name": "NorthAmerica",
+                    "type": {
+                        "host": {"value": "Host(s)", "selected": 0},
+                        "geoip": {"value": "GeoIP", "selected": 1},
+                    },
+                    "proto": {
+                        "IPv4": {"value": "IPv4", "selected": 1},
+                        "IPv6": {"value": "IPv6", "selected": 1},
+                    },
+                    "content": {
+                        "US": {"value": "United States", "selected": 1},
+                        "CA": {"value": "Canada", "selected": 1},
+                        "DE": {"value": "Germany", "selected": 0},
+                    },
+                    "categories": {},
+                    "description": "North America",
+                }
+            }
+        }
+    }
+}
+
+
+class FakeResponse:
+    def __init__(self, payload: dict) -> None:
+        self.content: bytes = dumps(payload).encode()
+
+
+def test_getLean(monkeypatch) -> None:
+    monkeypatch.setattr(helpers, "_openSenseAPI", lambda **_: FakeResponse(aliasTable))
+    alias = AliasController(url="https://opnsense.local", apiKey="", apiSecret="")
+
+    data: dict | None = alias.get(lean=True)
+
+    assert data is not None
+    item: dict = data["alias"]["aliases"]["alias"]["9f3c-uuid"]
+    assert item["type"] == ["geoip"]
+    assert item["proto"] == ["IPv4", "IPv6"]
+    assert item["content"] == ["US", "CA"]
+    assert item["categories"] == {}
+    assert item["description"] == "North America"
@@ -0,0 +1,77 @@
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasController, planRefresh
+from NG_OPNSense.concurrency import AdaptiveLimiter
+
+
+def snapshot(daily: int, hourly: int) -> dict:
+    aliases: dict = {
+        f"d{i}": {"name": f"daily{i}", "type": ["urltable"], "updatefreq": "1"}
+        for i in range(daily)
+    }
+    aliases.update(
+        {
+            f"h{i}": {
+                "name": f"hourly{i}",
+                "type": ["urltable"],
+                "updatefreq": "0.041667",
+            }
+            for i in range(hourly)
+        }
+    )
+    aliases["manual"] = {"name": "manual", "type": ["urltable"], "updatefreq": ""}
+    aliases["hosts"] = {"name": "hosts", "type": ["host"], "content": ["10.0.0.1"]}
+    return {"alias": {"aliases": {"alias": aliases}}}
+
+
+class FakeController:
+    def __init__(self) -> None:
+        self.limiter = AdaptiveLimiter()
+        self.sets: dict[str, dict] = {}
+        self.reconfigured: int = 0
+
+    def transaction(self, maxWorkers=None, captureRollback: bool = True):
+        return AliasController.transaction(self, maxWorkers, captureRollback)
+
+    def setItem(self, uuid: str, dataToSet: dict) -> dict:
+        self.sets[uuid] = dataToSet
+        return {"result": "saved"}
+
+    def reconfigure(self) -> dict:
+        self.reconfigured += 1
+        return {"status": "ok"}
+
+
+def test_spreadsTheDownloads() -> None:
+    plan = planRefresh(snapshot(daily=120, hourly=30))
+
+    assert len(plan.refreshes) == 150
+    assert plan.unscheduled == ["manual"]
+    offsets: dict[int, list[int]] = {}
+    for refresh in plan.refreshes:
+        assert refresh.offset % 60 == 0 and refresh.offset < refresh.period
+        offsets.setdefault(refresh.period, []).append(refresh.offset)
+    # every alias of a period downloads in a minute of its own
+    assert len(set(offsets[86400])) == 120
+    assert len(set(offsets[3600])) == 30
+
+    report: dict = plan.report()
+    assert report["before"]["peak"] == 150
+    assert report["after"]["peak"] == 1
+    assert report["before"]["busyMinutes"] < report["after"]["busyMinutes"]
+
+
+def test_appliesAndSettlesInOneTransactionEach() -> None:
+    plan = planRefresh(snapshot(daily=4, hourly=0))
+    controller = FakeController()
+    staggered = {r.uuid: r for r in plan.refreshes if r.offset}
+
+    assert plan.apply(controller).ok
+    assert controller.reconfigured == 1
+    assert set(controller.sets) == set(staggered)
+    uuid, refresh = next(iter(staggered.items()))
+    staggeredDays: float = float(controller.sets[uuid]["alias"]["updatefreq"])
+    assert round(staggeredDays * 86400) == 86400 + refresh.offset
+
+    assert plan.settle(controller).ok
+    assert controller.reconfigured == 2
+    assert all(body["alias"]["updatefreq"] == "1" for body in controller.sets.values())
+    assert plan.settleAfter == max(r.offset for r in plan.refreshes) + 86400 + 60
@@ -0,0 +1,52 @@
+from time import sleep
+from threading import Thread
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import SharedAliasCache
+
+
+class FakeController:
+    url: str = "https://opnsense.local/api/firewall/alias"
+    apiKey: str = "key"
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+
+    def get(self, lean: bool = False) -> dict:
+        self.calls += 1
+        sleep(0.2)
+        return {"alias": {"aliases": {"alias": {"uuid": {"name": f"v{self.calls}"}}}}}
+
+
+def test_sharedBetweenWorkers(tmp_path) -> None:
+    controller = FakeController()
+    path = str(tmp_path / "aliases.snapshot")
+    # Two workers, each with their own cache instance on the same file
+    first = SharedAliasCache(controller, ttl=0.5, path=path)
+    second = SharedAliasCache(controller, ttl=0.5, path=path)
+
+    assert first.get()["alias"]["aliases"]["alias"]["uuid"]["name"] == "v1"
+    assert second.get()["alias"]["aliases"]["alias"]["uuid"]["name"] == "v1"
+    assert controller.calls == 1
+    assert (first.refreshes, second.refreshes) == (1, 0)
+
+    # Once stale, one worker refreshes while the other keeps serving the old snapshot
+    sleep(0.5)
+    results: dict = {}
+    threads = [
+        Thread(target=lambda c=cache, i=i: results.__setitem__(i, c.get()))
+        for i, cache in enumerate((first, second))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert controller.calls == 2
+    names = sorted(
+        r["alias"]["aliases"]["alias"]["uuid"]["name"] for r in results.values()
+    )
+    assert names == ["v1", "v2"]
+    assert second.get()["alias"]["aliases"]["alias"]["uuid"]["name"] == "v2"
+
+    first.close()
+    second.close()
@@ -0,0 +1,125 @@
+from io import StringIO
+from json import loads
+from importlib import import_module
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasController
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias.model import AliasPort
+from NG_OPNSense.concurrency import AdaptiveLimiter
+
+
+class FakeController:
+    def __init__(self) -> None:
+        self.added: list[dict] = []
+        self.reconfigured: int = 0
+        self.limiter = AdaptiveLimiter()
+
+    def _searchRows(self, rowCount: int = 500):
+        for i in range(5):
+            yield {
+                "uuid": f"u{i}",
+                "name": f"hosts{i}",
+                "type": "host",
+                "enabled": "1",
+                "content": ["10.0.0.1", f"10.0.0.{i + 2}"],
+                "description": None,
+            }
+
+    def addItem(self, alias: dict) -> dict:
+        if alias["name"] == "taken":
+            return {"result": "failed", "validations": {"alias.name": "exists"}}
+        self.added.append(alias)
+        return {"result": "saved", "uuid": alias["name"]}
+
+    def reconfigure(self) -> dict:
+        self.reconfigured += 1
+        return {"status": "ok"}
+
+
+def test_exportImportRoundTrip() -> None:
+    controller = FakeController()
+
+    for format in ("ndjson", "csv"):
+        stream = StringIO()
+        assert (
+            AliasController.export(controller, stream, format=format, pageSize=2) == 5
+        )
+
+        controller.added.clear()
+        stream.seek(0)
+        report = AliasController.import_(controller, stream, format=format, batchSize=2)
+
+        assert report.ok
+        assert report.imported == 5
+        assert controller.added[4]["content"] == "10.0.0.1\n10.0.0.6"
+        assert controller.added[4]["type"] == "host"
+        assert "description" not in controller.added[4]
+
+    assert controller.reconfigured == 2
+
+
+def test_importReportsLines() -> None:
+    controller = FakeController()
+    lines: str = "\n".join(
+        [
+            '{"name": "ok", "type": "port", "content": "443"}',
+            "not json",
+            "",
+            '{"name": "bad name!", "type": "port", "content": "443"}',
+            '{"name": "taken", "type": "port", "content": "80"}',
+            '{"name": "what", "type": "unknown"}',
+        ]
+    )
+
+    report = AliasController.import_(controller, StringIO(lines), batchSize=2)
+
+    assert report.imported == 1
+    assert [(error.line, error.name) for error in report.errors] == [
+        (2, None),
+        (4, "bad name!"),
+        (5, "taken"),
+        (6, "what"),
+    ]
+    assert "alias.name: exists" in report.errors[2].error
+    assert loads(lines.split("\n")[0])["name"] == controller.added[0]["name"]
+
+
+def test_bulkImportStreamsAndMapsRows(monkeypatch) -> None:
+    sent: list[dict] = []
+
+    class FakeResponse:
+        def json(self) -> dict:
+            return {
+                "status": "failed",
+                "new": 1,
+                "existing": 1,
+                # keyed by alias name and field, as the firewall reports them
+                "validations": {"dns.content": "Entry 10.0.0.531 is invalid"},
+            }
+
+    def fakeAPI(url: str, data, Method: str, **_) -> FakeResponse:
+        assert url.endswith("/import") and Method == "POST"
+        sent.append(loads(b"".join(data)))
+        return FakeResponse()
+
+    module = import_module("NG_OPNSense.Api.CoreAPI.Firewall.Alias")
+    monkeypatch.setattr(module, "_openSenseAPI", fakeAPI)
+    controller = AliasController("https://fw/api/firewall/alias", "key", "secret")
+
+    aliases = (
+        alias
+        for alias in [
+            AliasPort(name="web", content="443"),
+            {"name": "bad name!", "type": "port", "content": "80"},
+            {"name": "dns", "type": "host", "content": "10.0.0.53"},
+        ]
+    )
+    result = controller.bulkImport(aliases)
+
+    assert list(sent[0]["data"]) == ["row1", "row3"]
+    assert sent[0]["data"]["row1"]["type"] == "port"
+    assert [(error.line, error.name) for error in result.errors] == [
+        (2, "bad name!"),
+        (3, "dns"),
+    ]
+    assert result.errors[1].error == "content: Entry 10.0.0.531 is invalid"
+    assert not result.ok and result.reconfigured is None
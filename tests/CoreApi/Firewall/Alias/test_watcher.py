@@ -0,0 +1,58 @@
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasEventType, AliasWatcher
+
+
+class FakeController:
+    def __init__(self) -> None:
+        self.rows: list[dict] = [
+            {"uuid": "a", "name": "hosts", "content": "10.0.0.1"},
+            {"uuid": "b", "name": "ports", "content": "80"},
+        ]
+        self.sizes: dict[str, int] = {"hosts": 1}
+        self.itemCalls: list[str] = []
+
+    def getTableSize(self) -> dict | None:
+        return self.sizes
+
+    def _searchRows(self):
+        yield from self.rows
+
+    def getItem(self, uuid: str) -> dict:
+        self.itemCalls.append(uuid)
+        return {"alias": {"uuid": uuid}}
+
+
+def test_pollDetectsChanges() -> None:
+    controller = FakeController()
+    watcher = AliasWatcher(controller, interval=1, maxInterval=8)
+
+    assert watcher.poll() == []
+    assert watcher.poll() == []
+    assert watcher.currentInterval == 4
+
+    controller.rows[0] = {"uuid": "a", "name": "hosts", "content": "10.0.0.2"}
+    controller.rows[1:] = [{"uuid": "c", "name": "nets", "content": "10.0.0.0/8"}]
+    events = {event.uuid: event for event in watcher.poll()}
+
+    assert events["a"].type == AliasEventType.updated
+    assert events["b"].type == AliasEventType.deleted
+    assert events["b"].name == "ports"
+    assert events["c"].type == AliasEventType.added
+    assert sorted(controller.itemCalls) == ["a", "c"]
+    assert watcher.currentInterval == 1
+
+    # A table refresh without a config change is an update too
+    controller.sizes["hosts"] = 2
+    assert [event.uuid for event in watcher.poll()] == ["a"]
+
+
+def test_failedTableSizeKeepsFingerprints() -> None:
+    controller = FakeController()
+    watcher = AliasWatcher(controller, interval=1, maxInterval=8)
+    watcher.poll()
+
+    sizes: dict[str, int] = controller.sizes
+    controller.sizes = None
+    assert watcher.poll() == []
+    controller.sizes = sizes
+    assert watcher.poll() == []
+    assert controller.itemCalls == []
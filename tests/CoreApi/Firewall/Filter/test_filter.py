@@ -0,0 +1,160 @@
+from json import dumps, loads
+from threading import Lock
+
+import pytest
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Filter import (
+    FilterController,
+    FilterRule,
+    RuleOperation,
+)
+
+
+class FakeController:
+    """Records the calls a batch makes instead of sending them"""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.calls: list[tuple] = []
+
+    def _record(self, *call) -> None:
+        with self.lock:
+            self.calls.append(call)
+
+    def batch(self, maxWorkers: int = 4, confirm: bool = True):
+        return FilterController.batch(self, maxWorkers, confirm)
+
+    def savepoint(self) -> dict:
+        self._record("savepoint")
+        return {"status": "ok", "retention": "60", "revision": "1700000000.12"}
+
+    def addRule(self, rule: dict) -> dict:
+        self._record("addRule", rule)
+        return {"result": "saved", "uuid": f"new-{rule['description']}"}
+
+    def setRule(self, uuid: str, dataToSet: dict) -> dict:
+        self._record("setRule", uuid, dataToSet)
+        if uuid == "broken":
+            return {"result": "failed", "validations": {"rule.sequence": "bad"}}
+        return {"result": "saved"}
+
+    def toggleRule(self, uuid: str, enabled: bool) -> dict:
+        self._record("toggleRule", uuid, enabled)
+        return {"result": "Enabled" if enabled else "Disabled", "changed": True}
+
+    def delRule(self, uuid: str) -> dict:
+        self._record("delRule", uuid)
+        return {"result": "deleted"}
+
+    def apply(self, rollbackRevision: str | None = None) -> dict:
+        self._record("apply", rollbackRevision)
+        return {"status": "OK\n\n"}
+
+    def cancelRollback(self, revision: str) -> dict:
+        self._record("cancelRollback", revision)
+        return {"status": "ok"}
+
+    def revert(self, revision: str) -> dict:
+        self._record("revert", revision)
+        return {"status": "ok"}
+
+
+def test_batchAppliesOnce() -> None:
+    controller = FakeController()
+
+    with controller.batch(maxWorkers=8) as batch:
+        for index in range(500):
+            batch.addRule({"action": "block", "description": str(index)})
+        batch.setRule("a", {"rule": {"log": "1"}})
+        batch.toggleRule("a", False)
+        batch.toggleRule("b", True)
+        batch.setRule("c", {"rule": {"log": "1"}})
+        batch.delRule("c")
+
+    result = batch.result
+    names: list[str] = [call[0] for call in controller.calls]
+    assert result.ok and result.confirmed
+    assert result.queued == 505 and result.sent == 503
+    assert len(result.created) == 500
+    assert names[0] == "savepoint"
+    assert names[-2:] == ["apply", "cancelRollback"]
+    assert names.count("apply") == 1
+    assert controller.calls[-2] == ("apply", "1700000000.12")
+    assert ("setRule", "a", {"rule": {"log": "1", "enabled": "0"}}) in controller.calls
+    assert ("toggleRule", "b", True) in controller.calls
+    assert ("delRule", "c") in controller.calls
+    assert {outcome.operation for outcome in result.results} == set(RuleOperation)
+
+
+def test_batchRevertsOnFailure() -> None:
+    controller = FakeController()
+
+    with controller.batch() as batch:
+        batch.setRule("broken", {"rule": {"sequence": "0"}})
+        batch.toggleRule("b", False)
+
+    names: list[str] = [call[0] for call in controller.calls]
+    assert batch.result.reverted and not batch.result.ok
+    assert batch.result.failures[0].uuid == "broken"
+    assert names[-1] == "revert" and "apply" not in names
+
+
+def test_batchUnconfirmedAndEmpty() -> None:
+    controller = FakeController()
+
+    with FilterController.batch(controller, confirm=False) as batch:
+        batch.toggleRule("b", False)
+    assert batch.result.applied and not batch.result.confirmed
+    assert "cancelRollback" not in [call[0] for call in controller.calls]
+
+    controller.calls.clear()
+    with controller.batch() as empty:
+        pass
+    assert empty.result.ok and controller.calls == []
+
+    with pytest.raises(RuntimeError):
+        empty.commit()
+
+
+def test_ruleModel() -> None:
+    rule = FilterRule(action="block", protocol="tcp", destination_port="22")
+    assert rule.body()["rule"]["action"] == "block"
+    assert rule.body()["rule"]["protocol"] == "TCP"
+    assert "gateway" not in rule.body()["rule"]
+
+    with pytest.raises(ValueError):
+        FilterRule(protocol="ICMP", destination_port="22")
+    with pytest.raises(ValueError):
+        FilterRule(action="allow")
+
+
+class FakeResponse:
+    def __init__(self, payload: dict) -> None:
+        self.content: bytes = dumps(payload).encode()
+
+    def json(self) -> dict:
+        return loads(self.content)
+
+
+def test_controllerRequests(monkeypatch) -> None:
+    from importlib import import_module
+
+    module = import_module("NG_OPNSense.Api.CoreAPI.Firewall.Filter")
+    sent: list[dict] = []
+
+    def fake(**kwargs) -> FakeResponse:
+        sent.append(kwargs)
+        return FakeResponse({"result": "saved"})
+
+    monkeypatch.setattr(module, "_openSenseAPI", fake)
+    controller = FilterController(url="https://opnsense.local", apiKey="", apiSecret="")
+
+    assert controller.addRule({"action": "reject", "interface": "lan"}) is not None
+    controller.toggleRule("abc", False)
+    controller.apply("1700000000.12")
+
+    assert sent[0]["url"] == "https://opnsense.local/filter/addRule"
+    assert loads(sent[0]["data"])["rule"]["action"] == "reject"
+    assert sent[1]["url"].endswith("/filter/toggleRule/abc/0")
+    assert sent[2]["url"].endswith("/filter/apply/1700000000.12")
+    assert controller.addRule({"protocol": "ICMP", "source_port": "1"}) is None
@@ -0,0 +1,48 @@
+import ssl
+import subprocess
+from shutil import which
+from hashlib import sha256
+from threading import Thread
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def httpsServer(tmp_path_factory):
+    """Starts HTTPS servers with a self-signed certificate for localhost
+
+    `httpsServer(Handler)` serves `Handler` and returns its URL, the SHA-256
+    fingerprint of the certificate and the path of the certificate. `host` is
+    the name used in the URL, only `localhost` matches the certificate.
+    """
+    if which("openssl") is None:
+        pytest.skip("needs openssl")
+    directory = tmp_path_factory.mktemp("tls")
+    certificate, key = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+        + ["-keyout", key, "-out", certificate, "-subj", "/CN=localhost"]
+        + ["-addext", "subjectAltName=DNS:localhost"],
+        check=True,
+        capture_output=True,
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate, key)
+
+    with open(certificate) as file:
+        der: bytes = ssl.PEM_cert_to_DER_cert(file.read())
+    fingerprint: str = ":".join(f"{byte:02X}" for byte in sha256(der).digest())
+
+    servers: list[ThreadingHTTPServer] = []
+
+    def start(handler, host: str = "localhost") -> tuple[str, str, str]:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"https://{host}:{server.server_address[1]}", fingerprint, certificate
+
+    yield start
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,23 @@
+from NG_OPNSense.cache import StaticDataCache, firmwareVersion
+
+
+def test_staticDataCache(tmp_path) -> None:
+    url: str = "https://opnsense.local"
+
+    cache = StaticDataCache(url, "24.7.5", directory=str(tmp_path))
+    assert cache.get("listCountries") is None
+    cache.set("listCountries", {"US": "United States"})
+
+    # A warm start loads the entries from disk
+    warm = StaticDataCache(url, "24.7.5", directory=str(tmp_path))
+    assert warm.get("listCountries") == {"US": "United States"}
+
+    # A firmware upgrade invalidates everything
+    upgraded = StaticDataCache(url, "24.7.6", directory=str(tmp_path))
+    assert "listCountries" not in upgraded
+
+
+def test_firmwareVersion() -> None:
+    assert firmwareVersion({"product": {"product_version": "24.7.5"}}) == "24.7.5"
+    assert firmwareVersion({"metadata": {"system": {"version": "25.1"}}}) == "25.1"
+    assert firmwareVersion({"status": "ok"}) is None
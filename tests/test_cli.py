@@ -0,0 +1,72 @@
+from io import StringIO
+from json import dumps, loads
+from threading import Event
+
+from NG_OPNSense.cli import Client, _configurePool, _operation, _parser, main, runBatch
+
+KEY: str = "k" * 80
+
+
+class Output(StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.fastWritten: Event = Event()
+
+    def write(self, text: str) -> int:
+        written: int = super().write(text)
+        if '"fast"' in text:
+            self.fastWritten.set()
+        return written
+
+
+class FakeClient(Client):
+    def __init__(self, out: Output) -> None:
+        super().__init__("https://fw.local", KEY, KEY)
+        self.out: Output = out
+
+    def call(self, op: str, args: dict | None = None):
+        if op == "slow":
+            self.out.fastWritten.wait(5)
+            return "slow"
+        if op == "fast":
+            return "fast"
+        return super().call(op, args)
+
+
+def test_batchStreamsResultsAsTheyComplete() -> None:
+    out = Output()
+    client = FakeClient(out)
+    lines: list[str] = [
+        '{"id": 1, "op": "slow"}',
+        "not json",
+        '{"id": 2, "op": "fast"}',
+        '{"id": 3, "op": "alias.nope"}',
+    ]
+
+    failed: int = runBatch(client, lines, out, parallel=2)
+
+    results: list[dict] = [loads(line) for line in out.getvalue().splitlines()]
+    assert failed == 2
+    # the fast operation finished while the slow one was waiting for it
+    assert [result["id"] for result in results if result["ok"]] == [2, 1]
+    assert results[0]["line"] == 2
+    assert "Unknown operation" in next(r for r in results if r["id"] == 3)["error"]
+
+
+def test_mainRejectsMissingSettings(monkeypatch, capsys) -> None:
+    monkeypatch.delenv("OPNSENSE_URL", raising=False)
+    assert main(["status"]) == 2
+    assert "invalid connection settings" in capsys.readouterr().err
+
+
+def test_aliasAddTakesTheBareOrWrappedAlias() -> None:
+    alias: dict = {"name": "web", "type": "port", "content": "443"}
+    for body in [dumps(alias), dumps({"alias": alias})]:
+        args = _parser().parse_args(["alias", "add", body])
+        assert _operation(args) == ("alias.addItem", {"alias": alias})
+
+
+def test_batchSizesThePoolOfTheClientTransport() -> None:
+    client = Client("https://fw.local", KEY, KEY, transport="urllib3")
+    _configurePool(client, 16)
+    assert client.transport.pool.connection_pool_kw["maxsize"] == 16
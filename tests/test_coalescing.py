@@ -0,0 +1,45 @@
+from NG_OPNSense.coalescing import CoalescingQueue, Mutation, mergeInto
+
+
+def test_mergeInto() -> None:
+    target: dict = {"alias": {"name": "a", "content": "x"}, "keep": 1}
+    mergeInto(target, {"alias": {"content": "y"}, "other": 2})
+    assert target == {"alias": {"name": "a", "content": "y"}, "keep": 1, "other": 2}
+
+
+def test_plan_coalesces_per_uuid() -> None:
+    queue = CoalescingQueue("rule")
+    queue.add({"description": "new"})
+    queue.set("u1", {"rule": {"description": "one"}})
+    queue.toggle("u1", False)
+    queue.set("u1", {"rule": {"log": "1"}})
+    queue.toggle("u2", False)
+    queue.toggle("u2", True)
+    queue.set("u3", {"rule": {"description": "gone"}})
+    queue.delete("u3")
+    queue.toggle("u3", True)
+    queue.toggle("u4", False)
+    queue.set("u4", {"rule": {"enabled": "1"}})
+
+    assert queue.queued == 11
+    assert queue.plan() == [
+        (Mutation.add, None, {"description": "new"}),
+        (
+            Mutation.set,
+            "u1",
+            {"rule": {"description": "one", "log": "1", "enabled": "0"}},
+        ),
+        (Mutation.set, "u4", {"rule": {"enabled": "1"}}),
+        (Mutation.toggle, "u2", True),
+        (Mutation.delete, "u3", None),
+    ]
+    # Planning does not consume the queue
+    assert len(queue.plan()) == 5
+    assert [[entry[0] for entry in step] for step in queue.phases()] == [
+        [Mutation.add],
+        [Mutation.set, Mutation.set, Mutation.toggle],
+        [Mutation.delete],
+    ]
+
+    queue.clear()
+    assert queue.queued == 0 and queue.plan() == []
@@ -0,0 +1,83 @@
+from threading import Lock
+from time import sleep
+
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasController
+from NG_OPNSense.concurrency import AdaptiveExecutor, AdaptiveLimiter
+from NG_OPNSense.exceptions import OPNSenseHTTPError, OPNSenseResponseError
+
+
+def test_growsWhileFlatAndBacksOff() -> None:
+    limiter = AdaptiveLimiter(initial=2, maximum=6)
+
+    for _ in range(40):
+        for _ in range(limiter.limit):
+            limiter.acquire()
+        for _ in range(limiter.limit):
+            limiter.release(0.01)
+    assert limiter.limit == 6
+
+    # an error halves the limit once per round trip, not once per request
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(3):
+        limiter.release(0.01, failed=True)
+    assert limiter.limit == 3
+    assert limiter.stats()["failures"] == 3
+
+    # an inflated latency counts as congestion
+    sleep(0.1)
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(0.2)
+    assert limiter.limit == 1
+
+
+def test_onlyOverloadIsCongestion() -> None:
+    error = OPNSenseHTTPError("https://fw/api", "POST", 503)
+    limiter = AdaptiveLimiter(initial=8)
+    assert limiter.call(lambda: "saved") == "saved"
+
+    # controllers report failures by returning None
+    def failing(error):
+        from NG_OPNSense.exceptions import _report
+
+        _report("Failed", error)
+
+    limiter.call(failing, OPNSenseResponseError("https://fw/api", "POST", 200))
+    assert limiter.limit == 8
+    sleep(0.01)
+    limiter.call(failing, error)
+    assert limiter.limit == 4
+
+
+def test_findsTheCapacityOfTheFirewall() -> None:
+    """A backend that slows down with more than 5 requests in flight"""
+    lock = Lock()
+    inFlight: list[int] = [0]
+    peak: list[int] = [0]
+
+    def request(_) -> dict:
+        with lock:
+            inFlight[0] += 1
+            peak[0] = max(peak[0], inFlight[0])
+            load: int = inFlight[0]
+        sleep(0.002 if load <= 5 else 0.002 * load)
+        with lock:
+            inFlight[0] -= 1
+        return {"result": "saved"}
+
+    limiter = AdaptiveLimiter(maximum=16)
+    with AdaptiveExecutor(limiter) as pool:
+        assert len(list(pool.map(request, range(1500)))) == 1500
+
+    assert limiter.stats()["increases"] > 0
+    assert limiter.stats()["decreases"] > 0
+    assert limiter.limit <= 8
+    assert peak[0] <= 16
+
+
+def test_controllerSharesItsLimiter() -> None:
+    alias = AliasController("https://fw/api/firewall", "key", "secret")
+    transaction = alias.transaction()
+    assert transaction.maxWorkers is alias.limiter
+    assert alias.transaction(maxWorkers=2).maxWorkers == 2
@@ -0,0 +1,103 @@
+from os import stat
+from time import sleep
+from threading import Thread
+
+import pytest
+
+from NG_OPNSense.daemon import DaemonClient, OPNSenseDaemon
+from NG_OPNSense.exceptions import lastError
+
+KEY: str = "k" * 80
+
+
+class FakeAlias:
+    def __init__(self) -> None:
+        self.calls: int = 0
+
+    def get(self, lean: bool = False) -> dict:
+        self.calls += 1
+        return {"lean": lean, "calls": self.calls}
+
+    def getItem(self, uuid: str, lean: bool = False) -> dict | None:
+        return None if uuid == "missing" else {"uuid": uuid}
+
+    def delItem(self, uuid: str) -> dict:
+        return {"result": "deleted"}
+
+
+class FakeAPI:
+    def __init__(self) -> None:
+        self.alias = FakeAlias()
+        self.coreAPI = type("CoreAPI", (), {"firewall": self})()
+
+    def getSystemStatus(self) -> dict:
+        return {"status": "ok"}
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    built: list[FakeAPI] = []
+
+    def factory(url: str, apiKey: str, apiSecret: str) -> FakeAPI:
+        built.append(FakeAPI())
+        return built[-1]
+
+    daemon = OPNSenseDaemon(str(tmp_path / "d.sock"), readTTL=60, factory=factory)
+    thread = Thread(target=daemon.serve, daemon=True)
+    thread.start()
+    assert daemon.listening.wait(5)
+    daemon.built = built
+    yield daemon
+    daemon.shutdown()
+    thread.join(5)
+
+
+def test_clientsShareOneWarmFirewall(daemon) -> None:
+    assert stat(daemon.socketPath).st_mode & 0o777 == 0o600
+
+    first = DaemonClient("https://fw.local", KEY, KEY, socketPath=daemon.socketPath)
+    second = DaemonClient("https://fw.local", KEY, KEY, socketPath=daemon.socketPath)
+
+    assert first.getSystemStatus() == {"status": "ok"}
+    assert first.coreAPI.firewall.alias.get(lean=True)["calls"] == 1
+    # served from the read cache, also for another script
+    assert second.coreAPI.firewall.alias.get(lean=True)["calls"] == 1
+    assert second.coreAPI.firewall.alias.getItem("missing") is None
+
+    # writes clear the cached reads of the firewall
+    assert second.coreAPI.firewall.alias.delItem("u1") == {"result": "deleted"}
+    assert first.coreAPI.firewall.alias.get(lean=True)["calls"] == 2
+
+    assert len(daemon.built) == 1
+    assert first.daemonStats()["cacheHits"] == 1
+    first.close()
+    second.close()
+
+
+def test_unknownOperationsFail(daemon) -> None:
+    with DaemonClient(
+        "https://fw.local", KEY, KEY, socketPath=daemon.socketPath
+    ) as client:
+        assert client.call("alias.transaction") is None
+        assert "Unknown operation" in str(lastError())
+        with pytest.raises(AttributeError):
+            client.coreAPI.firewall.alias.watch
+
+
+def test_readCacheIsBounded(tmp_path) -> None:
+    daemon = OPNSenseDaemon(
+        str(tmp_path / "d.sock"),
+        readTTL=0.05,
+        factory=lambda *_: FakeAPI(),
+        maxReads=2,
+    )
+    key: tuple = ("https://fw.local", KEY, KEY)
+    for uuid in ("a", "b", "c"):
+        daemon.call(key, "alias.getItem", [uuid], {})
+    assert daemon.stats()["cachedReads"] == 2
+
+    # expired reads are dropped on the next lookup, without any write
+    sleep(0.06)
+    daemon.call(key, "alias.get", [], {"lean": True})
+    assert daemon.stats()["cachedReads"] == 1
+    daemon.clients.close()
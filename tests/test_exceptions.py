@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+from requests import ConnectTimeout
+
+import NG_OPNSense.exceptions as exceptions
+from NG_OPNSense.exceptions import (
+    OPNSenseConnectionError,
+    OPNSenseError,
+    OPNSenseHTTPError,
+    OPNSenseResponseError,
+    OPNSenseTimeout,
+    lastError,
+    setErrorMode,
+)
+from NG_OPNSense.transport import HTTPStatusError, Transport, TransportResponse
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasController
+
+KEY: str = "k" * 80
+
+
+class FailingTransport(Transport):
+    def __init__(self, error: Exception | None = None, status: int = 200) -> None:
+        self.error = error
+        self.status = status
+
+    def request(self, method, url, auth, data=None, headers=None):
+        if self.error is not None:
+            raise self.error
+        return TransportResponse(self.status, b"not json", url, "Not Found")
+
+
+@pytest.fixture
+def mode():
+    previous: str = exceptions.getErrorMode()
+    yield setErrorMode
+    setErrorMode(previous)
+
+
+def alias(transport: Transport) -> AliasController:
+    return AliasController(
+        "https://fw.local/api/firewall", KEY, KEY, transport=transport
+    )
+
+
+@pytest.mark.parametrize(
+    "transport, errorType, status, retryable",
+    [
+        (FailingTransport(ConnectTimeout()), OPNSenseTimeout, None, True),
+        (
+            FailingTransport(ConnectionRefusedError()),
+            OPNSenseConnectionError,
+            None,
+            True,
+        ),
+        (FailingTransport(status=404), OPNSenseHTTPError, 404, False),
+        (FailingTransport(HTTPStatusError(503, "u")), OPNSenseHTTPError, 503, True),
+        (FailingTransport(), OPNSenseResponseError, None, False),
+    ],
+)
+def test_typedErrors(transport, errorType, status, retryable, mode) -> None:
+    mode("raise")
+    with pytest.raises(errorType) as raised:
+        alias(transport).reconfigure()
+
+    error: OPNSenseError = raised.value
+    assert error.status == status and error.retryable is retryable
+    if errorType is not OPNSenseResponseError:
+        assert error.endpoint == "/api/firewall/alias/reconfigure"
+        assert error.method == "POST" and error.elapsed >= 0
+
+
+def test_logModeIsQuiet(mode, caplog, capsys) -> None:
+    mode("log")
+    controller = alias(FailingTransport(status=404))
+
+    with caplog.at_level(logging.WARNING, logger="NG_OPNSense"):
+        assert controller.getItem("abc") is None
+    assert isinstance(lastError(), OPNSenseHTTPError)
+    assert "404 GET /api/firewall/alias/getItem/abc" in caplog.text
+    assert "Traceback" not in caplog.text
+    assert capsys.readouterr().out == ""
+
+
+def test_printModeKeepsTheLegacyOutput(mode, capsys) -> None:
+    mode("print")
+    assert alias(FailingTransport(ConnectTimeout())).reconfigure() is None
+
+    out: str = capsys.readouterr().out
+    assert out.startswith("Failed to reconfigure aliases:\nTraceback")
+    assert out.count("Traceback") == 2  # the wrapped and the typed error, once
+
+
+def test_unknownMode() -> None:
+    with pytest.raises(ValueError):
+        setErrorMode("silent")
@@ -0,0 +1,127 @@
+from json import dumps
+from threading import Event
+from time import sleep
+
+import pytest
+
+from NG_OPNSense import OPNSenseAPI
+from NG_OPNSense.exceptions import OPNSenseConnectionError, setErrorMode
+from NG_OPNSense.ha import HATransport, carpRole, isWrite
+from NG_OPNSense.transport import Transport, TransportResponse
+
+KEY: str = "k" * 80
+NODES: list[str] = ["https://10.0.0.1", "https://10.0.0.2"]
+
+
+def vips(*statuses: str) -> dict:
+    return {"rows": [{"mode": "carp", "vhid": "1", "status": s} for s in statuses]}
+
+
+class ClusterTransport(Transport):
+    """Answers like a CARP pair, nodes can be slowed down, failed or promoted"""
+
+    def __init__(self) -> None:
+        self.roles: dict[str, str] = {NODES[0]: "MASTER", NODES[1]: "BACKUP"}
+        self.delays: dict[str, float] = {NODES[0]: 0.0, NODES[1]: 0.0}
+        self.down: set[str] = set()
+        self.hang: dict[str, Event] = {}
+        self.sent: list[tuple[str, str]] = []
+        self.timeouts: list[float | None] = []
+
+    def request(self, method, url, auth, data=None, headers=None, timeout=None):
+        self.timeouts.append(timeout)
+        node: str = next(node for node in NODES if url.startswith(node))
+        path: str = url[len(node) :]
+        if node in self.hang:
+            self.hang[node].wait(5)
+        if node in self.down:
+            raise ConnectionError(f"{node} is unreachable")
+        sleep(self.delays[node])
+        if path.endswith("get_vip_status"):
+            return TransportResponse(200, dumps(vips(self.roles[node])).encode(), url)
+        if not path.endswith("/system/status"):
+            self.sent.append((method, node))
+        return TransportResponse(200, dumps({"node": node}).encode(), url)
+
+
+def test_readsAndWritesAreClassified() -> None:
+    assert not isWrite("GET", "/api/firewall/alias/get")
+    assert not isWrite("POST", "/api/firewall/alias/searchItem")
+    assert not isWrite("POST", "/api/firewall/alias_util/list/blocklist")
+    assert isWrite("POST", "/api/firewall/alias/setItem/uuid")
+    assert isWrite("POST", "/api/firewall/filter/apply/1700000000")
+
+    assert carpRole(vips("MASTER", "MASTER")) == "master"
+    assert carpRole(vips("MASTER", "BACKUP")) == "mixed"
+    assert carpRole(vips("BACKUP")) == "backup"
+    assert carpRole({"rows": []}) is None
+
+
+def test_routesReadsByLatencyAndWritesToMaster() -> None:
+    cluster = ClusterTransport()
+    cluster.delays[NODES[0]] = 0.02
+    ha = HATransport(NODES, KEY, KEY, transport=cluster, probeInterval=0.2)
+    try:
+        assert ha.request("GET", NODES[0] + "/api/firewall/alias/get", ())
+        assert ha.request("POST", NODES[0] + "/api/firewall/alias/addItem", ())
+        # the backup answers faster, the master owns the configuration
+        assert cluster.sent == [("GET", NODES[1]), ("POST", NODES[0])]
+        # probes give up within an interval, calls after the default timeout
+        assert set(cluster.timeouts) == {0.2, 30.0}
+
+        # a failover is picked up within one probe interval
+        cluster.roles = {NODES[0]: "BACKUP", NODES[1]: "MASTER"}
+        cluster.down.add(NODES[0])
+        sleep(0.5)
+        states: dict = {node["url"]: node for node in ha.nodes()}
+        assert not states[NODES[0]]["healthy"]
+        assert states[NODES[1]]["role"] == "master"
+
+        cluster.sent.clear()
+        ha.request("POST", NODES[0] + "/api/firewall/alias/addItem", ())
+        assert cluster.sent == [("POST", NODES[1])]
+        assert len(ha.stats()["nodes"]) == 2
+    finally:
+        ha.close()
+
+
+def test_readsFailOverAndHungProbesTimeOut() -> None:
+    cluster = ClusterTransport()
+    ha = HATransport(NODES, KEY, KEY, transport=cluster, probeInterval=0.1, start=False)
+
+    # the node went away between two probes, a write may have been applied
+    cluster.down.add(NODES[0])
+    with pytest.raises(ConnectionError):
+        ha.request("POST", NODES[0] + "/api/firewall/alias/addItem", ())
+    assert not ha.nodes()[0]["healthy"]
+
+    # while a read is retried on the next node
+    ha._nodes[0].healthy = True
+    ha.request("GET", NODES[0] + "/api/firewall/alias/get", ())
+    assert cluster.sent == [("GET", NODES[1])]
+
+    cluster.down.clear()
+    cluster.hang[NODES[1]] = Event()
+    ha.probe()
+    states: dict = {node["url"]: node for node in ha.nodes()}
+    assert states[NODES[0]]["healthy"]
+    assert states[NODES[1]]["lastError"] == "probe timed out"
+    cluster.hang[NODES[1]].set()
+    ha.close()
+
+
+def test_clientAcceptsSeveralURLs() -> None:
+    cluster = ClusterTransport()
+    api = OPNSenseAPI(url=",".join(NODES), apiKey=KEY, apiSecret=KEY, transport=cluster)
+    try:
+        assert isinstance(api.transport, HATransport)
+        assert api.url == NODES[0]
+        assert api.getSystemStatus() is not None
+
+        setErrorMode("raise")
+        cluster.down.update(NODES)
+        with pytest.raises(OPNSenseConnectionError):
+            api.getSystemStatus()
+    finally:
+        setErrorMode("log")
+        api.close()
@@ -0,0 +1,97 @@
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from NG_OPNSense.profiling import PHASES, profile
+from NG_OPNSense.transport import Transport, TransportResponse, Urllib3Transport
+from NG_OPNSense.Api.CoreAPI.Firewall.Alias import AliasController
+
+KEY: str = "k" * 80
+ALIAS: dict = {"name": "web", "type": "port", "content": "443", "enabled": 1}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self._reply({"rows": [{"uuid": str(i)} for i in range(200)]})
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply({"result": "saved", "uuid": "new"})
+
+    def _reply(self, payload: dict) -> None:
+        body: bytes = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+@pytest.fixture(scope="module")
+def server(httpsServer):
+    # the client only accepts host names with a domain, or addresses
+    url, _, _ = httpsServer(Handler, "127.0.0.1")
+    return url
+
+
+def test_phasesOfCalls(server) -> None:
+    transport = Urllib3Transport()
+    alias = AliasController(f"{server}/api/firewall", KEY, KEY, transport=transport)
+
+    with profile(alias, memory=True) as run:
+        assert alias.addItem(ALIAS)["result"] == "saved"
+        alias.searchItem("web")
+        alias.searchItem("web")
+
+    report: dict = run.report()
+    added: dict = report["calls"][0]
+    assert added["name"] == "AliasController.addItem"
+    assert added["requests"] == 1 and added["peakBytes"] > 0
+    for part in ("validate", "encode", "connect", "tls", "server", "decode"):
+        assert added["phases"][part] > 0, part
+    # the second search reuses the connection
+    search: dict = report["summary"]["AliasController.searchItem"]
+    assert search["calls"] == 2
+    assert report["calls"][2]["phases"]["connect"] == 0
+
+    assert "AliasController.searchItem" in run.summary()
+    json.dumps(report)
+    # the methods are restored
+    assert "addItem" not in vars(alias)
+    transport.close()
+
+
+class FakeTransport(Transport):
+    def request(self, method, url, auth, data=None, headers=None):
+        return TransportResponse(200, b'{"status": "ok"}', url)
+
+
+def test_requestsOutsideCallsAndCProfile() -> None:
+    alias = AliasController("https://fw.local/api/firewall", KEY, KEY)
+    alias.transport = FakeTransport()
+
+    run = profile()
+
+    @run
+    def reconfigure() -> None:
+        alias.reconfigure()
+
+    reconfigure()
+    reconfigure()
+    assert run.report()["summary"]["POST /api/firewall/alias/reconfigure"]["calls"] == 2
+
+    with profile(cprofile=True) as run:
+        alias.reconfigure()
+    assert [call.name for call in run.calls] == ["POST /api/firewall/alias/reconfigure"]
+    assert set(run.calls[0].breakdown()) == set(PHASES)
+    assert "reconfigure" in run.cprofileStats(limit=10)
+
+    with pytest.raises(RuntimeError):
+        with profile():
+            with profile():
+                pass
@@ -0,0 +1,118 @@
+from threading import Barrier, Thread
+from time import sleep
+
+import pytest
+
+from NG_OPNSense.registry import ClientRegistry
+
+
+class FakeClient:
+    def __init__(self, url: str, apiKey: str, apiSecret: str) -> None:
+        self.url: str = url
+        self.apiSecret: str = apiSecret
+        self.closed: bool = False
+        self.transport = self
+
+    def openConnections(self) -> int:
+        return 0 if self.closed else 2
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_lruAndIdleEviction() -> None:
+    built: list[FakeClient] = []
+
+    def factory(*args: str) -> FakeClient:
+        built.append(FakeClient(*args))
+        return built[-1]
+
+    clients = ClientRegistry(factory, maxClients=2, idleTimeout=0.2)
+    a = clients.get("https://a", "ka", "s")
+    assert clients.get("https://a", "ka", "s") is a
+    b = clients.get("https://b", "kb", "s")
+    clients.get("https://a", "ka", "s")
+
+    # b is the least recently used
+    c = clients.get("https://c", "kc", "s")
+    assert b.closed and not a.closed
+    assert ("https://b", "kb") not in clients
+    assert clients.stats()["openConnections"] == 4
+
+    # a rotated secret replaces the client
+    rotated = clients.get("https://c", "kc", "new")
+    assert rotated is not c and c.closed
+
+    sleep(0.25)
+    assert clients.evictIdle() == 2
+    assert a.closed and rotated.closed
+    assert clients.stats() == {
+        "clients": 0,
+        "hits": 2,
+        "misses": 4,
+        "evictions": 1,
+        "idleEvictions": 2,
+        "hitRate": 0.3333,
+        "openConnections": 0,
+    }
+
+
+def test_concurrentMissesBuildOnce() -> None:
+    built: list[FakeClient] = []
+
+    def factory(*args: str) -> FakeClient:
+        sleep(0.05)
+        built.append(FakeClient(*args))
+        return built[-1]
+
+    clients = ClientRegistry(factory)
+    barrier = Barrier(8)
+    results: list[FakeClient] = []
+
+    def get() -> None:
+        barrier.wait()
+        results.append(clients.get("https://fw", "key", "secret"))
+
+    threads = [Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert all(client is built[0] for client in results)
+
+    # failed builds are not cached
+    def failing(*_: str) -> FakeClient:
+        raise AssertionError("unreachable")
+
+    clients.factory = failing
+    with pytest.raises(AssertionError):
+        clients.get("https://down", "key", "secret")
+    assert len(clients) == 1
+    clients.close()
+    assert built[0].closed
+
+
+def test_waiterWithAnotherSecretGetsItsOwnClient() -> None:
+    started = Barrier(2)
+
+    def factory(*args: str) -> FakeClient:
+        if args[2] == "real":
+            started.wait()
+            sleep(0.05)
+        return FakeClient(*args)
+
+    clients = ClientRegistry(factory)
+    results: dict[str, FakeClient] = {}
+    builder = Thread(
+        target=lambda: results.update(real=clients.get("https://fw", "key", "real"))
+    )
+    builder.start()
+    started.wait()
+    # Arrives while the client with the real secret is being built
+    results["wrong"] = clients.get("https://fw", "key", "wrong")
+    builder.join()
+
+    assert results["real"].apiSecret == "real"
+    assert results["wrong"].apiSecret == "wrong"
+    assert results["real"].closed  # replaced by the client with the new secret
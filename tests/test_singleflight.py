@@ -0,0 +1,58 @@
+import asyncio
+from time import sleep
+from threading import Barrier, Thread
+
+import pytest
+
+from NG_OPNSense.singleflight import SingleFlight
+
+
+def test_concurrentCallsCollapse() -> None:
+    flight = SingleFlight()
+    executions: list[int] = []
+    results: list[dict] = []
+    barrier = Barrier(8)
+
+    def fetch() -> dict:
+        executions.append(1)
+        sleep(0.2)
+        return {"rows": []}
+
+    def worker() -> None:
+        barrier.wait()
+        results.append(flight.do("aliases", fetch))
+
+    threads = [Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(executions) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"calls": 8, "executed": 1, "collapsed": 7, "inFlight": 0}
+
+    # Nothing is cached once the call has landed
+    flight.do("aliases", fetch)
+    assert len(executions) == 2
+
+
+def test_asyncAndErrors() -> None:
+    flight = SingleFlight()
+
+    def fail() -> None:
+        sleep(0.1)
+        raise TimeoutError("firewall unreachable")
+
+    async def main() -> list:
+        return await asyncio.gather(
+            *(flight.doAsync("status", fail) for _ in range(4)),
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(main())
+    assert all(isinstance(error, TimeoutError) for error in errors)
+    assert flight.stats()["executed"] == 1
+
+    with pytest.raises(TimeoutError):
+        flight.do("status", fail)
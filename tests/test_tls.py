@@ -0,0 +1,76 @@
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+from requests.exceptions import SSLError
+from requests.certs import where
+
+from NG_OPNSense.concurrency import congested
+from NG_OPNSense.exceptions import OPNSenseCertificateError, requestError
+from NG_OPNSense.tls import CertificatePinError, TLSConfig
+from NG_OPNSense.transport import RequestsTransport, Urllib3Transport
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+@pytest.fixture(scope="module")
+def server(httpsServer):
+    return httpsServer(Handler)
+
+
+def test_pinnedConnectionsResumeSessions(server) -> None:
+    url, fingerprint, _ = server
+    transport = Urllib3Transport(tls=TLSConfig(fingerprint=fingerprint))
+
+    for _ in range(3):
+        assert transport.request("GET", url, ("k", "s")).json() == {}
+        transport.pool.clear()  # force a new connection
+
+    stats: dict = transport.stats()["tls"]
+    assert stats["handshakes"] == 3
+    assert stats["resumed"] == 2
+
+
+def test_wrongFingerprintIsRejected(server) -> None:
+    url, _, _ = server
+    transport = RequestsTransport(tls=TLSConfig(fingerprint="00" * 32))
+    with pytest.raises(Exception, match="pinned fingerprint"):
+        transport.request("GET", url, ("k", "s"))
+
+
+@pytest.mark.parametrize("transport", [RequestsTransport, Urllib3Transport])
+def test_pinMismatchIsNotRetried(server, transport) -> None:
+    url, _, _ = server
+    transport = transport(tls=TLSConfig(fingerprint="00" * 32))
+    with pytest.raises(Exception) as raised:
+        transport.request("GET", url, ("k", "s"))
+
+    for cause in (raised.value, SSLError(CertificatePinError("pinned fingerprint"))):
+        error = requestError(cause, url, "GET", 0.0)
+        assert isinstance(error, OPNSenseCertificateError)
+        assert not error.retryable and not congested(error)
+
+
+def test_caBundle(server) -> None:
+    url, _, certificate = server
+    assert (
+        RequestsTransport(tls=TLSConfig(caBundle=certificate))
+        .request("GET", url, ("k", "s"))
+        .json()
+        == {}
+    )
+
+    # a bundle without the self-signed certificate
+    transport = RequestsTransport(tls=TLSConfig(caBundle=where()))
+    with pytest.raises(Exception, match="CERTIFICATE_VERIFY_FAILED"):
+        transport.request("GET", url, ("k", "s"))
@@ -0,0 +1,97 @@
+from json import dumps, loads
+from threading import Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from NG_OPNSense.ha import HATransport
+from NG_OPNSense.transport import (
+    RequestsTransport,
+    Urllib3Transport,
+    makeTransport,
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The client address of every connection accepted
+    connections: list[tuple[str, int]] = []
+
+    def setup(self) -> None:
+        super().setup()
+        Handler.connections.append(self.client_address)
+
+    def do_GET(self) -> None:
+        self._reply(404 if self.path == "/missing" else 200, {"path": self.path})
+
+    def do_POST(self) -> None:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body: bytes = b""
+            while size := int(self.rfile.readline(), 16):
+                body += self.rfile.read(size + 2)[:-2]
+            self.rfile.readline()
+        else:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+        self._reply(200, {"body": loads(body), "auth": self.headers["Authorization"]})
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body: bytes = dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("transport", [RequestsTransport, Urllib3Transport])
+def test_transportsBehaveAlike(server, transport) -> None:
+    transport = transport()
+    auth: tuple[str, str] = ("key", "secret")
+
+    assert transport.request("GET", f"{server}/a", auth).json() == {"path": "/a"}
+
+    streamed = transport.request(
+        "POST", f"{server}/b", auth, data=(part for part in [b'{"a": ', b"1}"])
+    ).json()
+    assert streamed == {"body": {"a": 1}, "auth": "Basic a2V5OnNlY3JldA=="}
+
+    response = transport.request("GET", f"{server}/missing", auth)
+    assert response.status_code == 404
+    with pytest.raises(Exception) as error:
+        response.raise_for_status()
+    assert "404" in str(error.value)
+    transport.close()
+
+
+@pytest.mark.parametrize("transport", [RequestsTransport, Urllib3Transport])
+def test_connectionsAreReusedAcrossNodes(server, transport) -> None:
+    # Two names of the same server are two hosts with a pool each
+    port: str = server.rsplit(":", 1)[1]
+    nodes: list[str] = [f"http://127.0.0.1:{port}", f"http://localhost:{port}"]
+    transport = transport()
+    ha = HATransport(nodes, "key", "secret", transport=transport, start=False)
+    Handler.connections.clear()
+
+    for index in range(20):
+        ha.probe()
+        transport.request("GET", f"{nodes[index % 2]}/a", ("key", "secret"))
+    assert len(Handler.connections) == 2
+    ha.close()
+    transport.close()
+
+
+def test_makeTransport() -> None:
+    assert makeTransport(None) is None
+    assert isinstance(makeTransport("urllib3"), Urllib3Transport)
+    with pytest.raises(ValueError):
+        makeTransport("carrier-pigeon")
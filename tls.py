@@ -0,0 +1,182 @@
+import ssl
+from hashlib import sha256
+from threading import Lock
+from weakref import ReferenceType, ref
+from time import perf_counter
+from dataclasses import dataclass
+from typing import Any
+
+from .profiling import phase
+
+
+class CertificatePinError(ssl.SSLCertVerificationError):
+    """The certificate of the server doesn't match the pinned fingerprint"""
+
+
+@dataclass(slots=True)
+class TLSConfig:
+    """How a client verifies the firewall and reuses TLS sessions
+
+    Without `fingerprint` or `caBundle` any certificate is accepted, like
+    before. OPNsense ships a self-signed certificate, so pinning its
+    fingerprint is the simplest safe option:
+
+    ```bash
+    openssl s_client -connect opnsense.local:443 </dev/null 2>/dev/null \\
+        | openssl x509 -noout -fingerprint -sha256
+    ```
+
+    Args:
+        `fingerprint (str | None, optional)`: The SHA-256 fingerprint of the
+        certificate, hex with or without colons. Defaults to None.
+        `caBundle (str | None, optional)`: A CA file that must have signed the
+        certificate. Defaults to None.
+        `checkHostname (bool, optional)`: Match the certificate against the host
+        name, only with `caBundle`. Defaults to True.
+        `resumeSessions (bool, optional)`: Resume the TLS session of an earlier
+        connection when a new one is opened. Defaults to True.
+    """
+
+    fingerprint: str | None = None
+    caBundle: str | None = None
+    checkHostname: bool = True
+    resumeSessions: bool = True
+
+    def __post_init__(self) -> None:
+        if self.fingerprint is not None:
+            self.fingerprint = self.fingerprint.replace(":", "").lower()
+            if len(self.fingerprint) != 64 or not all(
+                character in "0123456789abcdef" for character in self.fingerprint
+            ):
+                raise ValueError("fingerprint must be a SHA-256 hex digest")
+
+    @property
+    def verify(self) -> bool:
+        """Whether the certificate chain is verified"""
+        return self.caBundle is not None
+
+    def context(self) -> "ClientSSLContext":
+        """A new SSL context for one transport"""
+        context = ClientSSLContext(
+            ssl.PROTOCOL_TLS_CLIENT,
+            fingerprint=self.fingerprint,
+            resumeSessions=self.resumeSessions,
+        )
+        if self.caBundle is not None:
+            context.load_verify_locations(self.caBundle)
+            context.check_hostname = self.checkHostname
+        else:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+
+class _SessionSocket(ssl.SSLSocket):
+    """Hands its latest session to the context before the connection closes"""
+
+    peer: Any = None
+
+    def _real_close(self) -> None:
+        if self._sslobj is not None and isinstance(self.context, ClientSSLContext):
+            self.context._remember(self.peer, self.session)
+        super()._real_close()
+
+
+class ClientSSLContext(ssl.SSLContext):
+    """An SSL context that pins certificates, resumes sessions and times handshakes
+
+    New connections to a server offer the session of the last connection to
+    it, so the server can skip the key exchange (and certificate transfer).
+    The fingerprint is checked right after each handshake, whatever HTTP
+    library wraps the socket.
+    """
+
+    sslsocket_class = _SessionSocket
+
+    def __init__(
+        self,
+        protocol: int = ssl.PROTOCOL_TLS_CLIENT,
+        fingerprint: str | None = None,
+        resumeSessions: bool = True,
+    ) -> None:
+        # The protocol is consumed by SSLContext.__new__
+        self.fingerprint: str | None = fingerprint
+        self.resumeSessions: bool = resumeSessions
+        self._lock: Lock = Lock()
+        self._stats: dict = {"handshakes": 0, "resumed": 0, "handshakeSeconds": 0.0}
+        self._sockets: dict[Any, ReferenceType] = {}
+        self._sessions: dict[Any, ssl.SSLSession] = {}
+
+    def wrap_socket(
+        self,
+        sock: Any,
+        server_side: bool = False,
+        do_handshake_on_connect: bool = True,
+        suppress_ragged_eofs: bool = True,
+        server_hostname: str | None = None,
+        session: ssl.SSLSession | None = None,
+    ) -> ssl.SSLSocket:
+        peer: Any = self._peer(sock, server_hostname)
+        if session is None and self.resumeSessions:
+            session = self._session(peer)
+
+        started: float = perf_counter()
+        with phase("tls"):
+            sslSocket: ssl.SSLSocket = super().wrap_socket(
+                sock,
+                server_side=server_side,
+                do_handshake_on_connect=do_handshake_on_connect,
+                suppress_ragged_eofs=suppress_ragged_eofs,
+                server_hostname=server_hostname,
+                session=session,
+            )
+        elapsed: float = perf_counter() - started
+
+        if self.fingerprint is not None:
+            der: bytes | None = sslSocket.getpeercert(binary_form=True)
+            if der is None or sha256(der).hexdigest() != self.fingerprint:
+                sslSocket.close()
+                raise CertificatePinError(
+                    f"Certificate of {server_hostname or peer} doesn't match "
+                    "the pinned fingerprint"
+                )
+
+        with self._lock:
+            self._stats["handshakes"] += 1
+            self._stats["resumed"] += sslSocket.session_reused
+            self._stats["handshakeSeconds"] += elapsed
+            self._sockets[peer] = ref(sslSocket)
+        sslSocket.peer = peer
+        return sslSocket
+
+    def stats(self) -> dict:
+        """Handshakes, how many resumed a session and the time spent in them"""
+        with self._lock:
+            stats: dict = dict(self._stats)
+        stats["handshakeSeconds"] = round(stats["handshakeSeconds"], 6)
+        stats["averageHandshakeMs"] = round(
+            stats["handshakeSeconds"] * 1000 / max(1, stats["handshakes"]), 3
+        )
+        return stats
+
+    @staticmethod
+    def _peer(sock: Any, serverHostname: str | None) -> Any:
+        try:
+            return sock.getpeername()[:2]
+        except (AttributeError, OSError):
+            return serverHostname
+
+    def _remember(self, peer: Any, session: ssl.SSLSession | None) -> None:
+        if session is not None and self.resumeSessions:
+            with self._lock:
+                self._sessions[peer] = session
+
+    def _session(self, peer: Any) -> ssl.SSLSession | None:
+        with self._lock:
+            last: ReferenceType | None = self._sockets.get(peer)
+            sslSocket: ssl.SSLSocket | None = last() if last is not None else None
+            # TLS 1.3 tickets arrive after the handshake, read the latest one
+            # from a live connection when there is one
+            if sslSocket is not None and sslSocket.session is not None:
+                self._sessions[peer] = sslSocket.session
+            return self._sessions.get(peer)
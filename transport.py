@@ -0,0 +1,384 @@
+from json import loads
+from threading import Lock
+from typing import Any
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+from urllib3.util import make_headers
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .profiling import phase
+from .tls import ClientSSLContext, TLSConfig
+
+# Transports selectable by name, see `makeTransport`
+TRANSPORTS: tuple[str, ...] = ("requests", "urllib3", "http2")
+
+
+class HTTPStatusError(Exception):
+    """The API answered with a 4xx or 5xx status"""
+
+    def __init__(self, status: int, url: str, reason: str = "") -> None:
+        super().__init__(f"{status} {reason} for url: {url}")
+        self.status: int = status
+        self.url: str = url
+
+
+class TransportResponse:
+    """The parts of a response the controllers use, shared by all transports"""
+
+    __slots__ = ("status_code", "content", "url", "reason")
+
+    def __init__(self, status: int, content: bytes, url: str, reason: str = ""):
+        self.status_code: int = status
+        self.content: bytes = content
+        self.url: str = url
+        self.reason: str = reason
+
+    def json(self) -> Any:
+        return loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise HTTPStatusError(self.status_code, self.url, self.reason)
+
+
+class Transport:
+    """Sends the HTTP requests of a client
+
+    Subclasses implement `request()`, returning an object with `status_code`,
+    `content`, `json()` and `raise_for_status()` (a `requests.Response` or a
+    `TransportResponse`). A transport is shared by every controller of a
+    client and must be safe to use from several threads. `timeout` is the
+    number of seconds to wait for the connection and for each read, None keeps
+    the default of the transport.
+    """
+
+    name: str = ""
+    context: ClientSSLContext | None = None
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        auth: tuple[str, str],
+        data: Any | None = None,
+        headers: dict | None = None,
+        timeout: float | None = None,
+    ) -> Any:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Close the pooled connections"""
+
+    def configurePool(self, connections: int) -> None:
+        """Keep up to `connections` open connections per host, if the pool is sized"""
+
+    def reserveHosts(self, hosts: int) -> None:
+        """Keep the pools of at least `hosts` hosts open at the same time"""
+
+    def openConnections(self) -> int:
+        """The number of idle connections kept open in the pool"""
+        return 0
+
+    def stats(self) -> dict:
+        """The transport name and the TLS handshake counters, see `ClientSSLContext`"""
+        return {
+            "transport": self.name,
+            "tls": self.context.stats() if self.context is not None else None,
+        }
+
+
+class _TimedConnect:
+    """Times the DNS lookup and TCP connect of new connections for `profile()`"""
+
+    def _new_conn(self):
+        with phase("connect"):
+            return super()._new_conn()
+
+
+class _TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+# Replaces `PoolManager.pool_classes_by_scheme` of the urllib3 based transports
+_POOL_CLASSES: dict[str, type] = {
+    "http": _TimedHTTPConnectionPool,
+    "https": _TimedHTTPSConnectionPool,
+}
+
+
+def _openConnections(manager: PoolManager) -> int:
+    """Count the idle, still connected connections of a `PoolManager`"""
+    count: int = 0
+    for key in manager.pools.keys():
+        pool = manager.pools.get(key)
+        if pool is None or pool.pool is None:
+            continue
+        count += sum(
+            1
+            for connection in list(pool.pool.queue)
+            if connection is not None and connection.sock is not None
+        )
+    return count
+
+
+class _TLSAdapter(HTTPAdapter):
+    """Hands the SSL context of the transport to the urllib3 pools of requests"""
+
+    def __init__(self, tls: TLSConfig, context: ClientSSLContext, **kwargs) -> None:
+        self.tls: TLSConfig = tls
+        self.context: ClientSSLContext = context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        kwargs["ssl_context"] = self.context
+        if self.tls.verify and not self.tls.checkHostname:
+            kwargs["assert_hostname"] = False
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _POOL_CLASSES
+
+
+class RequestsTransport(Transport):
+    """Sends requests with a `requests.Session`, the default
+
+    Args:
+        `session (Session | None, optional)`: Defaults to a new session.
+        `tls (TLSConfig | None, optional)`: Defaults to accepting any
+        certificate, with session resumption.
+        `hosts (int, optional)`: Hosts whose pools are kept open at the same
+        time, a host beyond them closes the least recently used pool.
+        Defaults to 10.
+    """
+
+    name = "requests"
+
+    def __init__(
+        self,
+        session: Session | None = None,
+        tls: TLSConfig | None = None,
+        hosts: int = 10,
+    ):
+        self.session: Session = session or Session()
+        self.tls: TLSConfig = tls or TLSConfig()
+        self.context: ClientSSLContext = self.tls.context()
+        self.hosts: int = max(1, hosts)
+        self.connections: int = 10
+        self.configurePool(self.connections)
+
+    def configurePool(self, connections: int) -> None:
+        """Keep up to `connections` open connections per host"""
+        self.connections = max(1, connections)
+        adapter = _TLSAdapter(
+            self.tls,
+            self.context,
+            pool_connections=self.hosts,
+            pool_maxsize=self.connections,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def reserveHosts(self, hosts: int) -> None:
+        if hosts > self.hosts:
+            self.hosts = hosts
+            self.configurePool(self.connections)
+
+    def request(self, method, url, auth, data=None, headers=None, timeout=None) -> Any:
+        return self.session.request(
+            method=method,
+            url=url,
+            auth=auth,
+            verify=self.tls.verify,
+            data=data,
+            headers=headers,
+            timeout=timeout,
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+    def openConnections(self) -> int:
+        adapters = {id(a): a for a in self.session.adapters.values()}.values()
+        return sum(_openConnections(adapter.poolmanager) for adapter in adapters)
+
+
+class Urllib3Transport(Transport):
+    """Sends requests straight through a `urllib3.PoolManager`
+
+    Skips the session, hook and adapter layers of requests, so each call costs
+    noticeably less CPU. Bodies may be bytes, str or an iterable of bytes
+    (sent chunked).
+
+    Args:
+        `maxsize (int, optional)`: Connections kept per host, at least the
+        number of threads sending requests. Defaults to 10.
+        `tls (TLSConfig | None, optional)`: Defaults to accepting any
+        certificate, with session resumption.
+    """
+
+    name = "urllib3"
+
+    def __init__(self, maxsize: int = 10, tls: TLSConfig | None = None) -> None:
+        self.tls: TLSConfig = tls or TLSConfig()
+        self.context: ClientSSLContext = self.tls.context()
+        options: dict = {}
+        if self.tls.verify and not self.tls.checkHostname:
+            options["assert_hostname"] = False
+        self.pool: PoolManager = PoolManager(
+            maxsize=maxsize,
+            block=False,
+            ssl_context=self.context,
+            cert_reqs="CERT_REQUIRED" if self.tls.verify else "CERT_NONE",
+            **options,
+        )
+        self.pool.pool_classes_by_scheme = _POOL_CLASSES
+        self._authLock: Lock = Lock()
+        self._authHeaders: dict[tuple[str, str], dict[str, str]] = {}
+
+    def request(self, method, url, auth, data=None, headers=None, timeout=None) -> Any:
+        requestHeaders: dict[str, str] = {**self._authHeader(auth), **(headers or {})}
+        if isinstance(data, str):
+            data = data.encode()
+        chunked: bool = data is not None and not isinstance(data, bytes)
+
+        response = self.pool.request(
+            method,
+            url,
+            body=data,
+            headers=requestHeaders,
+            chunked=chunked,
+            redirect=False,
+            retries=False,
+            timeout=timeout,
+        )
+        return TransportResponse(response.status, response.data, url, response.reason)
+
+    def configurePool(self, connections: int) -> None:
+        # Pools are created with the new size once the current ones are dropped
+        self.pool.connection_pool_kw["maxsize"] = max(1, connections)
+        self.pool.clear()
+
+    def close(self) -> None:
+        self.pool.clear()
+
+    def openConnections(self) -> int:
+        return _openConnections(self.pool)
+
+    def _authHeader(self, auth: tuple[str, str]) -> dict[str, str]:
+        header: dict[str, str] | None = self._authHeaders.get(auth)
+        if header is None:
+            header = make_headers(basic_auth=f"{auth[0]}:{auth[1]}")
+            with self._authLock:
+                self._authHeaders[auth] = header
+        return header
+
+
+class HTTP2Transport(Transport):
+    """Sends requests over HTTP/2 with `httpx`, concurrent calls share a connection
+
+    Needs the optional dependency `httpx[http2]` (`pip install NG_OPNSense[http2]`).
+    Servers without HTTP/2 are spoken to over HTTP/1.1.
+
+    Args:
+        `maxConnections (int, optional)`: Defaults to 10.
+        `tls (TLSConfig | None, optional)`: Defaults to accepting any
+        certificate, with session resumption.
+
+    Raises:
+        `ImportError`: If `httpx[http2]` isn't installed
+    """
+
+    name = "http2"
+
+    def __init__(self, maxConnections: int = 10, tls: TLSConfig | None = None):
+        try:
+            import h2  # noqa: F401 - httpx only fails on the first request without it
+            import httpx
+        except ImportError as e:
+            raise ImportError(
+                "The http2 transport needs httpx[http2]: pip install 'httpx[http2]'"
+            ) from e
+
+        # Raised as the builtin errors the other transports' errors derive from
+        self._timeout: type[Exception] = httpx.TimeoutException
+        self._transportError: type[Exception] = httpx.TransportError
+        self._clientTimeout = httpx.USE_CLIENT_DEFAULT
+        self.tls: TLSConfig = tls or TLSConfig()
+        self.context: ClientSSLContext = self.tls.context()
+        self.client = httpx.Client(
+            http2=True,
+            verify=self.context,
+            limits=httpx.Limits(max_connections=maxConnections),
+        )
+
+    def request(self, method, url, auth, data=None, headers=None, timeout=None) -> Any:
+        if isinstance(data, str):
+            data = data.encode()
+        try:
+            response = self.client.request(
+                method,
+                url,
+                auth=auth,
+                content=data,
+                headers=headers,
+                timeout=self._clientTimeout if timeout is None else timeout,
+            )
+        except self._timeout as e:
+            raise TimeoutError(str(e)) from e
+        except self._transportError as e:
+            raise ConnectionError(str(e)) from e
+        return TransportResponse(
+            response.status_code, response.content, url, response.reason_phrase
+        )
+
+    def close(self) -> None:
+        self.client.close()
+
+    def openConnections(self) -> int:
+        pool = getattr(self.client._transport, "_pool", None)
+        return len(getattr(pool, "connections", ()))
+
+
+def makeTransport(
+    transport: "Transport | str | None", tls: TLSConfig | None = None
+) -> Transport | None:
+    """Resolve a transport name (`requests`, `urllib3`, `http2`) to a new transport
+
+    Args:
+        `transport (Transport | str | None)`: An instance, a name or None
+        `tls (TLSConfig | None, optional)`: TLS settings of a new transport, a
+        `requests` one if no name is given. Defaults to None.
+
+    Raises:
+        `ValueError`: If the name is unknown or `tls` is given with an instance
+
+    Returns:
+        `Transport | None`: The transport, a given instance is returned as is
+        and None selects the shared default
+    """
+    if isinstance(transport, Transport):
+        if tls is not None:
+            raise ValueError("Pass the TLS settings to the transport instance")
+        return transport
+    if transport is None:
+        return None if tls is None else RequestsTransport(tls=tls)
+    if transport == "requests":
+        return RequestsTransport(tls=tls)
+    if transport == "urllib3":
+        return Urllib3Transport(tls=tls)
+    if transport == "http2":
+        return HTTP2Transport(tls=tls)
+    raise ValueError(f"Unknown transport {transport!r}, expected one of {TRANSPORTS}")